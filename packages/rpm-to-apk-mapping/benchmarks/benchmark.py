@@ -0,0 +1,615 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for rpm_to_apk_mapper.py
+
+Runs entirely offline, on synthetic inventories or on the command output in
+fixtures/, which `record` (the only subcommand that needs a container
+runtime) replaces with full recordings.
+Usage:
+
+    python3 benchmarks/benchmark.py version-sort [--count 100000]
+    python3 benchmarks/benchmark.py records [--count 100000]
+    python3 benchmarks/benchmark.py pipeline [--scale 1 10 100]
+    python3 benchmarks/benchmark.py fuzzy [--thresholds 0.6 0.8]
+    python3 benchmarks/benchmark.py record [--runtime docker]
+"""
+
+import argparse
+import contextlib
+import os
+import random
+import re
+import string
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from typing import Iterator, List, Optional, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from rpm_to_apk_mapper import (  # noqa: E402
+    ALTERNATIVE_RULES, APK, DEFAULT_FUZZY_THRESHOLD, FUZZY_STRIP_SUFFIXES, RPM, STRATEGY_FUZZY,
+    STRATEGY_UNMATCHED, APKMatcher, CSVGenerator, ContainerRunner, Mapping, RPMExtractor, VersionFamily,
+    evr_sort_key, exclusion_rule, generate_alternatives, match_rpms, version_sort_key,
+)
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+YUM_FIXTURE = 'yum-list-available.txt'
+# Recorded APK inventories, in the order they are preferred
+WOLFI_STATUS_FIXTURE = 'wolfi-package-status.txt'
+APK_SEARCH_FIXTURE = 'apk-search.txt'
+APK_FIXTURES = (WOLFI_STATUS_FIXTURE, APK_SEARCH_FIXTURE)
+# Correct fuzzy matches of the recorded RPMs, checked by hand
+FUZZY_LABELS = 'fuzzy-labels.txt'
+
+# Words of a package name, renamed in scaled copies unless a rule depends on them
+WORD_RE = re.compile(r'[A-Za-z]+')
+RULE_PROBE = 'qqq'
+# Rule prefixes that start a word (libfoo, python3)
+WORD_PREFIXES = tuple(rule.prefix for rule in ALTERNATIVE_RULES if rule.prefix.isalpha())
+
+PIPELINE_STAGES = ('parse', 'latest filter', 'exclusions', 'apk index', 'matching', 'csv write')
+
+
+def synthetic_rpms(count: int, seed: int = 0) -> List[RPM]:
+    """Generate count RPM entries shaped like a yum repository listing
+
+    Each package has one to three versions, and each version is built for
+    one or two architectures, as in the UBI repositories.
+    """
+    rng = random.Random(seed)
+    rpms = []
+    package = 0
+    while len(rpms) < count:
+        name = f"pkg{package}"
+        package += 1
+        for _ in range(rng.randint(1, 3)):
+            version = '.'.join(str(rng.randint(0, 30)) for _ in range(rng.randint(1, 4)))
+            if rng.random() < 0.1:
+                version += rng.choice(['a', 'rc1', '~beta2', '_p1'])
+            release = f"{rng.randint(1, 40)}.el9_{rng.randint(0, 6)}"
+            if rng.random() < 0.2:
+                release += f".{rng.randint(1, 9)}"
+            for arch in rng.sample(['x86_64', 'noarch', 'i686', 'aarch64'], rng.randint(1, 2)):
+                rpms.append(RPM(name, version, release, arch))
+    return rpms[:count]
+
+
+def legacy_filter_latest_rpms(all_rpms: List[RPM]) -> List[RPM]:
+    """The pairwise string-comparison implementation this benchmark measures against"""
+
+    def parse_version(version_release):
+        if '-' in version_release:
+            version, release = version_release.rsplit('-', 1)
+        else:
+            version, release = version_release, '0'
+
+        def split_version_parts(v):
+            parts = []
+            for part in re.split(r'[.\-_]', v):
+                if part.isdigit():
+                    parts.append(('num', int(part)))
+                else:
+                    for subpart in re.findall(r'\d+|\D+', part):
+                        if subpart.isdigit():
+                            parts.append(('num', int(subpart)))
+                        else:
+                            parts.append(('str', subpart))
+            return parts
+
+        return split_version_parts(version), split_version_parts(release)
+
+    def compare_parts(parts1, parts2):
+        for i in range(max(len(parts1), len(parts2))):
+            p1 = parts1[i] if i < len(parts1) else ('num', 0)
+            p2 = parts2[i] if i < len(parts2) else ('num', 0)
+            if p1[0] == 'num' and p2[0] == 'str':
+                return 1
+            if p1[0] == 'str' and p2[0] == 'num':
+                return -1
+            if p1[1] > p2[1]:
+                return 1
+            if p1[1] < p2[1]:
+                return -1
+        return 0
+
+    def compare_versions(v1, v2):
+        ver1, rel1 = parse_version(v1)
+        ver2, rel2 = parse_version(v2)
+        return compare_parts(ver1, ver2) or compare_parts(rel1, rel2)
+
+    packages = defaultdict(list)
+    for rpm in all_rpms:
+        packages[rpm.name].append(rpm)
+
+    latest_rpms = []
+    for versions in packages.values():
+        latest = versions[0]
+        for rpm in versions[1:]:
+            comparison = compare_versions(
+                f"{rpm.version}-{rpm.release}",
+                f"{latest.version}-{latest.release}"
+            )
+            if comparison > 0:
+                latest = rpm
+            elif comparison == 0:
+                if rpm.arch == 'x86_64' and latest.arch != 'x86_64':
+                    latest = rpm
+                elif rpm.arch != 'x86_64' and latest.arch != 'x86_64':
+                    if rpm.arch == 'noarch':
+                        latest = rpm
+        latest_rpms.append(latest)
+
+    return latest_rpms
+
+
+def yum_lines(count: int, seed: int = 0) -> List[str]:
+    """Render count synthetic RPMs as `yum list` output lines"""
+    return [f"{rpm.name}.{rpm.arch}  {rpm.version}-{rpm.release}  ubi-9-appstream-rpms"
+            for rpm in synthetic_rpms(count, seed)]
+
+
+class FakeContainerRunner(ContainerRunner):
+    """ContainerRunner that replays recorded output instead of running containers"""
+
+    def __init__(self, outputs):
+        super().__init__()
+        self.outputs = outputs  # image -> recorded stdout
+
+    def _check_runtime(self):
+        pass
+
+    def image_digest(self, image: str):
+        return None
+
+    def run_command(self, image: str, command: List[str], platform: Optional[str] = None) -> str:
+        return self.outputs[image]
+
+    def run_command_iter(self, image: str, command: List[str],
+                         platform: Optional[str] = None) -> Iterator[str]:
+        return iter(self.outputs[image].splitlines(keepends=True))
+
+
+class ReplayAPKMatcher(APKMatcher):
+    """APKMatcher whose host-side wolfi-package-status call replays recorded output
+
+    Without a recording it fails like a missing chainctl, and the inventory
+    comes from `apk search` through the container runner.
+    """
+
+    def __init__(self, container_runner: ContainerRunner, wolfi_package_status: Optional[str] = None,
+                 fuzzy_threshold: float = DEFAULT_FUZZY_THRESHOLD):
+        super().__init__(container_runner, fuzzy_threshold=fuzzy_threshold)
+        self.recorded_status = wolfi_package_status
+
+    def _wolfi_package_status(self) -> str:
+        if self.recorded_status is None:
+            raise FileNotFoundError('wolfi-package-status output was not recorded')
+        return self.recorded_status
+
+
+SYNTHETIC_STEMS = (
+    'bash', 'curl', 'openssl', 'zlib', 'xz', 'zstd', 'pcre2', 'sqlite', 'ncurses', 'readline', 'git',
+    'vim', 'nginx', 'httpd', 'perl', 'python', 'ruby', 'php', 'nodejs', 'llvm', 'clang', 'gcc', 'lua',
+    'dbus', 'systemd', 'util-linux', 'acl', 'attr', 'audit', 'shadow', 'krb5', 'openldap', 'libxml2',
+    'expat', 'jq', 'tar', 'gzip', 'grep', 'sed', 'gawk', 'make', 'cmake', 'binutils', 'elfutils', 'gdb',
+    'strace', 'procps-ng', 'iproute', 'nftables', 'bind', 'openssh', 'rsync', 'wget', 'less', 'file',
+    'gdbm', 'kmod', 'libffi', 'gmp', 'freetype', 'harfbuzz', 'libpng', 'fftw', 'postgresql', 'mariadb',
+    'redis', 'maven', 'podman', 'buildah', 'skopeo', 'runc', 'crun', 'augeas', 'apr', 'cronie',
+)
+SYLLABLES = ('ba', 'co', 'de', 'fi', 'gu', 'ka', 'li', 'mo', 'nu', 'pe', 'ri', 'sa', 'to', 'vi', 'xe', 'zo')
+
+
+def synthetic_fixtures(seed: int = 0) -> Tuple[str, str]:
+    """Return (`yum list available` output, `apk search -q` output) shaped like UBI 9 and Wolfi"""
+    rng = random.Random(seed)
+    stems = list(SYNTHETIC_STEMS)
+    while len(stems) < 1500:
+        stems.append(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+
+    rpm_names = []
+    apk_names = set()
+    for stem in stems:
+        rpm_names.append(stem)
+        if rng.random() < 0.5:
+            apk_names.add(stem)
+        for rpm_suffix, apk_suffix in (('-devel', '-dev'), ('-libs', ''), ('-tools', '-utils'), ('-doc', '-doc')):
+            if rng.random() < 0.4:
+                rpm_names.append(stem + rpm_suffix)
+                if rng.random() < 0.6:
+                    apk_names.add(stem + apk_suffix)
+        if rng.random() < 0.2:
+            rpm_names.append(f'python3-{stem}')
+            apk_names.add(f'py3-{stem}')
+        if rng.random() < 0.1:
+            rpm_names.append(f'perl-{stem.capitalize()}')
+        if rng.random() < 0.1:
+            apk_names.add(f'{stem}-{rng.randint(1, 30)}')
+
+    yum = ['Updating Subscription Management repositories.', 'Available Packages']
+    for name in rpm_names:
+        for _ in range(rng.randint(1, 3)):
+            version = '.'.join(str(rng.randint(0, 30)) for _ in range(rng.randint(1, 3)))
+            release = f"{rng.randint(1, 40)}.el9_{rng.randint(0, 6)}"
+            for arch in rng.sample(['x86_64', 'noarch', 'i686'], rng.randint(1, 2)):
+                yum.append(f"{name}.{arch}    {version}-{release}    ubi-9-appstream-rpms")
+    return '\n'.join(yum) + '\n', '\n'.join(sorted(apk_names)) + '\n'
+
+
+def load_fixtures(directory: str):
+    """Return (yum output, APK fixture name, APK output, description), recorded if available"""
+    yum_path = os.path.join(directory, YUM_FIXTURE)
+    for filename in APK_FIXTURES:
+        apk_path = os.path.join(directory, filename)
+        if os.path.exists(yum_path) and os.path.exists(apk_path):
+            with open(yum_path) as f:
+                yum = f.read()
+            with open(apk_path) as f:
+                apks = f.read()
+            return yum, filename, apks, f"recorded fixtures in {directory} ({filename})"
+
+    yum, apks = synthetic_fixtures()
+    return yum, APK_SEARCH_FIXTURE, apks, "synthetic fixtures (see `record`)"
+
+
+def copy_letters(copy: int) -> dict:
+    """Return the str.translate table renaming words in scaled copy number copy
+
+    Every copy permutes the letters differently, the same way in both cases.
+    """
+    letters = list(string.ascii_lowercase)
+    random.Random(copy).shuffle(letters)
+    shuffled = ''.join(letters)
+    return str.maketrans(string.ascii_lowercase + string.ascii_uppercase, shuffled + shuffled.upper())
+
+
+def rule_words() -> frozenset:
+    """Lowercase words the matching rules key on or add to names (python, devel, py, dev, mainline, ...)"""
+    words = set()
+    for suffix in FUZZY_STRIP_SUFFIXES:
+        words.update(WORD_RE.findall(suffix))
+    for rule in ALTERNATIVE_RULES:
+        if rule.names:
+            continue
+        words.update(WORD_RE.findall(f"{rule.prefix} {rule.suffix}"))
+        if rule.pattern is not None:
+            words.update(word for word in WORD_RE.findall(rule.pattern.pattern) if len(word) > 1)
+        # Words the rule adds around a name it applies to
+        for alternative in generate_alternatives(f"{rule.prefix}{RULE_PROBE}{rule.suffix}"):
+            templates = alternative.templates if isinstance(alternative, VersionFamily) else ((alternative, ''),)
+            for prefix, suffix in templates:
+                words.update(word for word in WORD_RE.findall(f"{prefix} {suffix}") if RULE_PROBE not in word)
+    return frozenset(word.lower() for word in words)
+
+
+def rename(name: str, table: dict, skip: frozenset) -> str:
+    """Translate the words of name not in skip, keeping rule prefixes such as lib at their start"""
+    def translate(match):
+        word = match.group()
+        if word.lower() in skip:
+            return word
+        for prefix in WORD_PREFIXES:
+            if word.lower().startswith(prefix):
+                return word[:len(prefix)] + word[len(prefix):].translate(table)
+        return word.translate(table)
+
+    return WORD_RE.sub(translate, name)
+
+
+def scale_fixtures(yum: str, apks: str, factor: int) -> Tuple[str, str]:
+    """Repeat the inventories factor times, renaming the packages of every extra copy
+
+    A copy permutes the letters of the words in each name, on both sides,
+    except for the words the rules key on or add: openssl-devel and
+    openssl-dev become e.g. ywmfqqk-devel and ywmfqqk-dev. Names relate
+    within a copy exactly as in the original, for the alternative rules and
+    for fuzzy similarity, while copies share almost no trigrams. Only
+    exact-name rules (httpd -> apache2) no longer apply. Names made only of
+    rule words (perl, gcc), and RPMs whose renamed name would change whether
+    they are excluded, are repeated unchanged.
+    """
+    if factor == 1:
+        return yum, apks
+
+    header = []
+    packages = []
+    for line in yum.splitlines():
+        if any(RPMExtractor._parse_yum_lines([line])):
+            name_arch, rest = line.split(None, 1)
+            packages.append((*name_arch.rsplit('.', 1), rest))
+        else:
+            header.append(line)
+    apk_lines = [line.split(None, 1) for line in apks.splitlines() if line.strip()]
+    skip = rule_words()
+    excluded = {name: exclusion_rule(name) is not None for name, _, _ in packages}
+
+    yum_out = header + [f"{name}.{arch} {rest}" for name, arch, rest in packages]
+    apk_out = [' '.join(parts) for parts in apk_lines]
+    for copy in range(1, factor):
+        table = copy_letters(copy)
+        renamed = {}
+        for name, arch, rest in packages:
+            if name not in renamed:
+                renamed[name] = rename(name, table, skip)
+                if (exclusion_rule(renamed[name]) is not None) != excluded[name]:
+                    renamed[name] = name
+            yum_out.append(f"{renamed[name]}.{arch} {rest}")
+        for parts in apk_lines:
+            apk_out.append(' '.join([rename(parts[0], table, skip)] + parts[1:]))
+    return '\n'.join(yum_out) + '\n', '\n'.join(apk_out) + '\n'
+
+
+def replay_components(yum: str, apk_fixture: str, apks: str,
+                      fuzzy_threshold: float = DEFAULT_FUZZY_THRESHOLD) -> Tuple[RPMExtractor, APKMatcher]:
+    """Return an RPM extractor and APK matcher replaying recorded output through a FakeContainerRunner"""
+    runner = FakeContainerRunner({RPMExtractor(None).ubi_image: yum})
+    if apk_fixture == WOLFI_STATUS_FIXTURE:
+        matcher = ReplayAPKMatcher(runner, apks, fuzzy_threshold)
+    else:
+        matcher = ReplayAPKMatcher(runner, fuzzy_threshold=fuzzy_threshold)
+        runner.outputs[matcher.chainguard_image] = apks
+    return RPMExtractor(runner), matcher
+
+
+def replay_pipeline(yum: str, apk_fixture: str, apks: str, output_dir: str, measure) -> Tuple[int, int, int]:
+    """Run every mapping stage over recorded output, passing each to measure(stage, func)
+
+    Command output is replayed by a FakeContainerRunner, so the APK inventory
+    is fetched and parsed by the same code as in a real run. Returns the
+    number of RPMs matched and mapped, and of APKs.
+    """
+    for cache in (version_sort_key, evr_sort_key, generate_alternatives):
+        cache.cache_clear()
+
+    extractor, matcher = replay_components(yum, apk_fixture, apks)
+    lines = extractor.container_runner.run_command_iter(extractor.ubi_image, RPMExtractor.YUM_LIST_COMMAND)
+    rpms = measure('parse', lambda: list(RPMExtractor._parse_yum_lines(lines)))
+    latest = measure('latest filter', lambda: extractor._filter_latest_rpms(rpms))
+    kept, _ = measure('exclusions', lambda: extractor._apply_filters(latest))
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        measure('apk index', matcher.load_inventory)
+    results = measure('matching', lambda: match_rpms(matcher, kept))
+
+    rows = [Mapping(rpm.name, result.apk.name if result.apk else '') for rpm, result in zip(kept, results)]
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        measure('csv write', lambda: CSVGenerator.write_csv(rows, os.path.join(output_dir, 'mapping.csv'), True))
+
+    return sum(1 for result in results if result.apk), len(rows), len(matcher.apk_cache)
+
+
+def allocated(build) -> int:
+    """Return the bytes still allocated by the object build() returns"""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = build()  # noqa: F841 - kept alive until measured
+        return tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+
+def best_of(func, repeat: int) -> float:
+    """Return the fastest of repeat timed calls to func"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def bench_version_sort(args):
+    rpms = synthetic_rpms(args.count)
+    extractor = RPMExtractor(None)
+
+    expected = legacy_filter_latest_rpms(rpms)
+    actual = extractor._filter_latest_rpms(rpms)
+    if [id(rpm) for rpm in expected] != [id(rpm) for rpm in actual]:
+        print("Error: sort-key selection differs from the pairwise comparison", file=sys.stderr)
+        sys.exit(1)
+
+    def cold():
+        version_sort_key.cache_clear()
+        evr_sort_key.cache_clear()
+        extractor._filter_latest_rpms(rpms)
+
+    legacy = best_of(lambda: legacy_filter_latest_rpms(rpms), args.repeat)
+    keyed_cold = best_of(cold, args.repeat)
+    keyed_warm = best_of(lambda: extractor._filter_latest_rpms(rpms), args.repeat)
+
+    print(f"Latest-version selection over {len(rpms)} RPMs ({len(actual)} packages)")
+    print(f"  pairwise comparison:   {legacy * 1000:8.1f} ms")
+    print(f"  sort keys (cold cache): {keyed_cold * 1000:7.1f} ms  ({legacy / keyed_cold:.1f}x)")
+    print(f"  sort keys (warm cache): {keyed_warm * 1000:7.1f} ms  ({legacy / keyed_warm:.1f}x)")
+
+
+def bench_records(args):
+    lines = yum_lines(args.count)
+    apk_names = [f"apk-package-{i}" for i in range(args.count)]
+
+    def split(line):
+        pkg_with_arch, version_release, _ = line.split(None, 2)
+        name, arch = pkg_with_arch.rsplit('.', 1)
+        version, release = version_release.rsplit('-', 1)
+        return name, version, release, arch
+
+    def rpm_dicts():
+        return [dict(zip(('name', 'version', 'release', 'arch'), split(line))) for line in lines]
+
+    def rpm_records():
+        return [RPM.from_row(split(line)) for line in lines]
+
+    def apk_dicts():
+        apks = [{'name': name, 'version': 'unknown'} for name in apk_names]
+        return {apk['name']: apk for apk in apks}, {apk['name'].lower(): apk for apk in apks}
+
+    def apk_records():
+        apks = [APK.from_row((name, 'unknown')) for name in apk_names]
+        return {apk.name: apk for apk in apks}, {apk.name.lower(): apk for apk in apks}
+
+    print(f"Memory per entry over {args.count} entries (tracemalloc)")
+    for label, legacy, records in (
+        ('RPM list', rpm_dicts, rpm_records),
+        ('APK cache (both views)', apk_dicts, apk_records),
+    ):
+        legacy_bytes = allocated(legacy) / args.count
+        record_bytes = allocated(records) / args.count
+        print(f"  {label}:")
+        print(f"    dicts:   {legacy_bytes:7.1f} bytes")
+        print(f"    records: {record_bytes:7.1f} bytes  ({1 - record_bytes / legacy_bytes:.0%} smaller)")
+
+
+def bench_pipeline(args):
+    yum, apk_fixture, apks, description = load_fixtures(args.fixtures)
+    print(f"Replaying {description}")
+    # Peak memory per stage needs tracemalloc.reset_peak
+    trace_memory = hasattr(tracemalloc, 'reset_peak')
+    if not trace_memory:
+        print("Peak memory is not measured: it needs Python 3.9 or later")
+
+    for factor in args.scale:
+        scaled_yum, scaled_apks = scale_fixtures(yum, apks, factor)
+        timings = {stage: float('inf') for stage in PIPELINE_STAGES}
+        peaks = {}
+
+        def timed(stage, func):
+            start = time.perf_counter()
+            result = func()
+            timings[stage] = min(timings[stage], time.perf_counter() - start)
+            return result
+
+        def traced(stage, func):
+            tracemalloc.reset_peak()
+            start = tracemalloc.get_traced_memory()[0]
+            result = func()
+            peaks[stage] = tracemalloc.get_traced_memory()[1] - start
+            return result
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            for _ in range(args.repeat):
+                matched, mapped, apk_count = replay_pipeline(
+                    scaled_yum, apk_fixture, scaled_apks, output_dir, timed)
+            if trace_memory:
+                tracemalloc.start()
+                try:
+                    replay_pipeline(scaled_yum, apk_fixture, scaled_apks, output_dir, traced)
+                finally:
+                    tracemalloc.stop()
+
+        print(f"\nScale {factor}x: {scaled_yum.count(chr(10))} yum lines, "
+              f"{apk_count} APKs, {matched} of {mapped} RPMs matched ({matched / mapped:.0%})")
+        print(f"  {'stage':<14} {'time':>10}  {'peak memory':>12}")
+        for stage in PIPELINE_STAGES:
+            peak = f"{peaks[stage] / 2**20:8.1f} MiB" if trace_memory else f"{'-':>12}"
+            print(f"  {stage:<14} {timings[stage] * 1000:7.1f} ms  {peak}")
+        print(f"  {'total':<14} {sum(timings.values()) * 1000:7.1f} ms")
+
+
+def load_labels(path: str) -> dict:
+    """Return RPM name -> set of correct APK names (empty if none is) from a labels file"""
+    labels = {}
+    with open(path) as f:
+        for line in f:
+            if line.strip() and not line.startswith('#'):
+                rpm_name, *apk_names = line.split()
+                labels[rpm_name] = set(apk_names) - {'-'}
+    return labels
+
+
+def bench_fuzzy(args):
+    yum, apk_fixture, apks, description = load_fixtures(args.fixtures)
+    labels_path = os.path.join(args.fixtures, FUZZY_LABELS)
+    if not os.path.exists(labels_path):
+        print(f"Error: {labels_path} not found; fuzzy labels only exist for the committed fixtures",
+              file=sys.stderr)
+        sys.exit(1)
+    labels = load_labels(labels_path)
+
+    extractor, _ = replay_components(yum, apk_fixture, apks)
+    lines = extractor.container_runner.run_command_iter(extractor.ubi_image, RPMExtractor.YUM_LIST_COMMAND)
+    rpms = [rpm for rpm in extractor._filter_latest_rpms(list(RPMExtractor._parse_yum_lines(lines)))
+            if rpm.name in labels]
+
+    print(f"Fuzzy matches of {len(rpms)} labelled RPMs ({sum(1 for rpm in rpms if labels[rpm.name])} "
+          f"with a correct APK) in {description}")
+    print(f"  {'threshold':>9}  {'matches':>7}  {'correct':>7}  {'precision':>9}  {'recall':>6}")
+    for threshold in sorted(args.thresholds):
+        _, matcher = replay_components(yum, apk_fixture, apks, threshold)
+        with contextlib.redirect_stdout(open(os.devnull, 'w')):
+            matcher.load_inventory()
+        matches = correct = expected = 0
+        for rpm in rpms:
+            result = matcher.explain_match(rpm)
+            if result.strategy not in (STRATEGY_FUZZY, STRATEGY_UNMATCHED):
+                continue  # Matched before the fuzzy stage, whatever the threshold
+            expected += bool(labels[rpm.name])
+            if result.strategy == STRATEGY_FUZZY:
+                matches += 1
+                correct += result.apk.name in labels[rpm.name]
+        precision = f"{correct / matches:.0%}" if matches else '-'
+        recall = f"{correct / expected:.0%}" if expected else '-'
+        print(f"  {threshold:>9.2f}  {matches:>7}  {correct:>7}  {precision:>9}  {recall:>6}")
+
+
+def record_fixtures(args):
+    """Record real inventory output for the pipeline benchmark (needs a container runtime)"""
+    runner = ContainerRunner(args.runtime)
+    extractor = RPMExtractor(runner)
+    matcher = APKMatcher(runner)
+    os.makedirs(args.fixtures, exist_ok=True)
+
+    print(f"Recording {extractor.ubi_image} yum output...")
+    with open(os.path.join(args.fixtures, YUM_FIXTURE), 'w') as f:
+        f.write(runner.run_command(extractor.ubi_image, RPMExtractor.YUM_LIST_COMMAND))
+
+    try:
+        filename, output = WOLFI_STATUS_FIXTURE, matcher._wolfi_package_status()
+    except (subprocess.CalledProcessError, FileNotFoundError) as e:
+        print(f"  Warning: wolfi-package-status not available ({e}), recording apk search")
+        filename, output = APK_SEARCH_FIXTURE, matcher._apk_search()
+    with open(os.path.join(args.fixtures, filename), 'w') as f:
+        f.write(output)
+
+    print(f"Fixtures written to {args.fixtures}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks for rpm_to_apk_mapper.py')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement, best is reported (default: 3)')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    version_sort = subparsers.add_parser('version-sort', help='Latest-version selection')
+    version_sort.add_argument('--count', type=int, default=100000, help='Synthetic RPM entries (default: 100000)')
+    version_sort.set_defaults(func=bench_version_sort)
+
+    records = subparsers.add_parser('records', help='Memory used by RPM and APK records')
+    records.add_argument('--count', type=int, default=100000, help='Synthetic entries (default: 100000)')
+    records.set_defaults(func=bench_records)
+
+    pipeline = subparsers.add_parser('pipeline', help='Every mapping stage, replaying recorded fixtures')
+    pipeline.add_argument('--scale', type=int, nargs='+', default=[1, 10], metavar='N',
+                          help='Inventory scale factors to run (default: 1 10)')
+    pipeline.add_argument('--fixtures', default=FIXTURES_DIR, help='Fixture directory (default: %(default)s)')
+    pipeline.set_defaults(func=bench_pipeline)
+
+    fuzzy = subparsers.add_parser('fuzzy', help='Fuzzy match precision and recall per threshold')
+    fuzzy.add_argument('--thresholds', type=float, nargs='+', default=[0.4, 0.5, 0.6, 0.7, 0.8, 0.9],
+                       metavar='SCORE', help='Fuzzy thresholds to measure (default: 0.4 to 0.9)')
+    fuzzy.add_argument('--fixtures', default=FIXTURES_DIR, help='Fixture directory (default: %(default)s)')
+    fuzzy.set_defaults(func=bench_fuzzy)
+
+    record = subparsers.add_parser('record', help='Record fixtures for the pipeline benchmark')
+    record.add_argument('--runtime', choices=['docker', 'podman'], default='docker',
+                        help='Container runtime to use (default: docker)')
+    record.add_argument('--fixtures', default=FIXTURES_DIR, help='Fixture directory (default: %(default)s)')
+    record.set_defaults(func=record_fixtures)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,42 +1,1152 @@
 #!/usr/bin/env python3
 """
 RPM to APK Mapper
-Maps Red Hat UBI 9 RPMs to equivalent Chainguard APKs
+Maps Red Hat UBI RPMs to equivalent Chainguard APKs
 """
 
 import subprocess
 import csv
 import sys
+import os
 import re
-from typing import List, Dict, Optional, Tuple
-from collections import defaultdict
+import heapq
+import math
+import json
+import time
+import hashlib
+import tempfile
+import gzip
+import bz2
+import lzma
+import shutil
+import sqlite3
+import tarfile
+import struct
+import xml.etree.ElementTree as ET
+import multiprocessing
+import signal
+import shlex
+import uuid
+import atexit
+import socketserver
+import stat
+import threading
+import traceback
+from contextlib import contextmanager
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlsplit
+from typing import Callable, Iterable, Iterator, List, Dict, NamedTuple, Optional, Tuple
+from collections import Counter, defaultdict, deque
 import argparse
 
+# Versioned APK name shapes, matched once per APK when the cache is indexed
+VERSIONED_DASH_RE = re.compile(r'^(.*)-(\d+)$')         # lld-21
+VERSIONED_DOTTED_RE = re.compile(r'(\d+)\.(\d+)$')     # lua5.4, python3.12
+VERSIONED_PLAIN_RE = re.compile(r'(\d+)$')             # python3, ruby3
+
+# Minimum trigram similarity of a fuzzy match, and how many candidates
+# APKMatcher.fuzzy_candidates returns by default. The threshold is
+# provisional: it has only been checked on a small hand-labelled sample
+# (benchmarks/benchmark.py fuzzy), not against a full Wolfi inventory
+DEFAULT_FUZZY_THRESHOLD = 0.6
+FUZZY_TOP_K = 5
+
+# Packaging suffixes dropped from an RPM name before fuzzy matching
+FUZZY_STRIP_SUFFIXES = ('-devel', '-libs', '-tools', '-utils', '-doc', '-docs', '-common')
+
+# Provides matched between RPMs and APKs, written the APKINDEX way:
+# so:libfoo.so.1, cmd:foo and pc:foo
+PROVIDES_PREFIXES = ('so:', 'cmd:', 'pc:')
+SONAME_PROVIDE_RE = re.compile(r'^([^\s()/]+\.so(?:\.[^\s()]*)?)\(')  # libfoo.so.1()(64bit)
+PKGCONFIG_PROVIDE_RE = re.compile(r'^pkgconfig\(([^()\s]+)\)$')       # pkgconfig(foo)
+COMMAND_DIRS = {'/usr/bin/', '/usr/sbin/', '/bin/', '/sbin/'}
+
+# Share of an RPM's provides an APK needs to match it by provides
+PROVIDES_MIN_COVERAGE = 0.5
+
+# Numeric and alphabetic runs of an RPM version, split on '.', '-' and '_'
+VERSION_SEGMENT_RE = re.compile(r'(\d+)|([^\d.\-_]+)')
+
+# An APK version: 1.2.3, a letter, _suffixes, a ~commit hash and -rN, as in 1.2.3a_rc1-r4
+APK_VERSION_FORMAT_RE = re.compile(r'^(\d+(?:\.\d+)*)([a-z]?)((?:_[a-z]+\d*)*)(?:~[0-9a-f]+)?(?:-r(\d+))?$')
+APK_SUFFIX_RE = re.compile(r'_([a-z]+)(\d*)')
+# Suffix order of apk-tools; a version without one sorts between rc and cvs
+APK_SUFFIXES = {'alpha': 0, 'beta': 1, 'pre': 2, 'rc': 3, 'cvs': 5, 'svn': 6, 'git': 7, 'hg': 8, 'p': 9}
+APK_NO_SUFFIX = 4
+
+# UBI releases and architectures that can be mapped, and the container
+# platform each architecture's yum inventory is read on
+UBI_IMAGE = "registry.access.redhat.com/ubi{release}/ubi:latest"
+UBI_RELEASES = ('8', '9', '10')
+DEFAULT_RELEASE = '9'
+ARCH_PLATFORMS = {
+    'x86_64': 'linux/amd64',
+    'aarch64': 'linux/arm64',
+    'ppc64le': 'linux/ppc64le',
+    's390x': 'linux/s390x',
+}
+DEFAULT_ARCH = 'x86_64'
+
+# Packages whose version is the distribution release of an image's installed
+# RPMs, e.g. redhat-release 9.4 -> release 9
+DISTRO_RELEASE_PACKAGES = {
+    'redhat-release', 'centos-stream-release', 'almalinux-release',
+    'rocky-release', 'oraclelinux-release', 'fedora-release-common',
+}
+
+# Most RPM inventories discover_inventories reads at once, e.g. with many images
+INVENTORY_WORKERS = 16
+
+# RPM names whose alternatives are kept. Bounded, since a server generates
+# them for any name a client sends
+ALTERNATIVES_CACHE_SIZE = 65536
+
+
+def arch_preference(arch: str) -> Dict[str, int]:
+    """Preferred architectures when several builds share the latest version"""
+    return {arch: 2, 'noarch': 1}
+
+
+# Exclusion rules, applied by RPMExtractor._apply_filters. Each rule class is
+# compiled once into a single alternation regex or set lookup.
+
+# Packages not typically used in containers (GUI, desktop, printing, etc.).
+# Patterns are matched against the lowercased package name.
+CONTAINER_EXCLUDE_PATTERNS = [
+    # Desktop/GUI
+    'gtk', 'qt5', 'gnome', 'kde', 'xorg', 'X11', 'wayland', 'mesa',
+    'adwaita', 'hicolor', 'icon-theme', 'desktop', 'gdk-pixbuf',
+    # Printing
+    'cups', 'ghostscript', 'printer',
+    # Display/Graphics (non-essential)
+    'libX', 'libGL', 'vulkan', 'libdrm', 'libva', 'libvdpau',
+    # Audio
+    'pulseaudio', 'alsa', 'sound', 'audio', 'gstreamer',
+    # Fonts (usually not needed in containers)
+    '-fonts', 'fontconfig', 'fontenc', 'font-',
+    # Hardware-specific
+    'pciutils', 'usbutils', 'bluez', 'wireless',
+    # Trackers/indexers
+    'tracker', 'baloo',
+    # Screensavers
+    'screensaver', 'xscreensaver',
+    # Session management
+    'session-', 'polkit', 'udisks', 'upower',
+]
+
+CONTAINER_EXCLUDE_EXACT = {
+    'at-spi2-atk', 'at-spi2-core', 'colord', 'colord-libs',
+    'dconf', 'gsettings-desktop-schemas', 'gvfs-client',
+    'flatpak-session-helper', 'flatpak-spawn',
+    'shared-mime-info', 'xkeyboard-config', 'iso-codes',
+}
+
+# Red Hat-specific packages
+# NOTE: Toolsets (gcc-toolset-, llvm-toolset, etc.) are NOT filtered - they'll be matched to APK equivalents
+REDHAT_PATTERNS = [
+    'redhat-',           # Red Hat branding
+    'rhel-',             # RHEL-specific
+    'subscription-',     # Subscription manager
+    'insights-',         # Red Hat Insights
+]
+
+# Exact package names to exclude
+REDHAT_EXACT = {
+    # Build and packaging tools (Red Hat-specific)
+    'redhat-rpm-config',
+    'rpm-build',
+    'rpm-build-libs',
+    'rpm-sign-libs',
+    'rpm-plugin-selinux',
+    'rpm-plugin-systemd-inhibit',
+    'rpmdevtools',
+    'rpmlint',
+    'scl-utils',
+    'scl-utils-build',
+
+    # Red Hat branding
+    'redhat-logos-httpd',
+
+    # Macros (Red Hat-specific)
+    'kernel-srpm-macros',
+    'efi-srpm-macros',
+    'ghc-srpm-macros',
+    'go-srpm-macros',
+    'ocaml-srpm-macros',
+    'openblas-srpm-macros',
+    'perl-srpm-macros',
+    'python-srpm-macros',
+    'qt5-srpm-macros',
+    'rust-srpm-macros',
+
+    # SELinux policies (Red Hat-specific configurations)
+    'selinux-policy',
+    'selinux-policy-targeted',
+    'container-selinux',
+
+    # Package managers (RPM-specific, not APK)
+    'dnf-automatic',
+    'dnf-plugins-core',
+    'yum-utils',
+    'microdnf',
+
+    # Init system (systemd is RHEL-centric in this context)
+    'initscripts',
+    'initscripts-rename-device',
+    'initscripts-service',
+
+    # Red Hat-specific system tools
+    'librhsm',
+
+    # Annobin (Red Hat security tool)
+    'annobin',
+
+    # Software Collections (utilities only, not toolsets themselves)
+    'scl-utils',
+    'scl-utils-build',
+
+    # SRPM macros
+    'fonts-srpm-macros',
+    'pyproject-srpm-macros',
+
+    # Note: go-srpm-macros, rust-srpm-macros, etc. stay in, but toolsets (go-toolset, rust-toolset) are NOT excluded
+}
+
+# Non-open source packages
+PROPRIETARY_PREFIXES = [
+    'adobe-',            # Adobe proprietary products
+]
+
+PROPRIETARY_EXACT = {
+    # Adobe products (proprietary)
+    'adobe-mappings-cmap',
+    'adobe-mappings-cmap-deprecated',
+    'adobe-mappings-pdf',
+    'adobe-source-code-pro-fonts',
+}
+
+# EOL software versions that should be filtered
+EOL_PACKAGES = {
+    # .NET/ASP.NET 6.0 (EOL November 2024)
+    'aspnetcore-runtime-6.0',
+    'aspnetcore-targeting-pack-6.0',
+    'dotnet-apphost-pack-6.0',
+    'dotnet-hostfxr-6.0',
+    'dotnet-runtime-6.0',
+    'dotnet-sdk-6.0',
+    'dotnet-targeting-pack-6.0',
+    'dotnet-templates-6.0',
+
+    # .NET/ASP.NET 7.0 (EOL May 2024)
+    'aspnetcore-runtime-7.0',
+    'aspnetcore-targeting-pack-7.0',
+    'dotnet-apphost-pack-7.0',
+    'dotnet-hostfxr-7.0',
+    'dotnet-runtime-7.0',
+    'dotnet-sdk-7.0',
+    'dotnet-targeting-pack-7.0',
+    'dotnet-templates-7.0',
+
+    # .NET host infrastructure (all versions - no direct APK equivalents)
+    'dotnet-host',
+    'dotnet-hostfxr-8.0',
+    'dotnet-hostfxr-9.0',
+    'dotnet-hostfxr-10.0',
+
+    # Note: Java 8 (OpenJDK 8) is NOT EOL and has Chainguard equivalents
+    # Note: Python 3.11 is NOT EOL (EOL October 2027) and is still widely used
+}
+
+
+def _alternation(patterns, template: str = '{}'):
+    """Compile patterns (literal strings) into one alternation regex"""
+    return re.compile(template.format('|'.join(re.escape(p) for p in patterns)))
+
+
+CONTAINER_EXCLUDE_RE = _alternation(CONTAINER_EXCLUDE_PATTERNS)
+# "rpm" (RPM-specific packages) or "-src" (source packages), matched lowercased
+REDHAT_NAME_RE = re.compile(r'rpm|-src')
+REDHAT_PATTERN_RE = _alternation(REDHAT_PATTERNS)
+# Packages ending in 64 or 64_ (64-bit architecture variants), checked lowercased
+# for common false positives where 64 is part of the name (Base64, SHA256, etc.)
+VARIANT_64_RE = re.compile(r'64_?$')
+VARIANT_64_ALLOWED_RE = re.compile(r'base64|sha256|sha512|md5')
+# -selinux (SELinux-specific), -filesystem (filesystem layouts), iSCSI packages
+VARIANT_RE = re.compile(r'-selinux$|-filesystem$|^iscsi')
+# Legacy and DNF packages, matched lowercased
+VARIANT_LOWER_RE = re.compile(r'legacy|dnf')
+PROPRIETARY_PREFIX_RE = _alternation(PROPRIETARY_PREFIXES, '^(?:{})')
+
+# Filter classes, in the order they are applied
+FILTER_CONTAINER = 'container'
+FILTER_REDHAT = 'redhat'
+FILTER_VARIANT = 'apache-variant'
+FILTER_PROPRIETARY = 'proprietary-eol'
+
+
+def exclusion_rule(name: str) -> Optional[Tuple[str, str]]:
+    """Return (filter class, rule) for the first rule excluding name, or None"""
+    lower = name.lower()
+
+    # Packages not typically used in containers
+    if name in CONTAINER_EXCLUDE_EXACT:
+        return FILTER_CONTAINER, 'exact name'
+    match = CONTAINER_EXCLUDE_RE.search(lower)
+    if match:
+        return FILTER_CONTAINER, f"contains '{match.group()}'"
+
+    # Red Hat-specific packages
+    match = REDHAT_NAME_RE.search(lower)
+    if match:
+        return FILTER_REDHAT, f"contains '{match.group()}'"
+    if name in REDHAT_EXACT:
+        return FILTER_REDHAT, 'exact name'
+    match = REDHAT_PATTERN_RE.search(name)
+    if match:
+        return FILTER_REDHAT, f"contains '{match.group()}'"
+
+    # Apache modules (mod_*), 64-bit variants, -selinux, -filesystem, iscsi and legacy packages
+    if name.startswith('mod_'):
+        return FILTER_VARIANT, "starts with 'mod_'"
+    if VARIANT_64_RE.search(name):
+        # Names ending in 64 are only judged by the 64-bit variant rule
+        if not VARIANT_64_ALLOWED_RE.search(lower):
+            return FILTER_VARIANT, '64-bit variant'
+    else:
+        match = VARIANT_RE.search(name) or VARIANT_LOWER_RE.search(lower)
+        if match:
+            return FILTER_VARIANT, f"matches '{match.group()}'"
+
+    # Non-open source and EOL packages
+    if name in EOL_PACKAGES:
+        return FILTER_PROPRIETARY, 'EOL'
+    if name in PROPRIETARY_EXACT:
+        return FILTER_PROPRIETARY, 'exact name'
+    match = PROPRIETARY_PREFIX_RE.search(name)
+    if match:
+        return FILTER_PROPRIETARY, f"starts with '{match.group()}'"
+
+    return None
+
+
+# Alternative APK names
+
+# Direct tool/package equivalents
+TOOL_MAPPINGS = {
+    # Package managers (note: some RPM-specific ones filtered out earlier)
+    'rpm-libs': 'apk-tools',
+    # Network
+    'NetworkManager': 'network-manager',
+    'NetworkManager-libnm': 'network-manager',
+    # Web servers
+    'httpd': 'apache2',
+    'httpd-core': 'apache2',
+    'httpd-tools': 'apache2-utils',
+    'httpd-devel': 'apache2-dev',
+    # Databases
+    'mariadb': 'mariadb-client',
+    'mariadb-common': 'mariadb-common',
+    'mysql': 'mariadb-client',
+    'mysql-libs': 'mariadb-connector-c',
+    'mysql-common': 'mariadb-common',
+    'postgresql': 'postgresql-client',
+    'postgresql-private-libs': 'libpq',
+    # Utilities
+    'net-tools': 'net-tools-deprecated',
+    'coreutils-common': 'coreutils',
+    'util-linux-user': 'util-linux',
+    'procps-ng': 'procps',
+    # APR
+    'apr': 'apr-util',
+    'apr-devel': 'apr-util-dev',
+    # Augeas
+    'augeas-libs': 'augeas',
+    # Bind
+    'bind-libs': 'bind',
+    'bind-utils': 'bind-tools',
+    'bind-license': 'bind',
+    # Crypto
+    'compat-openssl11': 'openssl',
+    'openssl-libs': 'openssl',
+    'openssl-devel': 'openssl-dev',
+    # System
+    'shadow-utils-subid': 'shadow',
+    'audit-libs': 'audit',
+    'pam': 'linux-pam',
+    'libselinux': 'libselinux',
+    'libselinux-devel': 'libselinux-dev',
+    # Compression
+    'bzip2-libs': 'bzip2',
+    'xz-libs': 'xz',
+    'lz4-libs': 'lz4',
+    'libzstd': 'zstd',
+    # Build tools
+    'binutils-gold': 'binutils',
+    'make': 'make',
+    # Container tools
+    'podman-docker': 'podman',
+    'podman-remote': 'podman',
+    'containers-common-extra': 'containers-common',
+    'containernetworking-plugins': 'cni-plugins',
+    'aardvark-dns': 'aardvark-dns',  # Direct match attempt
+    # LLVM/Clang
+    'clang-libs': 'clang',
+    'llvm-libs': 'llvm',
+    'compiler-rt': 'compiler-rt',
+    # Rust
+    'cargo-doc': 'cargo',
+    'rust-analysis': 'rust',
+    'rust-doc': 'rust',
+    'rust-src': 'rust',
+    'clippy': 'rust',
+    'rustfmt': 'rust',
+    # Go
+    'golang-bin': 'go',
+    'golang': 'go',
+    'golang-docs': 'go',
+    'golang-misc': 'go',
+    'golang-src': 'go',
+    'golang-tests': 'go',
+    # Node.js
+    'nodejs-libs': 'nodejs',
+    'nodejs-docs': 'nodejs',
+    'nodejs-full-i18n': 'nodejs',
+    # Perl
+    'perl-interpreter': 'perl',
+    'perl-libs': 'perl',
+    'perl-macros': 'perl',
+    # Various libs
+    'dbus-libs': 'dbus',
+    'dbus-tools': 'dbus',
+    'dbus-daemon': 'dbus',
+    'elfutils-libs': 'elfutils',
+    'elfutils-libelf': 'elfutils',
+    'file-libs': 'file',
+    'gdbm-libs': 'gdbm',
+    'keyutils-libs': 'keyutils',
+    'kmod-libs': 'kmod',
+    'libacl': 'acl',
+    'libattr': 'attr',
+    'libblkid': 'util-linux',
+    'libcap': 'libcap',
+    'libcom_err': 'e2fsprogs',
+    'libfdisk': 'util-linux',
+    'libmount': 'util-linux',
+    'libsmartcols': 'util-linux',
+    'libuuid': 'util-linux',
+    'ncurses-libs': 'ncurses',
+    'ncurses-c++-libs': 'ncurses',
+    'pcre-cpp': 'pcre',
+    'pcre-utf16': 'pcre',
+    'pcre-utf32': 'pcre',
+    'pcre2-utf16': 'pcre2',
+    'pcre2-utf32': 'pcre2',
+    'readline': 'readline',
+    'sqlite-libs': 'sqlite',
+    # Debugger
+    'gdb-headless': 'gdb',
+    # Archive tools
+    'bsdtar': 'libarchive-tools',
+    # C preprocessor
+    'cpp': 'gcc',
+    # Cyrus SASL
+    'cyrus-sasl-lib': 'cyrus-sasl',
+    'cyrus-sasl-gssapi': 'cyrus-sasl',
+    'cyrus-sasl-plain': 'cyrus-sasl',
+    # elfutils
+    'elfutils-debuginfod-client': 'elfutils',
+    # hunspell dictionaries
+    'hunspell-en-US': 'hunspell-dictionary-en',
+    'hunspell-en': 'hunspell-dictionary-en',
+    # Git
+    'git-core': 'git',
+    # Vim
+    'vim-common': 'vim',
+    # Nginx
+    'nginx-core': 'nginx-mainline',
+    # Lua
+    'lua-libs': 'lua5.4-libs',
+    # GCC compilers
+    'gcc-c++': 'gcc',
+    'gcc-gfortran': 'gfortran',
+    # PHP
+    'php': 'php-8.5',
+    # Python
+    'python3-debug': 'py3-debugpy',
+    # Ruby base packages
+    'rubygems': 'ruby-3.4',
+    'rubygems-devel': 'ruby-3.4-dev',
+    # GCC toolset base
+    'gcc-toolset-15': 'gcc',
+    # OpenSSH
+    'openssh-clients': 'openssh-client',
+    # Keyboard
+    'kbd-misc': 'kbd',
+    # Libtool
+    'libtool-ltdl': 'libtool',
+}
+
+# Container tools
+CONTAINER_MAPPINGS = {
+    'podman-docker': 'podman',
+    'podman-remote': 'podman',
+    'skopeo': 'skopeo',
+    'buildah': 'buildah',
+    'containers-common': 'containers-common',
+}
+
+# Common package name differences
+NAME_MAPPINGS = {
+    'procps-ng': 'procps',
+    'util-linux-user': 'util-linux',
+    'shadow-utils-subid': 'shadow',
+    'kernel-headers': 'linux-headers',
+    'glibc-headers': 'glibc-dev',
+    'glibc-devel': 'glibc-dev',
+    'glibc-static': 'glibc-static',
+    'man-db': 'man-db',
+    'cronie': 'cronie',
+    'cronie-anacron': 'cronie',
+}
+
+# Compiler runtime libraries
+COMPILER_RUNTIME_LIBS = {'libgcc', 'libstdc++', 'libgomp', 'libgfortran'}
+
+# Compilers/tools whose -devel packages are tried with a version number
+VERSIONED_DEVEL_BASES = {'clang', 'llvm', 'gcc', 'python', 'perl', 'ruby', 'php', 'node', 'nodejs'}
+
+# A version number embedded in an APK name (21, 1.91, 8.3)
+APK_VERSION_RE = re.compile(r'\d+(?:\.\d+)*')
+MAJOR_VERSION_RE = re.compile(r'\d+')
+MAJOR_MINOR_VERSION_RE = re.compile(r'\d+\.\d+')
+GO_RUST_VERSION_RE = re.compile(r'1\.\d+')
+
+
+class VersionFamily(NamedTuple):
+    """Candidate APK names {prefix}{version}{suffix}, for whichever versions exist
+
+    Stands in for a sweep over hardcoded versions: APKMatcher resolves it to
+    the newest version present in its APK index, preferring earlier
+    templates when versions are equal.
+    """
+    templates: Tuple[Tuple[str, str], ...]  # (prefix, suffix) pairs
+    version: re.Pattern  # Versions the family accepts (full match)
+
+    def accepts(self, prefix: str, suffix: str, version: str) -> bool:
+        """Return whether the lowercase APK name {prefix}{version}{suffix} belongs to the family"""
+        return (any(prefix == p.lower() and suffix == s.lower() for p, s in self.templates)
+                and self.version.fullmatch(version) is not None)
+
+
+# Toolset meta packages and the versioned APKs they are tried against
+LLVM_TOOLSET_ALTERNATIVES = (
+    VersionFamily((('llvm', ''), ('llvm-', ''), ('llvm', '-tools'), ('llvm-', '-tools')), MAJOR_VERSION_RE),
+)
+RUST_TOOLSET_ALTERNATIVES = ('rust', VersionFamily((('rust-', ''),), GO_RUST_VERSION_RE))
+GO_TOOLSET_ALTERNATIVES = ('go', VersionFamily((('go-', ''),), GO_RUST_VERSION_RE))
+
+ASPNETCORE_RE = re.compile(r'^aspnetcore-(.+?)-(\d+)\.(\d+)$')
+DOTNET_RE = re.compile(r'^dotnet-(.+?)-(\d+)\.(\d+)$')
+GCC_TOOLSET_BASE_RE = re.compile(r'^gcc-toolset-(\d+)$')
+GCC_TOOLSET_RE = re.compile(r'^gcc-toolset-(\d+)-(.+)$')
+PYTHON_VERSIONED_RE = re.compile(r'^python(\d+)\.(\d+)(.*)$')
+JAVA_OPENJDK_RE = re.compile(r'^java-(\d+)-openjdk(.*)$')
+JAVA8_OPENJDK_RE = re.compile(r'^java-1\.8\.0-openjdk(.*)$')
+DIGITS_RE = re.compile(r'\d+')
+FFTW_LIBS_RE = re.compile(r'^fftw-libs-(.+)$')
+NGINX_MOD_RE = re.compile(r'^nginx-mod-(.+)$')
+
+
+def _alt_aspnetcore(rpm_name, match):
+    # aspnetcore-runtime-10.0 -> aspnet-10-runtime
+    component, major = match.group(1), match.group(2)
+    return [f'aspnet-{major}-{component}', f'aspnet{major}-{component}',
+            f'dotnet-{major}-{component}', f'dotnet{major}-{component}']
+
+
+def _alt_dotnet(rpm_name, match):
+    component, major = match.group(1), match.group(2)
+    alternatives = [f'dotnet-{major}-{component}', f'dotnet{major}-{component}',
+                    f'dotnet-{component}-{major}']
+    # Special case for dotnet-sdk-aot-10.0 -> dotnet-10-aot
+    if component == 'sdk-aot':
+        alternatives.append(f'dotnet-{major}-aot')
+    return alternatives
+
+
+def _alt_gcc_toolset_base(rpm_name, match):
+    version = match.group(1)
+    return [f'gcc-{version}', f'gcc-{version}-default']
+
+
+def _alt_gcc_toolset(rpm_name, match):
+    # gcc-toolset-12-gcc -> gcc-12, gcc-12-default, etc.
+    version, component = match.group(1), match.group(2)
+    if component == 'gcc':
+        return [f'gcc-{version}', f'gcc-{version}-default', 'gcc']
+    if component == 'gcc-c++':
+        # C++ is part of gcc package
+        return [f'g++-{version}', f'gcc-{version}']
+    if component == 'gcc-gfortran':
+        # Fortran might be part of gcc
+        return [f'gfortran-{version}', f'gcc-{version}']
+    if component == 'binutils':
+        # Usually no versioned binutils
+        return ['binutils']
+    if component == 'gdb':
+        return ['gdb']
+    if component.startswith('lib'):
+        # Library packages (libstdc++, libasan, etc.) - try gcc package
+        return [f'gcc-{version}', component]
+    if component in ('runtime', 'build'):
+        # Meta packages - map to main gcc
+        return [f'gcc-{version}']
+    return [f'{component}-{version}', f'gcc-{version}']
+
+
+def _alt_devel(rpm_name, match):
+    # clang-devel -> clang-dev, then the newest clang-{N}-dev or clang{N}-dev
+    base = rpm_name[:-6]
+    alternatives = [f'{base}-dev']
+    if base in VERSIONED_DEVEL_BASES:
+        alternatives.append(VersionFamily(((f'{base}-', '-dev'), (base, '-dev')), MAJOR_VERSION_RE))
+    return alternatives
+
+
+def _alt_libs(rpm_name, match):
+    base = rpm_name[:-5]
+    return [base, f'lib{base}', f'{base}-libs']
+
+
+def _alt_tools(rpm_name, match):
+    base = rpm_name[:-6]
+    return [base, f'{base}-utils', f'{base}-tools']
+
+
+def _alt_lib_prefix(rpm_name, match):
+    if len(rpm_name) <= 3:
+        return []
+    alternatives = [rpm_name[3:]]
+    # If it ends in -devel, try without lib and with -dev
+    if rpm_name.endswith('-devel'):
+        alternatives.append(f'{rpm_name[3:-6]}-dev')
+    return alternatives
+
+
+def _alt_python_versioned(rpm_name, match):
+    # python3.11-requests -> py3.11-requests (most common in Chainguard), then other patterns
+    major, minor, suffix = match.groups()
+    alternatives = [f'py{major}.{minor}{suffix}', f'python-{major}.{minor}{suffix}',
+                    f'python{major}.{minor}{suffix}', f'py{major}{suffix}', f'python{major}{suffix}']
+    if not suffix:
+        alternatives += ['python3', 'python']
+    return alternatives
+
+
+def _alt_java_openjdk(rpm_name, match):
+    # java-17-openjdk -> openjdk-17
+    version, suffix = match.groups()
+    alternatives = [f'openjdk-{version}{suffix}', f'openjdk{version}{suffix}', f'java-{version}{suffix}']
+    # -headless suffix usually maps to base package
+    if suffix == '-headless':
+        alternatives += [f'openjdk-{version}', f'openjdk-{version}-jre']
+    elif suffix == '-devel':
+        alternatives += [f'openjdk-{version}-default-jdk', f'openjdk-{version}-jdk']
+    return alternatives
+
+
+def _alt_java8_openjdk(rpm_name, match):
+    # java-1.8.0-openjdk -> openjdk-8
+    suffix = match.group(1)
+    alternatives = [f'openjdk-8{suffix}', 'openjdk-8', 'openjdk-8-jre',
+                    'openjdk-8-default-jvm', 'openjdk-8-default-jdk']
+    if suffix == '-headless':
+        alternatives.append('openjdk-8')
+    elif suffix == '-devel':
+        alternatives += ['openjdk-8-default-jdk', 'openjdk-8-dev']
+    return alternatives
+
+
+def _alt_perl(rpm_name, match):
+    # perl-Something -> perl-something, then without the perl- prefix
+    return [rpm_name.lower(), rpm_name[5:].lower()]
+
+
+def _alt_rubygem(rpm_name, match):
+    # rubygem-bundler -> newest ruby3.x-bundler (Chainguard uses versioned ruby packages)
+    gem_name = rpm_name[8:]
+    alternatives = [VersionFamily((('ruby', f'-{gem_name}'),), MAJOR_MINOR_VERSION_RE)]
+    # Fallback: Try older patterns
+    alternatives += [f'ruby-{gem_name}', gem_name]
+    # Common Ruby gems are part of the ruby package
+    if gem_name in ('bundler', 'rake', 'rdoc', 'irb'):
+        alternatives.append('ruby')
+    return alternatives
+
+
+def _alt_python3_module(rpm_name, match):
+    # python3-setuptools -> py3-setuptools
+    module_name = rpm_name[8:]
+    return [f'py3-{module_name}', f'python-{module_name}', module_name]
+
+
+def _alt_php_module(rpm_name, match):
+    # php-xml -> newest php-8.x-xml or php8.x-xml, then php-xml
+    module_name = rpm_name[4:]
+    return [
+        VersionFamily((('php-', f'-{module_name}'), ('php', f'-{module_name}')), MAJOR_MINOR_VERSION_RE),
+        f'php-{module_name}',
+    ]
+
+
+def _alt_php_pecl(rpm_name, match):
+    ext_name = rpm_name[9:]
+    return [f'php-{ext_name}', f'php-pecl-{ext_name}',
+            VersionFamily((('php-', f'-{ext_name}'),), MAJOR_MINOR_VERSION_RE)]
+
+
+def _alt_without_digits(rpm_name, match):
+    # compat-openssl11 -> openssl
+    no_ver = DIGITS_RE.sub('', rpm_name)
+    if no_ver == rpm_name:
+        return []
+    alternatives = [no_ver]
+    # Also try with -dev if original had -devel
+    if rpm_name.endswith('-devel'):
+        alternatives.append(no_ver.replace('-devel', '-dev'))
+    return alternatives
+
+
+def _alt_compiler_runtime(rpm_name, match):
+    return [rpm_name, f'{rpm_name}-libs']
+
+
+def _alt_fftw_libs(rpm_name, match):
+    # fftw-libs-double -> fftw-double-libs
+    return [f'fftw-{match.group(1)}-libs']
+
+
+def _alt_nginx_mod(rpm_name, match):
+    # nginx-mod-http-perl -> nginx-mainline-mod-http_perl (Chainguard uses underscores)
+    module = match.group(1)
+    return [f"nginx-mainline-mod-{module.replace('-', '_')}", f'nginx-mainline-mod-{module}']
+
+
+def _lookup(mapping):
+    return lambda rpm_name, match: [mapping[rpm_name]]
+
+
+def _constant(alternatives):
+    return lambda rpm_name, match: alternatives
+
+
+class AlternativeRule(NamedTuple):
+    """One alternative-name strategy
+
+    A rule applies to names in `names`, starting with `prefix` or ending with
+    `suffix` (whichever is set; none means every name), and whose `pattern`
+    matches if one is given. `generate(rpm_name, match)` returns its candidates.
+    """
+    generate: Callable[[str, Optional[re.Match]], list]
+    names: frozenset = frozenset()
+    prefix: str = ''
+    suffix: str = ''
+    pattern: Optional[re.Pattern] = None
+    search: bool = False  # pattern.search instead of pattern.match
+
+
+# Strategies in the order their candidates are tried
+ALTERNATIVE_RULES = (
+    AlternativeRule(_lookup(TOOL_MAPPINGS), names=frozenset(TOOL_MAPPINGS)),
+    AlternativeRule(_alt_aspnetcore, prefix='aspnetcore-', pattern=ASPNETCORE_RE),
+    AlternativeRule(_alt_dotnet, prefix='dotnet-', pattern=DOTNET_RE),
+    AlternativeRule(_alt_gcc_toolset_base, prefix='gcc-toolset-', pattern=GCC_TOOLSET_BASE_RE),
+    AlternativeRule(_alt_gcc_toolset, prefix='gcc-toolset-', pattern=GCC_TOOLSET_RE),
+    AlternativeRule(_constant(LLVM_TOOLSET_ALTERNATIVES), names=frozenset({'llvm-toolset'})),
+    AlternativeRule(_constant(RUST_TOOLSET_ALTERNATIVES), names=frozenset({'rust-toolset'})),
+    AlternativeRule(_constant(GO_TOOLSET_ALTERNATIVES), names=frozenset({'go-toolset'})),
+    AlternativeRule(_alt_devel, suffix='-devel'),
+    AlternativeRule(_alt_libs, suffix='-libs'),
+    AlternativeRule(_alt_tools, suffix='-tools'),
+    AlternativeRule(_alt_lib_prefix, prefix='lib'),
+    AlternativeRule(_alt_python_versioned, prefix='python', pattern=PYTHON_VERSIONED_RE),
+    AlternativeRule(_alt_java_openjdk, prefix='java-', pattern=JAVA_OPENJDK_RE),
+    AlternativeRule(_alt_java8_openjdk, prefix='java-', pattern=JAVA8_OPENJDK_RE),
+    AlternativeRule(_alt_perl, prefix='perl-'),
+    AlternativeRule(_alt_rubygem, prefix='rubygem-'),
+    AlternativeRule(_alt_python3_module, prefix='python3-'),
+    AlternativeRule(_alt_php_module, prefix='php-'),
+    AlternativeRule(_alt_php_pecl, prefix='php-pecl-'),
+    AlternativeRule(_lookup(CONTAINER_MAPPINGS), names=frozenset(CONTAINER_MAPPINGS)),
+    AlternativeRule(_alt_without_digits, pattern=DIGITS_RE, search=True),
+    AlternativeRule(_alt_compiler_runtime, names=frozenset(COMPILER_RUNTIME_LIBS)),
+    AlternativeRule(_lookup(NAME_MAPPINGS), names=frozenset(NAME_MAPPINGS)),
+    AlternativeRule(_alt_fftw_libs, prefix='fftw-libs-', pattern=FFTW_LIBS_RE),
+    AlternativeRule(_alt_nginx_mod, prefix='nginx-mod-', pattern=NGINX_MOD_RE),
+)
+
+# Prefixes and suffixes are all at least this long, so rules can be
+# dispatched on a name's first and last characters
+RULE_DISPATCH_LENGTH = 3
+
+
+def _dispatch_tables(rules):
+    """Index rule positions by exact name, prefix head and suffix tail"""
+    by_name = defaultdict(list)
+    by_prefix = defaultdict(list)
+    by_suffix = defaultdict(list)
+    always = []
+    for position, rule in enumerate(rules):
+        if rule.names:
+            for name in rule.names:
+                by_name[name].append(position)
+        elif rule.prefix:
+            by_prefix[rule.prefix[:RULE_DISPATCH_LENGTH]].append(position)
+        elif rule.suffix:
+            by_suffix[rule.suffix[-RULE_DISPATCH_LENGTH:]].append(position)
+        else:
+            always.append(position)
+    return dict(by_name), dict(by_prefix), dict(by_suffix), tuple(always)
+
+
+RULES_BY_NAME, RULES_BY_PREFIX, RULES_BY_SUFFIX, RULES_ALWAYS = _dispatch_tables(ALTERNATIVE_RULES)
+
+
+@lru_cache(maxsize=ALTERNATIVES_CACHE_SIZE)
+def generate_alternatives(rpm_name: str) -> tuple:
+    """Return every candidate APK name or VersionFamily for rpm_name, in the order they are tried
+
+    Only the rules indexed under the name, its first or its last characters
+    are evaluated, and the result is cached since callers ask repeatedly.
+    """
+    positions = sorted([
+        *RULES_BY_NAME.get(rpm_name, ()),
+        *RULES_BY_PREFIX.get(rpm_name[:RULE_DISPATCH_LENGTH], ()),
+        *RULES_BY_SUFFIX.get(rpm_name[-RULE_DISPATCH_LENGTH:], ()),
+        *RULES_ALWAYS,
+    ])
+
+    alternatives = []
+    for position in positions:
+        rule = ALTERNATIVE_RULES[position]
+        if rule.prefix and not rpm_name.startswith(rule.prefix):
+            continue
+        if rule.suffix and not rpm_name.endswith(rule.suffix):
+            continue
+        match = None
+        if rule.pattern is not None:
+            match = rule.pattern.search(rpm_name) if rule.search else rule.pattern.match(rpm_name)
+            if not match:
+                continue
+        alternatives.extend(rule.generate(rpm_name, match))
+    return tuple(alternatives)
+
+
+@lru_cache(maxsize=None)
+def version_sort_key(version: str) -> Tuple:
+    """Return a key that orders version strings RPM-style
+
+    Numeric segments compare as integers and beat alphabetic ones, and a
+    shorter version compares as if padded with zero segments, so that
+    1.0 == 1.0.0 and 1.0 > 1.0.rc1. Runs of zero segments are folded into the
+    segment that follows them, which lets plain tuple comparison honour the
+    padding rule without knowing the other version's length.
+    """
+    key = []
+    zeros = 0
+    for digits, alpha in VERSION_SEGMENT_RE.findall(version):
+        if alpha:
+            # Alphabetic segment: loses to the padding zeros it is compared with
+            key.append((0, zeros, alpha))
+        else:
+            number = int(digits)
+            if number == 0:
+                zeros += 1
+                continue
+            # Non-zero numeric segment: beats the padding zeros it is compared with
+            key.append((1, -zeros, number))
+        zeros = 0
+    # The end of the version compares as an endless run of zeros
+    key.append((1,))
+    return tuple(key)
+
+
+@lru_cache(maxsize=None)
+def evr_sort_key(version: str, release: str) -> Tuple[Tuple, Tuple]:
+    """Return a sort key ordering by version, then release"""
+    if '-' in release:
+        # Compare the way the joined version-release string would split
+        return RPMExtractor._parse_version(f"{version}-{release}")
+    return version_sort_key(version), version_sort_key(release)
+
+
+@lru_cache(maxsize=None)
+def apk_version_key(version: str) -> Tuple:
+    """Return a key that orders APK versions the way apk-tools does
+
+    Numbers, then the letter, then the suffixes (1.0_rc1 < 1.0 < 1.0_p1),
+    then the -rN revision are compared. Versions apk would reject sort
+    before every valid one, by their text.
+    """
+    match = APK_VERSION_FORMAT_RE.match(version)
+    if not match:
+        return (0, version)
+    numbers, letter, suffixes, revision = match.groups()
+    suffix_key = tuple((APK_SUFFIXES.get(name, APK_NO_SUFFIX), int(number or 0))
+                       for name, number in APK_SUFFIX_RE.findall(suffixes))
+    return (1, tuple(int(n) for n in numbers.split('.')), letter,
+            suffix_key + ((APK_NO_SUFFIX, 0),), int(revision or 0))
+
+
+def _intern_provides(provides) -> Tuple[str, ...]:
+    return tuple(sys.intern(key) for key in provides)
+
+
+def rpm_provides(provide_names: Iterable[str], file_paths: Iterable[str]) -> Tuple[str, ...]:
+    """so:, pc: and cmd: provides of an RPM, from its provides and file list
+
+    libfoo.so.1()(64bit) -> so:libfoo.so.1, pkgconfig(foo) -> pc:foo,
+    /usr/bin/foo -> cmd:foo
+    """
+    keys = set()
+    for provide in provide_names:
+        match = SONAME_PROVIDE_RE.match(provide)
+        if match:
+            keys.add('so:' + match.group(1))
+            continue
+        match = PKGCONFIG_PROVIDE_RE.match(provide)
+        if match:
+            keys.add('pc:' + match.group(1))
+    for path in file_paths:
+        directory, _, command = path.rpartition('/')
+        if command and directory + '/' in COMMAND_DIRS:
+            keys.add('cmd:' + command)
+    return _intern_provides(sorted(keys))
+
+
+class RPM(NamedTuple):
+    """An available RPM, one per name.arch line of `yum list`
+
+    provides holds its so:, cmd: and pc: provides (see rpm_provides) when
+    the source lists them: repository metadata and rpmdbs do, yum list does not.
+    """
+    name: str
+    version: str
+    release: str
+    arch: str
+    provides: Tuple[str, ...] = ()
+
+    @classmethod
+    def from_row(cls, row: Iterable) -> 'RPM':
+        """Build from stored fields, interning the strings that repeat across entries"""
+        name, version, release, arch, *provides = row
+        return cls(sys.intern(name), version, release, sys.intern(arch),
+                   _intern_provides(provides[0]) if provides else ())
+
+
+class APK(NamedTuple):
+    """An available Chainguard APK
+
+    provides holds its so:, cmd: and pc: provides when read from an APKINDEX.
+    """
+    name: str
+    version: str
+    provides: Tuple[str, ...] = ()
+
+    @classmethod
+    def from_row(cls, row: Iterable) -> 'APK':
+        """Build from stored fields, interning the name"""
+        name, version, *provides = row
+        return cls(sys.intern(name), version, _intern_provides(provides[0]) if provides else ())
+
+
+class Mapping(NamedTuple):
+    """One row of the output CSV
+
+    strategy, candidates and score are written with --explain, release and arch
+    (and image, when mapping images) when several targets are written to one CSV.
+    """
+    rpm_name: str
+    apk_name: str  # '' if unmatched
+    strategy: str = ''
+    candidates: Optional[int] = None
+    score: Optional[float] = None
+    release: str = DEFAULT_RELEASE
+    arch: str = DEFAULT_ARCH
+    image: str = ''  # Set when mapping the RPMs installed in images
+
+
+# Match strategies, in the order APKMatcher tries them
+STRATEGY_EXACT = 'exact'
+STRATEGY_CASE_INSENSITIVE = 'case-insensitive'
+STRATEGY_ALTERNATIVE = 'alternative'
+STRATEGY_PROVIDES = 'provides'
+STRATEGY_VERSIONED = 'versioned'
+STRATEGY_FUZZY = 'fuzzy'
+STRATEGIES = (STRATEGY_EXACT, STRATEGY_CASE_INSENSITIVE, STRATEGY_ALTERNATIVE, STRATEGY_PROVIDES,
+              STRATEGY_VERSIONED, STRATEGY_FUZZY)
+STRATEGY_UNMATCHED = 'unmatched'
+STRATEGY_REUSED = 'reused'  # Taken from the previous run by --incremental
+
+
+class MatchResult(NamedTuple):
+    """How an RPM was matched
+
+    candidates is the number of APK names the deciding strategy considered:
+    1 for exact lookups, the 1-based position of the winning alternative,
+    the APKs sharing a provide, or the fuzzy candidates scored. score is the
+    trigram similarity of a fuzzy match, the share of the RPM's provides
+    the APK has for a provides match, and 1.0 for the rule-based strategies. timings holds
+    (strategy, seconds) for every strategy that ran, including those that
+    fell through.
+    """
+    apk: Optional[APK]
+    strategy: str
+    candidates: int
+    timings: Tuple[Tuple[str, float], ...]
+    score: Optional[float] = None
+
+
+class MatchStats:
+    """Per-strategy hit counts and cumulative time, aggregated over MatchResults"""
+
+    def __init__(self):
+        self.hits = defaultdict(int)
+        self.seconds = defaultdict(float)
+
+    def add(self, result: MatchResult):
+        self.hits[result.strategy] += 1
+        for strategy, seconds in result.timings:
+            self.seconds[strategy] += seconds
+
+    def print_summary(self):
+        print("  Strategies (hits, cumulative time including fall-through):")
+        for strategy in STRATEGIES:
+            print(f"    {strategy:<17} {self.hits[strategy]:>6}  {self.seconds[strategy] * 1000:9.1f} ms")
+        for strategy in (STRATEGY_UNMATCHED, STRATEGY_REUSED):
+            if self.hits[strategy]:
+                print(f"    {strategy:<17} {self.hits[strategy]:>6}")
 
-class ContainerRunner:
-    """Handle container operations"""
 
-    def __init__(self, runtime: str = "docker"):
+class ContainerRunner:
+    """Handle container operations
+
+    By default every command runs in a one-off `run --rm` container. In
+    session mode, the first command for an (image, platform) starts one
+    long-lived container for it, and every command is run in that container
+    with `exec`. The containers are removed by close(), on leaving a `with`
+    block, or at interpreter exit. A SIGTERM handler should call close()
+    itself before exiting: interpreter exit first waits for worker threads,
+    which may be blocked in an `exec` until the container is removed.
+    """
+
+    # Label put on session containers, so leftovers of a killed run can be found
+    SESSION_LABEL = 'rpm-to-apk-mapper.session'
+    # Longest shell script sent by run_batch; larger batches are split
+    BATCH_MAX_SCRIPT = 64 * 1024
+
+    def __init__(self, runtime: str = "docker", session: bool = False):
         self.runtime = runtime
-        self._check_runtime()
+        self._runtime_checked = False
+        self.session = session
+        self._sessions = {}  # (image, platform) -> container ID
+        self._session_locks = {}  # (image, platform) -> lock held while its container starts
+        self._lock = threading.Lock()
+        if session:
+            atexit.register(self.close)
+
+    def __enter__(self) -> 'ContainerRunner':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
 
     def _check_runtime(self):
-        """Check if container runtime is available"""
+        """Check if container runtime is available (once, on first use)"""
+        with self._lock:
+            if self._runtime_checked:
+                return
+            try:
+                subprocess.run(
+                    [self.runtime, "--version"],
+                    capture_output=True,
+                    check=True
+                )
+            except (subprocess.CalledProcessError, FileNotFoundError):
+                print(f"Error: {self.runtime} is not available", file=sys.stderr)
+                sys.exit(1)
+            self._runtime_checked = True
+
+    def image_digest(self, image: str) -> Optional[str]:
+        """Return the local image ID for image, or None if it is not pulled"""
         try:
-            subprocess.run(
-                [self.runtime, "--version"],
+            result = subprocess.run(
+                [self.runtime, "image", "inspect", "--format", "{{.Id}}", image],
                 capture_output=True,
+                text=True,
                 check=True
             )
         except (subprocess.CalledProcessError, FileNotFoundError):
-            print(f"Error: {self.runtime} is not available", file=sys.stderr)
+            return None
+        return result.stdout.strip() or None
+
+    def _run_args(self, image: str, command: List[str], platform: Optional[str]) -> List[str]:
+        """Build the runtime arguments to run command in a one-off or session container"""
+        if self.session:
+            return [self.runtime, "exec", self._session_container(image, platform)] + command
+        args = [self.runtime, "run", "--rm"]
+        if platform:
+            args += ["--platform", platform]
+        return args + [image] + command
+
+    def _session_container(self, image: str, platform: Optional[str]) -> str:
+        """Return the session container for image, starting it on first use
+
+        Containers for different images start concurrently; concurrent first
+        uses of one image wait for the same container.
+        """
+        key = (image, platform)
+        with self._lock:
+            start_lock = self._session_locks.setdefault(key, threading.Lock())
+        with start_lock:
+            container = self._sessions.get(key)
+            if container is None:
+                container = self._start_session(image, platform)
+                with self._lock:
+                    self._sessions[key] = container
+        return container
+
+    def _start_session(self, image: str, platform: Optional[str]) -> str:
+        """Start a detached container that idles until it is removed"""
+        self._check_runtime()
+        args = [self.runtime, "run", "-d", "--rm", "--label", self.SESSION_LABEL]
+        if platform:
+            args += ["--platform", platform]
+        args += ["--entrypoint", "tail", image, "-f", "/dev/null"]
+        try:
+            result = subprocess.run(args, capture_output=True, text=True, check=True)
+        except subprocess.CalledProcessError as e:
+            print(f"Error starting session container: {e}", file=sys.stderr)
+            print(f"stderr: {e.stderr}", file=sys.stderr)
             sys.exit(1)
+        return result.stdout.strip()
+
+    def close(self):
+        """Remove the session containers; later commands start new ones"""
+        with self._lock:
+            containers = list(self._sessions.values())
+            self._sessions.clear()
+        if containers:
+            subprocess.run([self.runtime, "rm", "-f"] + containers, capture_output=True)
 
-    def run_command(self, image: str, command: List[str]) -> str:
+    def run_command(self, image: str, command: List[str], platform: Optional[str] = None) -> str:
         """Run a command in a container and return output"""
+        self._check_runtime()
         try:
             result = subprocess.run(
-                [self.runtime, "run", "--rm", image] + command,
+                self._run_args(image, command, platform),
                 capture_output=True,
                 text=True,
                 check=True
@@ -47,38 +1157,593 @@ class ContainerRunner:
             print(f"stderr: {e.stderr}", file=sys.stderr)
             sys.exit(1)
 
+    def run_command_iter(self, image: str, command: List[str],
+                         platform: Optional[str] = None) -> Iterator[str]:
+        """Run a command in a container and yield its output line by line as it arrives
+
+        stderr is spooled to a temporary file so a chatty command cannot
+        fill the pipe and stall, and is only read back if the command fails.
+        """
+        self._check_runtime()
+        args = self._run_args(image, command, platform)
+        with tempfile.TemporaryFile(mode='w+') as stderr:
+            process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=stderr, text=True)
+            try:
+                yield from process.stdout
+                returncode = process.wait()
+            finally:
+                if process.poll() is None:
+                    process.kill()
+                    process.wait()
+                process.stdout.close()
+
+            if returncode != 0:
+                stderr.seek(0)
+                error = subprocess.CalledProcessError(returncode, args)
+                print(f"Error running container command: {error}", file=sys.stderr)
+                print(f"stderr: {stderr.read()}", file=sys.stderr)
+                sys.exit(1)
+
+    def run_batch(self, image: str, commands: List[List[str]],
+                  platform: Optional[str] = None) -> List[Tuple[int, str]]:
+        """Run several commands in one container invocation; return (exit status, stdout) of each
+
+        The commands run one after another in a single shell, with a marker
+        line after each one's output, so many small queries (e.g. one
+        `rpm -q` per package) cost one exec or container instead of one each.
+        A failing command does not stop the batch. Scripts over
+        BATCH_MAX_SCRIPT are split into several batches.
+        """
+        marker = f"--- {uuid.uuid4().hex}"
+        lines = [
+            ' '.join(shlex.quote(arg) for arg in command) + f"; printf '\\n{marker} %d\\n' $?\n"
+            for command in commands
+        ]
+
+        results = []
+        start = 0
+        while start < len(lines):
+            end = start + 1
+            size = len(lines[start])
+            while end < len(lines) and size + len(lines[end]) <= self.BATCH_MAX_SCRIPT:
+                size += len(lines[end])
+                end += 1
+            output = self.run_command(image, ["sh", "-c", ''.join(lines[start:end])], platform)
+            for _ in range(start, end):
+                stdout, found, output = output.partition(f"\n{marker} ")
+                status, _, output = output.partition('\n')
+                if not found or not status.isdigit():
+                    print(f"Error running container command batch: output ended after {len(results)} "
+                          f"of {len(commands)} commands", file=sys.stderr)
+                    sys.exit(1)
+                results.append((int(status), stdout))
+            start = end
+        return results
+
+
+def write_json_atomic(path: str, data):
+    """Write data as JSON so concurrent or interrupted runs never see a partial file"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix='.json')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class InventoryCache:
+    """Persist package inventories on disk between runs
+
+    Entries are keyed by source and image, and remember the local image
+    digest they were fetched from. An entry is reused while it is younger
+    than the TTL and the image has not been re-pulled since.
+    """
+
+    FORMAT_VERSION = 1
+
+    def __init__(self, container_runner: ContainerRunner, cache_dir: str,
+                 ttl_hours: float = 24, refresh: bool = False, offline: bool = False):
+        self.container_runner = container_runner
+        self.cache_dir = cache_dir
+        self.ttl = ttl_hours * 3600
+        self.refresh = refresh
+        self.offline = offline
+
+    @staticmethod
+    def default_dir() -> str:
+        """Return the default cache directory, honouring XDG_CACHE_HOME"""
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+        return os.path.join(base, 'rpm-to-apk-mapper')
+
+    def _path(self, source: str, image: str) -> str:
+        key = hashlib.sha256(image.encode()).hexdigest()[:16]
+        return os.path.join(self.cache_dir, f"{source}-{key}.json")
+
+    def _read(self, path: str) -> Optional[dict]:
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get('format') != self.FORMAT_VERSION:
+            return None
+        return entry
+
+    def get(self, source: str, image: str, record_type, fetch) -> list:
+        """Return the cached inventory for (source, image), calling fetch() on a miss
+
+        Args:
+            source: Inventory kind, e.g. 'rpm' or 'apk'
+            image: Image reference the inventory is read from
+            record_type: RPM or APK; records are stored as field lists to keep the file compact
+            fetch: Callable returning the inventory as a list of record_type
+        """
+        path = self._path(source, image)
+
+        if not self.refresh:
+            entry = self._read(path)
+            if entry is not None:
+                age = time.time() - entry['created']
+                fresh = age <= self.ttl
+                if fresh and not self.offline and entry['digest']:
+                    fresh = self.container_runner.image_digest(image) in (None, entry['digest'])
+                if fresh or self.offline:
+                    print(f"Using cached {source} inventory for {image} ({age / 3600:.1f}h old)")
+                    return [record_type.from_row(row) for row in entry['entries']]
+
+        if self.offline:
+            print(f"Error: no cached {source} inventory for {image} (run once without --offline)",
+                  file=sys.stderr)
+            sys.exit(1)
+
+        items = fetch()
+        write_json_atomic(path, {
+            'format': self.FORMAT_VERSION,
+            'source': source,
+            'image': image,
+            # Looked up after fetching, since fetching may have pulled the image
+            'digest': self.container_runner.image_digest(image),
+            'created': time.time(),
+            'entries': [list(item) for item in items],
+        })
+        return items
+
+
+def open_compressed(path: str):
+    """Open path for binary reading, decompressing on the fly based on its extension"""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    if path.endswith('.bz2'):
+        return bz2.open(path, 'rb')
+    if path.endswith('.xz'):
+        return lzma.open(path, 'rb')
+    if path.endswith('.zst'):
+        print(f"Error: {path} is zstd-compressed, which is not supported; decompress it first",
+              file=sys.stderr)
+        sys.exit(1)
+    return open(path, 'rb')
+
+
+class RepoMetadataSource:
+    """Read available RPMs from local yum repository metadata, without a container
+
+    Each path is a repository directory (holding repodata/repomd.xml), a
+    repomd.xml file, or a primary.xml / primary.sqlite file, optionally
+    compressed with gzip, bzip2 or xz.
+    """
+
+    REPO_NS = '{http://linux.duke.edu/metadata/repo}'
+    COMMON_NS = '{http://linux.duke.edu/metadata/common}'
+    RPM_NS = '{http://linux.duke.edu/metadata/rpm}'
+
+    def __init__(self, paths: List[str]):
+        self.paths = paths
+
+    def describe(self) -> str:
+        return ', '.join(self.paths)
+
+    def iter_rpms(self) -> Iterator[RPM]:
+        """Yield every binary RPM listed by the repositories, as it is parsed"""
+        for path in self.paths:
+            primary = self._primary_path(path)
+            if '.sqlite' in os.path.basename(primary):
+                yield from self._iter_primary_db(primary)
+            else:
+                yield from self._iter_primary_xml(primary)
+
+    def _primary_path(self, path: str) -> str:
+        """Resolve a repository path to its primary metadata file"""
+        if os.path.isdir(path):
+            path = os.path.join(path, 'repodata', 'repomd.xml')
+        if not os.path.exists(path):
+            print(f"Error: repository metadata not found: {path}", file=sys.stderr)
+            sys.exit(1)
+        if os.path.basename(path) != 'repomd.xml':
+            return path
+
+        # Prefer the XML primary, which can be streamed; fall back to the sqlite one
+        locations = {}
+        for data in ET.parse(path).getroot().iter(f'{self.REPO_NS}data'):
+            location = data.find(f'{self.REPO_NS}location')
+            if location is not None:
+                locations[data.get('type')] = location.get('href')
+        href = locations.get('primary') or locations.get('primary_db')
+        if not href:
+            print(f"Error: {path} lists no primary metadata", file=sys.stderr)
+            sys.exit(1)
+        # Locations are relative to the repository root, the parent of repodata/
+        return os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(path))), href)
+
+    @staticmethod
+    def _rpm(name: str, arch: str, epoch: Optional[str], version: str, release: str,
+             provides: Tuple[str, ...] = ()) -> Optional[RPM]:
+        if arch == 'src':
+            return None
+        # yum list shows a non-zero epoch as epoch:version
+        if epoch and epoch != '0':
+            version = f"{epoch}:{version}"
+        return RPM(sys.intern(name), version, release, sys.intern(arch), provides)
+
+    def _iter_primary_xml(self, path: str) -> Iterator[RPM]:
+        ns = self.COMMON_NS
+        with open_compressed(path) as f:
+            events = ET.iterparse(f, events=('start', 'end'))
+            _, root = next(events)
+            for event, elem in events:
+                if event != 'end' or elem.tag != f'{ns}package':
+                    continue
+                version = elem.find(f'{ns}version')
+                package_format = elem.find(f'{ns}format')
+                provides = ()
+                if package_format is not None:
+                    # primary lists the files under */bin/, enough for the commands
+                    provides = rpm_provides(
+                        (entry.get('name') for entry in package_format.iterfind(
+                            f'{self.RPM_NS}provides/{self.RPM_NS}entry')),
+                        (path.text or '' for path in package_format.iterfind(f'{ns}file'))
+                    )
+                rpm = self._rpm(
+                    elem.findtext(f'{ns}name'),
+                    elem.findtext(f'{ns}arch'),
+                    version.get('epoch'),
+                    version.get('ver'),
+                    version.get('rel'),
+                    provides
+                )
+                if rpm:
+                    yield rpm
+                # Drop parsed packages so memory stays flat however large the repository
+                root.clear()
+
+    def _iter_primary_db(self, path: str) -> Iterator[RPM]:
+        # sqlite needs a real file, so compressed databases are expanded to a temporary one
+        with tempfile.NamedTemporaryFile(suffix='.sqlite') as db_file:
+            with open_compressed(path) as f:
+                shutil.copyfileobj(f, db_file)
+            db_file.flush()
+            connection = sqlite3.connect(db_file.name)
+            try:
+                provide_names = self._grouped(connection, "SELECT pkgKey, name FROM provides "
+                                                          "WHERE name LIKE '%.so%(%' OR name LIKE 'pkgconfig(%'")
+                file_paths = self._grouped(connection, "SELECT pkgKey, name FROM files WHERE name LIKE '%bin/%'")
+                for key, *row in connection.execute(
+                        'SELECT pkgKey, name, arch, epoch, version, release FROM packages'):
+                    rpm = self._rpm(*row, rpm_provides(provide_names.get(key, ()), file_paths.get(key, ())))
+                    if rpm:
+                        yield rpm
+            finally:
+                connection.close()
+
+    @staticmethod
+    def _grouped(connection: sqlite3.Connection, query: str) -> Dict[int, List[str]]:
+        """Run a (pkgKey, value) query and group the values by package"""
+        grouped = defaultdict(list)
+        for key, value in connection.execute(query):
+            grouped[key].append(value)
+        return grouped
+
+
+class RpmdbSource:
+    """Read the RPMs installed in an image from its sqlite rpmdb, without running it
+
+    path is an unpacked root filesystem, a layer tarball (optionally
+    compressed), a `docker save` archive or an rpmdb.sqlite file. Only the
+    database is read: in a root filesystem it is opened read-only in place,
+    and tarballs are streamed up to the database member, which alone is
+    copied out, since sqlite needs a real file.
+    """
+
+    # rpm 4.17+ keeps the database under /usr, /var/lib/rpm often links to it
+    RPMDB_PATHS = ('usr/lib/sysimage/rpm/rpmdb.sqlite', 'var/lib/rpm/rpmdb.sqlite')
+    # BerkeleyDB databases of RHEL 8 and older
+    BDB_PATHS = ('usr/lib/sysimage/rpm/Packages', 'var/lib/rpm/Packages')
+
+    # Header tags (rpmtag.h) and data types read from each package header
+    TAG_NAME = 1000
+    TAG_VERSION = 1001
+    TAG_RELEASE = 1002
+    TAG_EPOCH = 1003
+    TAG_ARCH = 1022
+    TAG_PROVIDENAME = 1047
+    TAG_DIRINDEXES = 1116
+    TAG_BASENAMES = 1117
+    TAG_DIRNAMES = 1118
+    HEADER_TAGS = frozenset((TAG_NAME, TAG_VERSION, TAG_RELEASE, TAG_EPOCH, TAG_ARCH,
+                             TAG_PROVIDENAME, TAG_DIRINDEXES, TAG_BASENAMES, TAG_DIRNAMES))
+    TYPE_INT32 = 4
+    TYPE_STRING = 6
+    TYPE_STRING_ARRAY = 8
+
+    WHITEOUT_PREFIX = '.wh.'
+    OPAQUE_WHITEOUT = '.wh..wh..opq'
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def describe(self) -> str:
+        return self.path
+
+    def iter_rpms(self) -> Iterator[RPM]:
+        """Yield every installed RPM, skipping the gpg-pubkey pseudo-packages"""
+        with self._rpmdb_file() as db_path:
+            # immutable: nothing else writes the database, and no -shm or
+            # journal file is created next to it
+            connection = sqlite3.connect(f"file:{quote(db_path)}?immutable=1", uri=True)
+            try:
+                for (blob,) in connection.execute('SELECT blob FROM Packages'):
+                    rpm = self._header_rpm(blob)
+                    if rpm:
+                        yield rpm
+            except sqlite3.DatabaseError as e:
+                self._fail(f"cannot read the rpmdb: {e}")
+            finally:
+                connection.close()
+
+    def _fail(self, message: str):
+        print(f"Error: {self.path}: {message}", file=sys.stderr)
+        sys.exit(1)
+
+    @classmethod
+    def _header_rpm(cls, blob: bytes) -> Optional[RPM]:
+        """Decode the name, epoch, version, release, arch and provides of a stored package header
+
+        A header is an index entry count and data size, then the index
+        entries (tag, type, offset, count; big-endian) and the data they
+        point into. Files are stored as basenames, each with the index of
+        its directory in dirnames.
+        """
+        entries, _ = struct.unpack_from('>II', blob)
+        data_start = 8 + 16 * entries
+        fields = {}
+        for tag, data_type, offset, count in struct.iter_unpack('>iIiI', blob[8:data_start]):
+            if tag not in cls.HEADER_TAGS:
+                continue
+            start = data_start + offset
+            if data_type == cls.TYPE_STRING:
+                fields[tag] = blob[start:blob.index(b'\0', start)].decode('utf-8', 'replace')
+            elif data_type == cls.TYPE_STRING_ARRAY:
+                strings = blob[start:].split(b'\0', count)[:count]
+                fields[tag] = [string.decode('utf-8', 'replace') for string in strings]
+            elif data_type == cls.TYPE_INT32:
+                fields[tag] = struct.unpack_from(f'>{count}i', blob, start)
+
+        name = fields.get(cls.TAG_NAME)
+        arch = fields.get(cls.TAG_ARCH)
+        if not name or not arch or name == 'gpg-pubkey':
+            return None
+        epoch = fields.get(cls.TAG_EPOCH)
+
+        dirnames = fields.get(cls.TAG_DIRNAMES, [])
+        command_dirs = {index for index, directory in enumerate(dirnames) if directory in COMMAND_DIRS}
+        commands = [
+            dirnames[index] + basename
+            for basename, index in zip(fields.get(cls.TAG_BASENAMES, ()), fields.get(cls.TAG_DIRINDEXES, ()))
+            if index in command_dirs
+        ]
+        return RepoMetadataSource._rpm(name, arch, str(epoch[0]) if epoch else None,
+                                       fields.get(cls.TAG_VERSION, ''), fields.get(cls.TAG_RELEASE, ''),
+                                       rpm_provides(fields.get(cls.TAG_PROVIDENAME, ()), commands))
+
+    @contextmanager
+    def _rpmdb_file(self) -> Iterator[str]:
+        """Path of the sqlite rpmdb, copied to a temporary file if it is in a tarball"""
+        if os.path.isdir(self.path):
+            yield self._rootfs_rpmdb()
+        elif not os.path.exists(self.path):
+            self._fail("no such file or directory")
+        elif self.path.endswith('.sqlite'):
+            yield self.path
+        else:
+            with tempfile.NamedTemporaryFile(suffix='.sqlite') as db_file:
+                self._extract_rpmdb(db_file)
+                db_file.flush()
+                yield db_file.name
+
+    def _rootfs_rpmdb(self) -> str:
+        for relative in self.RPMDB_PATHS:
+            # An absolute /var/lib/rpm symlink would resolve on the host
+            if os.path.islink(os.path.join(self.path, os.path.dirname(relative))):
+                continue
+            path = os.path.join(self.path, relative)
+            if os.path.isfile(path):
+                return path
+        if any(os.path.isfile(os.path.join(self.path, relative)) for relative in self.BDB_PATHS):
+            self._fail("has a BerkeleyDB rpmdb (RHEL 8 and older); only sqlite rpmdbs are supported")
+        self._fail("no rpmdb.sqlite under " + ' or '.join(self.RPMDB_PATHS))
+
+    def _extract_rpmdb(self, out):
+        """Copy the rpmdb out of a layer tarball or a `docker save` archive"""
+        try:
+            try:
+                # Image archives are uncompressed, so their members can be looked up directly
+                archive = tarfile.open(self.path, 'r:')
+            except tarfile.ReadError:
+                # A compressed layer: stream it
+                with tarfile.open(self.path, 'r|*') as layer:
+                    found, _, bdb = self._copy_from_layer(layer, self.RPMDB_PATHS, out)
+            else:
+                with archive:
+                    try:
+                        manifest = archive.extractfile('manifest.json')
+                    except KeyError:
+                        found, _, bdb = self._copy_from_layer(archive, self.RPMDB_PATHS, out)
+                    else:
+                        found, bdb = self._copy_from_image(archive, json.load(manifest), out)
+        except tarfile.ReadError:
+            self._fail("not a root filesystem, tarball or rpmdb.sqlite file")
+        if found:
+            return
+        if bdb:
+            self._fail("has a BerkeleyDB rpmdb (RHEL 8 and older); only sqlite rpmdbs are supported")
+        self._fail("no rpmdb.sqlite under " + ' or '.join(self.RPMDB_PATHS))
+
+    def _copy_from_image(self, archive: tarfile.TarFile, manifest: list, out) -> Tuple[bool, bool]:
+        """Copy the rpmdb from the topmost layer of a saved image that has it
+
+        Returns (found, bdb) like _copy_from_layer. Layers are read top
+        down until one has the rpmdb, or every rpmdb path was deleted by a
+        whiteout in the layers above.
+        """
+        if len(manifest) != 1:
+            self._fail(f"holds {len(manifest)} images; save each image to its own archive")
+        visible = list(self.RPMDB_PATHS)
+        bdb = False
+        for layer_name in reversed(manifest[0]['Layers']):
+            with tarfile.open(fileobj=archive.extractfile(layer_name), mode='r|*') as layer:
+                found, deleted, layer_bdb = self._copy_from_layer(layer, visible, out)
+            bdb = bdb or layer_bdb
+            if found:
+                return True, bdb
+            visible = [path for path in visible if path not in deleted]
+            if not visible:
+                break
+        return False, bdb
+
+    def _copy_from_layer(self, layer: tarfile.TarFile, paths: Iterable[str], out) -> Tuple[bool, set, bool]:
+        """Copy the first of paths found in one layer
+
+        Returns (found, deleted, bdb): whether an rpmdb was copied, the
+        paths the layer deletes with whiteouts, and whether it has a
+        BerkeleyDB rpmdb.
+        """
+        hidden = []
+        bdb = False
+        for member in layer:
+            name = os.path.normpath(member.name).lstrip('/')
+            if member.isfile() and name in paths:
+                shutil.copyfileobj(layer.extractfile(member), out)
+                return True, set(), bdb
+            if member.isfile() and name in self.BDB_PATHS:
+                bdb = True
+            directory, base = os.path.split(name)
+            if base == self.OPAQUE_WHITEOUT:
+                hidden.append(directory)
+            elif base.startswith(self.WHITEOUT_PREFIX):
+                hidden.append(os.path.join(directory, base[len(self.WHITEOUT_PREFIX):]))
+
+        deleted = {path for path in paths
+                   if any(path == entry or path.startswith(entry + '/') for entry in hidden)}
+        return False, deleted, bdb
+
+
+class APKIndexSource:
+    """Read available APKs from local APKINDEX.tar.gz files, without chainctl or a container"""
+
+    def __init__(self, paths: List[str]):
+        self.paths = paths
+
+    def describe(self) -> str:
+        return ', '.join(self.paths)
+
+    def iter_apks(self) -> Iterator[APK]:
+        """Yield the newest version of every package in the indexes, streaming each archive
+
+        An APKINDEX lists every published version of a package, in no useful
+        order, and only the newest is what installing the name gets.
+        """
+        latest = {}  # Name -> newest APK so far
+        for path in self.paths:
+            if not os.path.exists(path):
+                print(f"Error: APKINDEX not found: {path}", file=sys.stderr)
+                sys.exit(1)
+            # Signed indexes are a signature archive and the index archive in
+            # consecutive gzip members; gzip (unlike tarfile's own 'r|gz')
+            # reads both, so they come back as one tar stream
+            with gzip.open(path, 'rb') as f, tarfile.open(fileobj=f, mode='r|') as archive:
+                for member in archive:
+                    if member.name == 'APKINDEX':
+                        lines = (line.decode() for line in archive.extractfile(member))
+                        for apk in self._parse_apkindex(lines):
+                            newest = latest.get(apk.name)
+                            if newest is None or apk_version_key(apk.version) > apk_version_key(newest.version):
+                                latest[apk.name] = apk
+                        break
+        yield from latest.values()
+
+    @staticmethod
+    def _parse_apkindex(lines: Iterable[str]) -> Iterator[APK]:
+        """Parse APKINDEX records: "key:value" lines, with a blank line between packages
+
+        Of the provides ("p:so:libfoo.so.1=1 cmd:foo=1.2-r0 ..."), the so:,
+        cmd: and pc: names are kept, without their versions.
+        """
+        name = version = None
+        provides = ()
+        for line in lines:
+            line = line.rstrip('\n')
+            if not line:
+                if name:
+                    yield APK.from_row((name, version or 'unknown', provides))
+                name = version = None
+                provides = ()
+            elif line.startswith('P:'):
+                name = line[2:]
+            elif line.startswith('V:'):
+                version = line[2:]
+            elif line.startswith('p:'):
+                provides = sorted({
+                    provide.split('=', 1)[0] for provide in line[2:].split()
+                    if provide.startswith(PROVIDES_PREFIXES)
+                })
+        if name:
+            yield APK.from_row((name, version or 'unknown', provides))
+
 
 class RPMExtractor:
-    """Extract RPM package information from UBI 9"""
+    """Extract RPM package information for one UBI release and architecture"""
 
-    def __init__(self, container_runner: ContainerRunner):
+    # Format: package-name.arch  version-release  repository
+    YUM_LIST_COMMAND = ["sh", "-c", "yum list available 2>/dev/null || yum list all 2>/dev/null"]
+
+    def __init__(self, container_runner: ContainerRunner,
+                 inventory_cache: Optional[InventoryCache] = None,
+                 rpm_source: Optional[RepoMetadataSource] = None,
+                 release: str = DEFAULT_RELEASE, arch: str = DEFAULT_ARCH,
+                 platform: Optional[str] = None, label: str = ''):
         self.container_runner = container_runner
-        self.ubi_image = "registry.access.redhat.com/ubi9/ubi:latest"
+        self.inventory_cache = inventory_cache
+        self.rpm_source = rpm_source  # Read repository metadata instead of running yum
+        self.release = release
+        self.arch = arch
+        self.platform = platform  # None runs the image for the host platform
+        self.label = label  # Prefixes progress output when several targets run at once
+        self.ubi_image = UBI_IMAGE.format(release=release)
+        self.arch_preference = arch_preference(arch)
+        self.excluded = []  # (name, filter class, rule) for RPMs removed by get_rpm_list
 
     @staticmethod
-    def _parse_version(version_release: str) -> Tuple[List, List]:
-        """Parse version-release into comparable components"""
+    def _parse_version(version_release: str) -> Tuple[Tuple, Tuple]:
+        """Parse version-release into comparable sort keys"""
         if '-' in version_release:
             version, release = version_release.rsplit('-', 1)
         else:
             version, release = version_release, '0'
 
-        def split_version_parts(v: str) -> List:
-            """Split version into numeric and string parts for comparison"""
-            parts = []
-            for part in re.split(r'[.\-_]', v):
-                if part.isdigit():
-                    parts.append(('num', int(part)))
-                else:
-                    # Split alpha and numeric within part
-                    for subpart in re.findall(r'\d+|\D+', part):
-                        if subpart.isdigit():
-                            parts.append(('num', int(subpart)))
-                        else:
-                            parts.append(('str', subpart))
-            return parts
-
-        return split_version_parts(version), split_version_parts(release)
+        return version_sort_key(version), version_sort_key(release)
 
     @staticmethod
     def _compare_versions(v1: str, v2: str) -> int:
@@ -86,99 +1751,104 @@ class RPMExtractor:
         Compare two version-release strings
         Returns: 1 if v1 > v2, -1 if v1 < v2, 0 if equal
         """
-        ver1_parts, rel1_parts = RPMExtractor._parse_version(v1)
-        ver2_parts, rel2_parts = RPMExtractor._parse_version(v2)
-
-        # Compare versions first
-        for i in range(max(len(ver1_parts), len(ver2_parts))):
-            p1 = ver1_parts[i] if i < len(ver1_parts) else ('num', 0)
-            p2 = ver2_parts[i] if i < len(ver2_parts) else ('num', 0)
-
-            # Numbers always compare as greater than strings
-            if p1[0] == 'num' and p2[0] == 'str':
-                return 1
-            if p1[0] == 'str' and p2[0] == 'num':
-                return -1
-
-            # Compare same types
-            if p1[1] > p2[1]:
-                return 1
-            if p1[1] < p2[1]:
-                return -1
-
-        # Versions equal, compare releases
-        for i in range(max(len(rel1_parts), len(rel2_parts))):
-            p1 = rel1_parts[i] if i < len(rel1_parts) else ('num', 0)
-            p2 = rel2_parts[i] if i < len(rel2_parts) else ('num', 0)
-
-            if p1[0] == 'num' and p2[0] == 'str':
-                return 1
-            if p1[0] == 'str' and p2[0] == 'num':
-                return -1
-
-            if p1[1] > p2[1]:
-                return 1
-            if p1[1] < p2[1]:
-                return -1
-
-        return 0
-
-    def _filter_latest_rpms(self, all_rpms: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        key1 = RPMExtractor._parse_version(v1)
+        key2 = RPMExtractor._parse_version(v2)
+        return (key1 > key2) - (key1 < key2)
+
+    def _filter_latest_rpms(self, all_rpms: Iterable[RPM]) -> List[RPM]:
         """
         Filter to keep only the latest version of each package
-        Prefer x86_64 architecture when versions are equal
+        Prefer the target architecture when versions are equal
         """
-        # Group by package name
-        packages = defaultdict(list)
-        for rpm in all_rpms:
-            packages[rpm['name']].append(rpm)
-
-        latest_rpms = []
-        for pkg_name, versions in packages.items():
-            if not versions:
-                continue
+        # Single pass keeping the best RPM per name. When versions are equal,
+        # the first of the target arch wins, then the last noarch, then the first of any
+        # other arch; the position term of the key encodes first/last.
+        latest = {}
+        for position, rpm in enumerate(all_rpms):
+            arch = rpm.arch
+            key = (
+                evr_sort_key(rpm.version, rpm.release),
+                self.arch_preference.get(arch, 0),
+                position if arch == 'noarch' else -position
+            )
 
-            # Find the latest version
-            latest = versions[0]
-            for rpm in versions[1:]:
-                comparison = self._compare_versions(
-                    f"{rpm['version']}-{rpm['release']}",
-                    f"{latest['version']}-{latest['release']}"
-                )
+            current = latest.get(rpm.name)
+            if current is None or key > current[0]:
+                latest[rpm.name] = (key, rpm)
 
-                if comparison > 0:
-                    # rpm is newer
-                    latest = rpm
-                elif comparison == 0:
-                    # Same version, prefer x86_64
-                    if rpm['arch'] == 'x86_64' and latest['arch'] != 'x86_64':
-                        latest = rpm
-                    elif rpm['arch'] == 'x86_64' and latest['arch'] == 'x86_64':
-                        # Both x86_64, keep first one
-                        pass
-                    elif rpm['arch'] != 'x86_64' and latest['arch'] != 'x86_64':
-                        # Neither is x86_64, prefer noarch if available
-                        if rpm['arch'] == 'noarch':
-                            latest = rpm
-
-            latest_rpms.append(latest)
+        return [rpm for _, rpm in latest.values()]
 
-        return latest_rpms
+    def _log(self, message: str):
+        print(f"[{self.label}] {message}" if self.label else message)
 
-    def get_rpm_list(self) -> List[Dict[str, str]]:
-        """Get list of available RPMs from UBI 9 repositories"""
-        print("Fetching available RPMs from UBI 9 repositories...")
-        print("(This may take a minute as it queries all available packages)")
+    def get_rpm_list(self) -> List[RPM]:
+        """Get list of available RPMs from the UBI repositories"""
+        # Local metadata is quick to read, so only container output is cached.
+        # Inventories read on an explicit platform are cached per arch.
+        if self.inventory_cache and not self.rpm_source:
+            source = f'rpm-{self.arch}' if self.platform else 'rpm'
+            latest_rpms = self.inventory_cache.get(
+                source, self.ubi_image, RPM, self._fetch_latest_rpms)
+        else:
+            latest_rpms = self._fetch_latest_rpms()
 
-        # Use yum list available to get all packages
-        # Format: package-name.arch  version-release  repository
-        output = self.container_runner.run_command(
-            self.ubi_image,
-            ["sh", "-c", "yum list available 2>/dev/null || yum list all 2>/dev/null"]
-        )
+        # Filter out non-container, Red Hat-specific, Apache module and variant,
+        # and non-open source or EOL packages in a single pass
+        open_source_rpms, self.excluded = self._apply_filters(latest_rpms)
+        removed = defaultdict(int)
+        for _, filter_class, _ in self.excluded:
+            removed[filter_class] += 1
 
-        all_rpms = []
-        for line in output.strip().split('\n'):
+        remaining = len(latest_rpms) - removed[FILTER_CONTAINER]
+        self._log(f"Filtered to {remaining} container-relevant RPMs")
+
+        remaining -= removed[FILTER_REDHAT]
+        self._log(f"Removed {removed[FILTER_REDHAT]} Red Hat-specific RPMs")
+        self._log(f"Remaining: {remaining} RPMs")
+
+        remaining -= removed[FILTER_VARIANT]
+        self._log(f"Removed {removed[FILTER_VARIANT]} Apache modules, 64-bit variants, -selinux, -filesystem, iscsi, and legacy RPMs")
+        self._log(f"Remaining: {remaining} RPMs")
+
+        self._log(f"Removed {removed[FILTER_PROPRIETARY]} non-open source and EOL RPMs")
+        self._log(f"Remaining: {len(open_source_rpms)} open source, supported RPMs")
+
+        return open_source_rpms
+
+    def _fetch_latest_rpms(self) -> List[RPM]:
+        """Query the UBI repositories and keep the latest version of each RPM"""
+        if self.rpm_source:
+            self._log(f"Reading available RPMs from {self.rpm_source.describe()}...")
+            rpms = self.rpm_source.iter_rpms()
+        else:
+            self._log(f"Fetching available RPMs from UBI {self.release} repositories...")
+            self._log("(This may take a minute as it queries all available packages)")
+
+            # Use yum list available to get all packages
+            # Lines are parsed as yum prints them, so only the latest RPM per name is held in memory
+            lines = self.container_runner.run_command_iter(
+                self.ubi_image, self.YUM_LIST_COMMAND, platform=self.platform)
+            rpms = self._parse_yum_lines(lines)
+
+        total = 0
+
+        def counted(rpms):
+            nonlocal total
+            for rpm in rpms:
+                total += 1
+                yield rpm
+
+        latest_rpms = self._filter_latest_rpms(counted(rpms))
+
+        self._log(f"Found {total} total available RPMs")
+        self._log(f"Filtered to {len(latest_rpms)} latest RPMs (with {self.arch} preference)")
+
+        return latest_rpms
+
+    @staticmethod
+    def _parse_yum_lines(lines: Iterable[str]) -> Iterator[RPM]:
+        """Parse `yum list` output lines into RPMs, yielding each as soon as it is read"""
+        for line in lines:
             line = line.strip()
             if not line or line.startswith('Available') or line.startswith('Installed') or line.startswith('Last'):
                 continue
@@ -216,981 +1886,772 @@ class RPMExtractor:
                 version = version_release
                 release = ''
 
-            all_rpms.append({
-                'name': pkg_name,
-                'version': version,
-                'release': release,
-                'arch': arch
-            })
-
-        print(f"Found {len(all_rpms)} total available RPMs")
-
-        # Filter to latest versions with x86_64 preference
-        latest_rpms = self._filter_latest_rpms(all_rpms)
-
-        print(f"Filtered to {len(latest_rpms)} latest RPMs (with x86_64 preference)")
-
-        # Filter out non-container packages
-        container_rpms = self._filter_container_packages(latest_rpms)
-        print(f"Filtered to {len(container_rpms)} container-relevant RPMs")
-
-        # Filter out Red Hat-specific packages
-        non_rh_rpms, removed_rh = self._filter_redhat_specific(container_rpms)
-        print(f"Removed {len(removed_rh)} Red Hat-specific RPMs")
-        print(f"Remaining: {len(non_rh_rpms)} RPMs")
-
-        # Filter out Apache modules, 64-bit variants, SELinux, filesystem, iSCSI and legacy packages
-        filtered_rpms, removed_apache = self._filter_apache_and_variants(non_rh_rpms)
-        print(f"Removed {len(removed_apache)} Apache modules, 64-bit variants, -selinux, -filesystem, iscsi, and legacy RPMs")
-        print(f"Remaining: {len(filtered_rpms)} RPMs")
-
-        # Filter out non-open source and EOL packages
-        open_source_rpms, removed_proprietary = self._filter_non_open_source(filtered_rpms)
-        print(f"Removed {len(removed_proprietary)} non-open source and EOL RPMs")
-        print(f"Remaining: {len(open_source_rpms)} open source, supported RPMs")
-
-        return open_source_rpms
-
-    def _filter_container_packages(self, rpms: List[Dict[str, str]]) -> List[Dict[str, str]]:
-        """Filter out packages not typically used in containers"""
-        # Patterns for packages to exclude (GUI, desktop, printing, etc.)
-        exclude_patterns = [
-            # Desktop/GUI
-            'gtk', 'qt5', 'gnome', 'kde', 'xorg', 'X11', 'wayland', 'mesa',
-            'adwaita', 'hicolor', 'icon-theme', 'desktop', 'gdk-pixbuf',
-            # Printing
-            'cups', 'ghostscript', 'printer',
-            # Display/Graphics (non-essential)
-            'libX', 'libGL', 'vulkan', 'libdrm', 'libva', 'libvdpau',
-            # Audio
-            'pulseaudio', 'alsa', 'sound', 'audio', 'gstreamer',
-            # Fonts (usually not needed in containers)
-            '-fonts', 'fontconfig', 'fontenc', 'font-',
-            # Hardware-specific
-            'pciutils', 'usbutils', 'bluez', 'wireless',
-            # Trackers/indexers
-            'tracker', 'baloo',
-            # Screensavers
-            'screensaver', 'xscreensaver',
-            # Session management
-            'session-', 'polkit', 'udisks', 'upower',
-        ]
-
-        # Specific packages to exclude
-        exclude_exact = {
-            'at-spi2-atk', 'at-spi2-core', 'colord', 'colord-libs',
-            'dconf', 'gsettings-desktop-schemas', 'gvfs-client',
-            'flatpak-session-helper', 'flatpak-spawn',
-            'shared-mime-info', 'xkeyboard-config', 'iso-codes',
-        }
-
-        filtered = []
-        for rpm in rpms:
-            name = rpm['name']
-
-            # Check exact exclusions
-            if name in exclude_exact:
-                continue
-
-            # Check pattern exclusions
-            should_exclude = False
-            for pattern in exclude_patterns:
-                if pattern in name.lower():
-                    should_exclude = True
-                    break
-
-            if not should_exclude:
-                filtered.append(rpm)
-
-        return filtered
-
-    def _filter_redhat_specific(self, rpms: List[Dict[str, str]]) -> tuple[List[Dict[str, str]], List[str]]:
-        """Filter out Red Hat-specific packages and return both filtered list and removed names"""
-
-        # Patterns for Red Hat-specific packages
-        # NOTE: Toolsets (gcc-toolset-, llvm-toolset, etc.) are NOT filtered - they'll be matched to APK equivalents
-        rh_patterns = [
-            'redhat-',           # Red Hat branding
-            'rhel-',             # RHEL-specific
-            'subscription-',     # Subscription manager
-            'insights-',         # Red Hat Insights
-        ]
-
-        # Exact package names to exclude
-        rh_exact = {
-            # Build and packaging tools (Red Hat-specific)
-            'redhat-rpm-config',
-            'rpm-build',
-            'rpm-build-libs',
-            'rpm-sign-libs',
-            'rpm-plugin-selinux',
-            'rpm-plugin-systemd-inhibit',
-            'rpmdevtools',
-            'rpmlint',
-            'scl-utils',
-            'scl-utils-build',
-
-            # Red Hat branding
-            'redhat-logos-httpd',
-
-            # Macros (Red Hat-specific)
-            'kernel-srpm-macros',
-            'efi-srpm-macros',
-            'ghc-srpm-macros',
-            'go-srpm-macros',
-            'ocaml-srpm-macros',
-            'openblas-srpm-macros',
-            'perl-srpm-macros',
-            'python-srpm-macros',
-            'qt5-srpm-macros',
-            'rust-srpm-macros',
-
-            # SELinux policies (Red Hat-specific configurations)
-            'selinux-policy',
-            'selinux-policy-targeted',
-            'container-selinux',
-
-            # Package managers (RPM-specific, not APK)
-            'dnf-automatic',
-            'dnf-plugins-core',
-            'yum-utils',
-            'microdnf',
-
-            # Init system (systemd is RHEL-centric in this context)
-            'initscripts',
-            'initscripts-rename-device',
-            'initscripts-service',
-
-            # Red Hat-specific system tools
-            'librhsm',
-
-            # Annobin (Red Hat security tool)
-            'annobin',
-
-            # Software Collections (utilities only, not toolsets themselves)
-            'scl-utils',
-            'scl-utils-build',
-
-            # SRPM macros
-            'fonts-srpm-macros',
-            'pyproject-srpm-macros',
-
-            # Note: go-srpm-macros, rust-srpm-macros, etc. stay in, but toolsets (go-toolset, rust-toolset) are NOT excluded
-        }
-
-        filtered = []
-        removed = []
-
-        for rpm in rpms:
-            name = rpm['name']
-            should_exclude = False
-
-            # Check if "rpm" is in the package name (RPM-specific packages)
-            if 'rpm' in name.lower():
-                should_exclude = True
-            # Check if "-src" is in the package name (source packages)
-            elif '-src' in name.lower():
-                should_exclude = True
-            # Check exact matches
-            elif name in rh_exact:
-                should_exclude = True
-            else:
-                # Check pattern matches
-                for pattern in rh_patterns:
-                    if name.startswith(pattern) or pattern in name:
-                        should_exclude = True
-                        break
-
-            if should_exclude:
-                removed.append(name)
-            else:
-                filtered.append(rpm)
+            yield RPM.from_row((pkg_name, version, release, arch))
 
-        return filtered, removed
-
-    def _filter_apache_and_variants(self, rpms: List[Dict[str, str]]) -> tuple[List[Dict[str, str]], List[str]]:
-        """Filter out Apache modules (mod_*), 64-bit variants, -selinux, -filesystem, iscsi, and legacy packages"""
-        filtered = []
-        removed = []
+    def _apply_filters(self, rpms: List[RPM]) -> Tuple[List[RPM], List[Tuple[str, str, str]]]:
+        """Apply the exclusion rules in one pass
 
+        Returns the kept RPMs and (name, filter class, rule) for each removed one.
+        """
+        kept = []
+        excluded = []
         for rpm in rpms:
-            name = rpm['name']
-            should_exclude = False
-
-            # Filter Apache modules (mod_*)
-            if name.startswith('mod_'):
-                should_exclude = True
-            # Filter packages ending in 64 or 64_ (64-bit architecture variants)
-            # But NOT packages where 64 is part of the name like Base64, SHA256, etc.
-            elif name.endswith('64') or name.endswith('64_'):
-                # Exclude common false positives (Base64, SHA256, etc.)
-                if not any(x in name.lower() for x in ['base64', 'sha256', 'sha512', 'md5']):
-                    should_exclude = True
-            # Filter packages ending in -selinux (SELinux-specific)
-            elif name.endswith('-selinux'):
-                should_exclude = True
-            # Filter packages ending in -filesystem (filesystem layouts)
-            elif name.endswith('-filesystem'):
-                should_exclude = True
-            # Filter iSCSI packages (iscsi*)
-            elif name.startswith('iscsi'):
-                should_exclude = True
-            # Filter legacy packages (contains 'legacy')
-            elif 'legacy' in name.lower():
-                should_exclude = True
-            # Filter DNF packages (contains 'dnf')
-            elif 'dnf' in name.lower():
-                should_exclude = True
-
-            if should_exclude:
-                removed.append(name)
+            rule = exclusion_rule(rpm.name)
+            if rule:
+                excluded.append((rpm.name,) + rule)
             else:
-                filtered.append(rpm)
+                kept.append(rpm)
+        return kept, excluded
 
-        return filtered, removed
 
-    def _filter_non_open_source(self, rpms: List[Dict[str, str]]) -> tuple[List[Dict[str, str]], List[str]]:
-        """Filter out non-open source and EOL packages"""
+class InstalledRPMExtractor(RPMExtractor):
+    """Extract the RPMs installed in one image, read from its rpmdb
 
-        # Patterns for non-open source packages
-        proprietary_patterns = [
-            'adobe-',            # Adobe proprietary products
-        ]
+    release and arch describe the image itself: the major version of its
+    distribution release package and its most common package architecture.
+    """
 
-        # Exact non-open source packages
-        proprietary_exact = {
-            # Adobe products (proprietary)
-            'adobe-mappings-cmap',
-            'adobe-mappings-cmap-deprecated',
-            'adobe-mappings-pdf',
-            'adobe-source-code-pro-fonts',
-        }
+    def __init__(self, rpm_source: RpmdbSource, label: str = ''):
+        super().__init__(None, rpm_source=rpm_source, release='', label=label)
+        self.image = rpm_source.path
+        self.pool = None  # Process pool decoding the rpmdb, set by discover_inventories
 
-        # EOL software versions that should be filtered
-        eol_patterns = [
-            # .NET/ASP.NET 6.0 (EOL November 2024)
-            'aspnetcore-runtime-6.0',
-            'aspnetcore-targeting-pack-6.0',
-            'dotnet-apphost-pack-6.0',
-            'dotnet-hostfxr-6.0',
-            'dotnet-runtime-6.0',
-            'dotnet-sdk-6.0',
-            'dotnet-targeting-pack-6.0',
-            'dotnet-templates-6.0',
-
-            # .NET/ASP.NET 7.0 (EOL May 2024)
-            'aspnetcore-runtime-7.0',
-            'aspnetcore-targeting-pack-7.0',
-            'dotnet-apphost-pack-7.0',
-            'dotnet-hostfxr-7.0',
-            'dotnet-runtime-7.0',
-            'dotnet-sdk-7.0',
-            'dotnet-targeting-pack-7.0',
-            'dotnet-templates-7.0',
-
-            # .NET host infrastructure (all versions - no direct APK equivalents)
-            'dotnet-host',
-            'dotnet-hostfxr-8.0',
-            'dotnet-hostfxr-9.0',
-            'dotnet-hostfxr-10.0',
-
-            # Note: Java 8 (OpenJDK 8) is NOT EOL and has Chainguard equivalents
-            # Note: Python 3.11 is NOT EOL (EOL October 2027) and is still widely used
-        ]
+    def _fetch_latest_rpms(self) -> List[RPM]:
+        self._log(f"Reading installed RPMs from {self.image}...")
+        if self.pool is None:
+            rpms = list(self.rpm_source.iter_rpms())
+        else:
+            rpms = self.pool.apply(_read_installed_rpms, (self.rpm_source,))
+            if rpms is None:
+                sys.exit(1)  # The worker printed the error
+
+        arches = Counter(rpm.arch for rpm in rpms if rpm.arch != 'noarch')
+        if arches:
+            self.arch = arches.most_common(1)[0][0]
+            self.arch_preference = arch_preference(self.arch)
+        for rpm in rpms:
+            if rpm.name in DISTRO_RELEASE_PACKAGES:
+                major = MAJOR_VERSION_RE.search(rpm.version.split(':')[-1])
+                self.release = major.group() if major else ''
+                break
 
-        filtered = []
-        removed = []
+        # Several versions of a name are installed side by side only for
+        # packages like kernel; keep the latest, as for repositories
+        latest_rpms = self._filter_latest_rpms(rpms)
+        self._log(f"Found {len(rpms)} installed RPMs ({self.arch}, release {self.release or 'unknown'})")
+        return latest_rpms
 
-        for rpm in rpms:
-            name = rpm['name']
-            should_exclude = False
-
-            # Check EOL packages
-            if name in eol_patterns:
-                should_exclude = True
-            # Check proprietary exact matches
-            elif name in proprietary_exact:
-                should_exclude = True
-            else:
-                # Check proprietary patterns
-                for pattern in proprietary_patterns:
-                    if name.startswith(pattern):
-                        should_exclude = True
-                        break
 
-            if should_exclude:
-                removed.append(name)
-            else:
-                filtered.append(rpm)
+class TrigramIndex:
+    """Approximate name lookup by trigram similarity
+
+    Names are padded like pg_trgm ('  name ') so that the start of a name
+    weighs more, and scored with the Dice coefficient of their trigram sets:
+    2 * shared / (trigrams(a) + trigrams(b)).
+
+    Candidates are found by prefix filtering: with every trigram set ordered
+    rarest first, two names scoring at least threshold share one of their
+    leading trigrams, so only those are indexed and probed. Postings are
+    grouped by name size and by how many trigrams follow the indexed one,
+    which bounds the overlap of every name in a group (positional filtering)
+    and lets whole groups be skipped before any name is scored.
+    """
+
+    def __init__(self, names: Iterable[str], threshold: float):
+        self.threshold = threshold
+        # Name -> sorted padded trigrams. Tuples of shared strings keep the
+        # index several times smaller than a set per name.
+        self.trigrams = {}
+        self.order = {}  # Name -> insertion position, to break ties
+        canonical = {}
+        frequency = defaultdict(int)
+        for name in names:
+            if name in self.trigrams:
+                continue
+            trigrams = tuple(sorted(canonical.setdefault(t, t) for t in self.padded_trigrams(name)))
+            self.trigrams[name] = trigrams
+            self.order[name] = len(self.order)
+            for trigram in trigrams:
+                frequency[trigram] += 1
+        self.frequency = dict(frequency)
+
+        # Best name per distinct trigram set, answering top-1 identical lookups directly
+        self.identical = {}
+        postings = defaultdict(lambda: defaultdict(list))
+        for name, trigrams in self.trigrams.items():
+            best = self.identical.get(trigrams)
+            if best is None or len(name) < len(best):
+                self.identical[trigrams] = name
+            size = len(trigrams)
+            for position, trigram in enumerate(self._prefix(trigrams)):
+                postings[trigram][(size, size - position)].append(name)
+        # Trigram -> [((name size, trigrams from this one on), names)]
+        self.postings = {trigram: list(groups.items()) for trigram, groups in postings.items()}
 
-        return filtered, removed
+    @staticmethod
+    def padded_trigrams(text: str) -> frozenset:
+        padded = f"  {text} "
+        return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+    def _prefix(self, trigrams: Iterable[str]) -> List[str]:
+        """The rarest trigrams, one of which any name scoring at least threshold shares"""
+        trigrams = list(trigrams)
+        size = len(trigrams)
+        shared = max(1, math.ceil(self.threshold * size / (2 - self.threshold) - 1e-9))
+        ordered = sorted(trigrams, key=lambda t: (self.frequency.get(t, 0), t))
+        return ordered[:size - shared + 1]
+
+    def search(self, query: str, k: int = 1,
+               threshold: Optional[float] = None) -> Tuple[List[Tuple[float, str]], int]:
+        """Return up to k (score, name) pairs scoring at least threshold, and how many names were scored
+
+        threshold defaults to the index threshold. A lower one cannot use the
+        prefix index and scores every name. Best scores come first; ties go
+        to the shorter, then the earlier name.
+        """
+        if threshold is None:
+            threshold = self.threshold
+        trigrams = self.padded_trigrams(query)
+        size = len(trigrams)
+        if k == 1:
+            identical = self.identical.get(tuple(sorted(trigrams)))
+            if identical is not None:
+                return [(1.0, identical)], 1
+
+        if threshold < self.threshold:
+            names = self.trigrams.keys()
+        else:
+            # The first trigram two names share bounds their overlap by what
+            # follows it in either name; later shared trigrams give lower bounds
+            names = set()
+            for position, trigram in enumerate(self._prefix(trigrams)):
+                remaining = size - position
+                for (other_size, other_remaining), group in self.postings.get(trigram, ()):
+                    if min(remaining, other_remaining) >= threshold * (size + other_size) / 2 - 1e-9:
+                        names.update(group)
+
+        scored = []
+        for name in names:
+            other = self.trigrams[name]
+            score = 2 * len(trigrams.intersection(other)) / (size + len(other))
+            if score >= threshold:
+                scored.append((score, name))
+
+        best = heapq.nsmallest(k, scored, key=lambda item: (-item[0], len(item[1]), self.order[item[1]]))
+        return best, len(names)
 
 
 class APKMatcher:
     """Find matching Chainguard APKs"""
 
-    def __init__(self, container_runner: ContainerRunner):
+    def __init__(self, container_runner: ContainerRunner,
+                 inventory_cache: Optional[InventoryCache] = None,
+                 apk_source: Optional[APKIndexSource] = None,
+                 fuzzy_threshold: float = DEFAULT_FUZZY_THRESHOLD):
         self.container_runner = container_runner
+        self.inventory_cache = inventory_cache
+        self.apk_source = apk_source  # Read APKINDEX files instead of querying Wolfi
+        self.fuzzy_threshold = fuzzy_threshold  # Minimum similarity of a fuzzy match
         # Using Chainguard's Wolfi base image which has apk
         self.chainguard_image = "cgr.dev/chainguard/wolfi-base:latest"
         self.apk_cache = None
         self.apk_cache_lower = None
         self.versioned_index = None  # Pre-built index for versioned packages
+        self.trigram_index = None  # TrigramIndex over lowercase APK names for fuzzy lookups
+        self.version_index = None  # (prefix, suffix) -> [(version, lowercase APK name)]
+        self.provides_index = None  # so:/cmd:/pc: provide -> names of the APKs providing it
+
+    def _build_apk_cache(self) -> Tuple[Dict[str, APK], Dict[str, APK]]:
+        """Build a cache of available APKs, reusing the on-disk inventory when fresh"""
+        if self.inventory_cache and not self.apk_source:
+            apks = self.inventory_cache.get(
+                'apk', self.chainguard_image, APK, self._fetch_apks)
+        else:
+            apks = self._fetch_apks()
 
-    def _build_apk_cache(self) -> Dict[str, Dict[str, str]]:
-        """Build a cache of available APKs using wolfi-package-status"""
-        print("Fetching available APKs from Chainguard Wolfi...")
-
-        # Try using wolfi-package-status first (more comprehensive)
-        try:
-            # Get auth token
-            token_result = subprocess.run(
-                ["chainctl", "auth", "token", "--audience", "apk.cgr.dev"],
-                capture_output=True,
-                text=True,
-                check=True
-            )
-            token = token_result.stdout.strip()
-
-            # Get package list
-            result = subprocess.run(
-                ["wolfi-package-status", "--auth-token", token],
-                capture_output=True,
-                text=True,
-                check=True
-            )
-            output = result.stdout
+        apk_cache = {}
+        apk_cache_lower = {}  # Case-insensitive lookup
 
-            apk_cache = {}
-            apk_cache_lower = {}  # Case-insensitive lookup
+        for apk in apks:
+            apk_cache[apk.name] = apk
+            # Also store lowercase version for case-insensitive lookup
+            apk_cache_lower[apk.name.lower()] = apk
 
-            # Parse output format: "package-name version ... in wolfi os repository"
-            for line in output.strip().split('\n'):
-                if not line:
-                    continue
-
-                # Extract just the package name (first word)
-                parts = line.split()
-                if len(parts) > 0:
-                    pkg_name = parts[0]
+        return apk_cache, apk_cache_lower
 
-                    apk_cache[pkg_name] = {
-                        'name': pkg_name,
-                        'version': parts[2] if len(parts) > 2 else 'unknown'
-                    }
+    def _fetch_apks(self) -> List[APK]:
+        """Fetch available APKs using wolfi-package-status"""
+        if self.apk_source:
+            print(f"Reading available APKs from {self.apk_source.describe()}...")
+            apks = list(self.apk_source.iter_apks())
+            print(f"Found {len({apk.name for apk in apks})} APKs in Chainguard Wolfi (via APKINDEX)")
+            return apks
 
-                    # Also store lowercase version for case-insensitive lookup
-                    apk_cache_lower[pkg_name.lower()] = apk_cache[pkg_name]
+        print("Fetching available APKs from Chainguard Wolfi...")
 
-            print(f"Found {len(apk_cache)} APKs in Chainguard Wolfi (via wolfi-package-status)")
+        # Try using wolfi-package-status first (more comprehensive)
+        try:
+            apks = self._parse_wolfi_package_status(self._wolfi_package_status())
+            print(f"Found {len({apk.name for apk in apks})} APKs in Chainguard Wolfi (via wolfi-package-status)")
 
         except (subprocess.CalledProcessError, FileNotFoundError) as e:
             # Fallback to apk search if wolfi-package-status is not available
             print(f"  Warning: wolfi-package-status not available ({e}), falling back to apk search")
 
-            output = self.container_runner.run_command(
-                self.chainguard_image,
-                ["sh", "-c", "apk search -a --no-cache -q | sort | uniq"]
-            )
+            apks = self._parse_apk_search(self._apk_search())
+            print(f"Found {len({apk.name for apk in apks})} APKs in Chainguard Wolfi (via apk search)")
 
-            apk_cache = {}
-            apk_cache_lower = {}
+        return apks
 
-            for line in output.strip().split('\n'):
-                if not line:
-                    continue
+    @staticmethod
+    def _wolfi_package_status() -> str:
+        """Return the raw wolfi-package-status output; raises if it cannot be run"""
+        # Get auth token
+        token_result = subprocess.run(
+            ["chainctl", "auth", "token", "--audience", "apk.cgr.dev"],
+            capture_output=True,
+            text=True,
+            check=True
+        )
+        token = token_result.stdout.strip()
+
+        # Get package list
+        result = subprocess.run(
+            ["wolfi-package-status", "--auth-token", token],
+            capture_output=True,
+            text=True,
+            check=True
+        )
+        return result.stdout
 
-                pkg_name = line.strip()
+    def _apk_search(self) -> str:
+        """Return the raw `apk search` output from the Wolfi base image"""
+        return self.container_runner.run_command(
+            self.chainguard_image,
+            ["sh", "-c", "apk search -a --no-cache -q | sort | uniq"]
+        )
 
-                apk_cache[pkg_name] = {
-                    'name': pkg_name,
-                    'version': 'unknown'
-                }
+    @staticmethod
+    def _parse_wolfi_package_status(output: str) -> List[APK]:
+        """Parse wolfi-package-status output: "package-name version ... in wolfi os repository" lines"""
+        apks = []
+        for line in output.strip().split('\n'):
+            if not line:
+                continue
 
-                apk_cache_lower[pkg_name.lower()] = apk_cache[pkg_name]
+            # Extract just the package name (first word)
+            parts = line.split()
+            if len(parts) > 0:
+                apks.append(APK.from_row((
+                    parts[0],
+                    parts[2] if len(parts) > 2 else 'unknown'
+                )))
+        return apks
 
-            print(f"Found {len(apk_cache)} APKs in Chainguard Wolfi (via apk search)")
+    @staticmethod
+    def _parse_apk_search(output: str) -> List[APK]:
+        """Parse `apk search -q` output, one package name per line"""
+        apks = []
+        for line in output.strip().split('\n'):
+            if not line:
+                continue
 
-        return apk_cache, apk_cache_lower
+            apks.append(APK.from_row((line.strip(), 'unknown')))
+        return apks
 
-    def find_match(self, rpm: Dict[str, str]) -> Optional[Dict[str, str]]:
-        """Find matching APK for an RPM with creative matching strategies"""
+    def load_inventory(self):
+        """Fetch the APK inventory and build lookup indexes, if not done already"""
         if self.apk_cache is None:
             self.apk_cache, self.apk_cache_lower = self._build_apk_cache()
+            self._build_indexes()
+
+    def find_match(self, rpm: RPM) -> Optional[APK]:
+        """Find matching APK for an RPM with creative matching strategies"""
+        return self.explain_match(rpm).apk
 
-        rpm_name = rpm['name']
+    def explain_match(self, rpm: RPM) -> MatchResult:
+        """Find matching APK for an RPM, recording which strategy matched and what each cost"""
+        self.load_inventory()
+
+        rpm_name = rpm.name
+        timings = []
+        clock = time.perf_counter
+        started = clock()
+
+        def lap(strategy):
+            nonlocal started
+            now = clock()
+            timings.append((strategy, now - started))
+            started = now
+
+        def finish(strategy, apk, candidates, score=1.0):
+            lap(strategy)
+            return MatchResult(apk, strategy, candidates, tuple(timings), score)
 
         # Try exact name match first (case-sensitive)
         if rpm_name in self.apk_cache:
-            return self.apk_cache[rpm_name]
+            return finish(STRATEGY_EXACT, self.apk_cache[rpm_name], 1)
+        lap(STRATEGY_EXACT)
 
         # Try exact name match (case-insensitive)
         if rpm_name.lower() in self.apk_cache_lower:
-            return self.apk_cache_lower[rpm_name.lower()]
+            return finish(STRATEGY_CASE_INSENSITIVE, self.apk_cache_lower[rpm_name.lower()], 1)
+        lap(STRATEGY_CASE_INSENSITIVE)
 
         # Try all alternative matching strategies
         alternatives = self._generate_alternatives(rpm_name)
 
-        for alt in alternatives:
+        for position, alt in enumerate(alternatives, 1):
             if not alt:
                 continue
+            if isinstance(alt, VersionFamily):
+                apk = self._newest_in_family(alt)
+                if apk:
+                    return finish(STRATEGY_ALTERNATIVE, apk, position)
+                continue
             # Try case-sensitive first
             if alt in self.apk_cache:
-                return self.apk_cache[alt]
+                return finish(STRATEGY_ALTERNATIVE, self.apk_cache[alt], position)
             # Then case-insensitive
             if alt.lower() in self.apk_cache_lower:
-                return self.apk_cache_lower[alt.lower()]
+                return finish(STRATEGY_ALTERNATIVE, self.apk_cache_lower[alt.lower()], position)
+        lap(STRATEGY_ALTERNATIVE)
+
+        # Try APKs providing the same sonames, commands and pkg-config modules
+        provides_match, provides_candidates, coverage = self._find_by_provides(rpm)
+        if provides_match:
+            return finish(STRATEGY_PROVIDES, provides_match, provides_candidates, coverage)
+        lap(STRATEGY_PROVIDES)
 
         # Try versioned variants (foo -> foo-21, foo-20, etc., pick highest version)
         versioned_match = self._find_versioned_variant(rpm_name)
         if versioned_match:
-            return versioned_match
+            return finish(STRATEGY_VERSIONED, versioned_match, 1)
+        lap(STRATEGY_VERSIONED)
 
-        # Fuzzy matching as last resort - find APKs containing the RPM base name
-        base_name = self._get_base_name(rpm_name)
-        if len(base_name) >= 4:  # Only for names with 4+ chars to avoid false matches
-            fuzzy_match = self._fuzzy_search(base_name)
-            if fuzzy_match:
-                return fuzzy_match
+        # Fuzzy matching as last resort - the most similar APK name above the threshold
+        fuzzy_matches, candidates = self._fuzzy_search_counted(rpm_name, 1)
+        if fuzzy_matches:
+            apk, score = fuzzy_matches[0]
+            return finish(STRATEGY_FUZZY, apk, candidates, score)
+        lap(STRATEGY_FUZZY)
 
-        return None
+        return MatchResult(None, STRATEGY_UNMATCHED, len(alternatives) + provides_candidates + candidates,
+                           tuple(timings))
+
+    @staticmethod
+    def _strip_suffix(rpm_name: str) -> str:
+        """Remove a packaging suffix such as -devel or -libs from an RPM name"""
+        for suffix in FUZZY_STRIP_SUFFIXES:
+            if rpm_name.endswith(suffix):
+                return rpm_name[:-len(suffix)]
+        return rpm_name
 
     def _get_base_name(self, rpm_name: str) -> str:
         """Extract base name from RPM package name"""
-        # Remove common suffixes
-        name = rpm_name
-        for suffix in ['-devel', '-libs', '-tools', '-utils', '-doc', '-docs', '-common']:
-            if name.endswith(suffix):
-                name = name[:-len(suffix)]
-                break
-        # Remove version numbers
-        name = re.sub(r'-?\d+\.?\d*$', '', name)
-        return name
-
-    def _fuzzy_search(self, base_name: str) -> Optional[Dict[str, str]]:
-        """Find APK package that closely matches the base name (case-insensitive)"""
-        base_lower = base_name.lower()
-
-        # Look for exact substring match (case-insensitive)
-        if base_lower in self.apk_cache_lower:
-            return self.apk_cache_lower[base_lower]
-
-        # Look for APKs that start with the base name (case-insensitive)
-        candidates = [k for k in self.apk_cache_lower.keys() if k.startswith(base_lower)]
-        if candidates:
-            # Prefer shorter names (closer match)
-            candidates.sort(key=len)
-            return self.apk_cache_lower[candidates[0]]
-
-        # Look for APKs that contain the base name (case-insensitive)
-        candidates = [k for k in self.apk_cache_lower.keys() if base_lower in k]
-        if candidates:
-            # Prefer names where base is at the start
-            for candidate in candidates:
-                if candidate.startswith(base_lower):
-                    return self.apk_cache_lower[candidate]
-            # Otherwise return shortest match
-            candidates.sort(key=len)
-            return self.apk_cache_lower[candidates[0]]
+        # Remove common suffixes, then version numbers
+        return re.sub(r'-?\d+\.?\d*$', '', self._strip_suffix(rpm_name))
 
-        return None
+    def _fuzzy_queries(self, rpm_name: str) -> List[str]:
+        """Lowercase names an RPM is fuzzy matched by: without its suffix, and without its version
+
+        Names under 4 characters are skipped to avoid false matches.
+        """
+        stripped = self._strip_suffix(rpm_name).lower()
+        queries = dict.fromkeys([stripped, self._get_base_name(rpm_name).lower()])
+        return [query for query in queries if len(query) >= 4]
+
+    @staticmethod
+    def _versioned_stems(apk_name: str) -> List[Tuple[str, int, int]]:
+        """Return every (stem, major, minor) that makes apk_name a versioned variant of stem
+
+        Mirrors the three shapes accepted by _find_versioned_variant:
+        {stem}-{N}, {stem}{major}.{minor} and {stem}{N}
+        """
+        stems = []
+
+        # Pattern 1: {name}-{version} (e.g., lld-21)
+        match = VERSIONED_DASH_RE.match(apk_name)
+        if match:
+            stems.append((match.group(1), int(match.group(2)), 0))
+
+        # Pattern 2: {name}{major}.{minor} (e.g., lua5.4, python3.12)
+        # The major number may be split anywhere inside its digit run
+        match = VERSIONED_DOTTED_RE.search(apk_name)
+        if match:
+            prefix = apk_name[:match.start()]
+            digits = match.group(1)
+            minor = int(match.group(2))
+            for i in range(len(digits)):
+                stems.append((prefix + digits[:i], int(digits[i:]), minor))
+
+        # Pattern 3: {name}{version} (e.g., python3, ruby3)
+        match = VERSIONED_PLAIN_RE.search(apk_name)
+        if match:
+            prefix = apk_name[:match.start()]
+            digits = match.group(1)
+            for i in range(len(digits)):
+                stems.append((prefix + digits[:i], int(digits[i:]), 0))
+
+        return stems
+
+    def _build_indexes(self):
+        """Build lookup indexes over the APK cache once it has been loaded
+
+        - versioned_index: stem -> highest (major, minor, apk_name) variant
+        - trigram_index: similarity index over lowercase APK names
+        - version_index: (prefix, suffix) -> versions of the APK names around it
+        - provides_index: so:/cmd:/pc: provide -> APK names providing it
+        """
+        versioned_index = {}
+        for apk_name in self.apk_cache:
+            for stem, major, minor in self._versioned_stems(apk_name):
+                candidate = (major, minor, apk_name)
+                best = versioned_index.get(stem)
+                if best is None or candidate > best:
+                    versioned_index[stem] = candidate
+        self.versioned_index = versioned_index
+
+        self.trigram_index = TrigramIndex(self.apk_cache_lower, self.fuzzy_threshold)
+
+        version_index = defaultdict(list)
+        for name in self.apk_cache_lower:
+            for prefix, suffix, version in self._version_splits(name):
+                version_index[(prefix, suffix)].append((version, name))
+        self.version_index = dict(version_index)
+
+        provides_index = defaultdict(list)
+        for apk in self.apk_cache.values():
+            for provide in apk.provides:
+                provides_index[provide].append(apk.name)
+        self.provides_index = dict(provides_index)
+
+    @staticmethod
+    def _version_splits(apk_name: str) -> List[Tuple[str, str, str]]:
+        """Return (prefix, suffix, version) for each version number in apk_name"""
+        return [
+            (apk_name[:match.start()], apk_name[match.end():], match.group())
+            for match in APK_VERSION_RE.finditer(apk_name)
+        ]
+
+    def _newest_in_family(self, family: VersionFamily) -> Optional[APK]:
+        """Return the APK with the newest version in family, or None if none is available"""
+        best = None
+        for position, (prefix, suffix) in enumerate(family.templates):
+            for version, name in self.version_index.get((prefix.lower(), suffix.lower()), ()):
+                if family.version.fullmatch(version):
+                    candidate = (version_sort_key(version), -position, name)
+                    if best is None or candidate > best:
+                        best = candidate
+        return self.apk_cache_lower[best[2]] if best else None
+
+    def fuzzy_candidates(self, rpm_name: str, k: int = FUZZY_TOP_K,
+                         threshold: Optional[float] = None) -> List[Tuple[APK, float]]:
+        """Return up to k (APK, similarity) pairs at or above threshold, most similar first
+
+        threshold defaults to the fuzzy threshold matches are made at.
+        """
+        self.load_inventory()
+        return self._fuzzy_search_counted(rpm_name, k, threshold)[0]
+
+    def _fuzzy_search_counted(self, rpm_name: str, k: int,
+                              threshold: Optional[float] = None) -> Tuple[List[Tuple[APK, float]], int]:
+        """fuzzy_candidates, also returning how many candidate APK names were scored"""
+        best = {}  # Lowercase APK name -> best score over the queries
+        scored = 0
+        for query in self._fuzzy_queries(rpm_name):
+            matches, count = self.trigram_index.search(query, k, threshold)
+            scored += count
+            for score, name in matches:
+                if score > best.get(name, 0):
+                    best[name] = score
+
+        order = self.trigram_index.order
+        ranked = sorted(best.items(), key=lambda item: (-item[1], len(item[0]), order[item[0]]))[:k]
+        return [(self.apk_cache_lower[name], round(score, 3)) for name, score in ranked], scored
+
+    def _find_by_provides(self, rpm: RPM) -> Tuple[Optional[APK], int, Optional[float]]:
+        """Find the APK sharing most of the RPM's so:, cmd: and pc: provides
+
+        Returns the APK (or None), the number of APKs sharing any provide,
+        and the share of the RPM's provides the APK has, which has to be at
+        least PROVIDES_MIN_COVERAGE. Ties go to the APK with fewer provides
+        of its own, the more specific package, then to the shorter name.
+        """
+        if not rpm.provides or not self.provides_index:
+            return None, 0, None
+        shared = Counter()
+        for provide in rpm.provides:
+            shared.update(self.provides_index.get(provide, ()))
+        if not shared:
+            return None, 0, None
+
+        apk_name, count = min(
+            shared.items(),
+            key=lambda item: (-item[1], len(self.apk_cache[item[0]].provides), len(item[0]), item[0])
+        )
+        coverage = count / len(rpm.provides)
+        if coverage < PROVIDES_MIN_COVERAGE:
+            return None, len(shared), None
+        return self.apk_cache[apk_name], len(shared), round(coverage, 3)
+
+    def provides_digests(self) -> Dict[str, str]:
+        """APK name -> digest of its provides, for the APKs that list any"""
+        return {
+            apk.name: hashlib.sha1(' '.join(apk.provides).encode()).hexdigest()[:16]
+            for apk in self.apk_cache.values() if apk.provides
+        }
 
-    def _find_versioned_variant(self, rpm_name: str) -> Optional[Dict[str, str]]:
+    def _find_versioned_variant(self, rpm_name: str) -> Optional[APK]:
         """Find versioned APK variants (foo -> foo-21, lua -> lua5.4, etc.)
         Returns the APK with the highest version number"""
-        import re
-
-        # Look for packages matching {rpm_name}-{number} or {rpm_name}{number}.{number}
-        # e.g., lld -> lld-21, lua -> lua5.4
-        candidates = []
-
-        for apk_name in self.apk_cache.keys():
-            # Pattern 1: {name}-{version} (e.g., lld-21)
-            match = re.match(rf'^{re.escape(rpm_name)}-(\d+)$', apk_name)
-            if match:
-                version = int(match.group(1))
-                candidates.append((version, 0, apk_name))
-                continue
+        best = self.versioned_index.get(rpm_name)
+        if best is None:
+            return None
 
-            # Pattern 2: {name}{major}.{minor} (e.g., lua5.4, python3.12)
-            match = re.match(rf'^{re.escape(rpm_name)}(\d+)\.(\d+)$', apk_name)
-            if match:
-                major = int(match.group(1))
-                minor = int(match.group(2))
-                # Use tuple for proper version comparison
-                candidates.append((major, minor, apk_name))
-                continue
+        return self.apk_cache[best[2]]
 
-            # Pattern 3: {name}{version} (e.g., python3, ruby3)
-            match = re.match(rf'^{re.escape(rpm_name)}(\d+)$', apk_name)
-            if match:
-                version = int(match.group(1))
-                candidates.append((version, 0, apk_name))
-                continue
+    def rpms_affected_by(self, apk_names, rpm_names,
+                         rpm_provides: Optional[Dict[str, Iterable[str]]] = None) -> set:
+        """Return the RPM names whose match could change when apk_names appear or disappear
 
-        if not candidates:
-            return None
+        Conservative: an RPM is affected if any changed APK is a candidate for it
+        in any strategy, whether or not that strategy would have been reached.
+        rpm_provides maps RPM names to their provides, for the provides strategy.
+        """
+        changed = {name.lower(): name for name in apk_names}
+        changed_splits = [split for name in changed for split in self._version_splits(name)]
+        names = set(rpm_names)
+        affected = set()
+
+        by_lower = defaultdict(list)
+        by_query = defaultdict(list)
+        for rpm_name in rpm_names:
+            by_lower[rpm_name.lower()].append(rpm_name)
+            for query in self._fuzzy_queries(rpm_name):
+                by_query[query].append(rpm_name)
+
+            # Alternative names, and versions of alternative families
+            for alt in self._generate_alternatives(rpm_name):
+                if isinstance(alt, VersionFamily):
+                    if any(alt.accepts(*split) for split in changed_splits):
+                        affected.add(rpm_name)
+                        break
+                elif alt and alt.lower() in changed:
+                    affected.add(rpm_name)
+                    break
 
-        # Sort by version (highest first)
-        candidates.sort(reverse=True)
-        latest_apk = candidates[0][2]
-
-        return self.apk_cache[latest_apk]
-
-    def _generate_alternatives(self, rpm_name: str) -> List[str]:
-        """Generate all possible APK name alternatives for an RPM"""
-        alternatives = []
-
-        # Strategy 1: Direct tool/package equivalents
-        tool_mappings = {
-            # Package managers (note: some RPM-specific ones filtered out earlier)
-            'rpm-libs': 'apk-tools',
-            # Network
-            'NetworkManager': 'network-manager',
-            'NetworkManager-libnm': 'network-manager',
-            # Web servers
-            'httpd': 'apache2',
-            'httpd-core': 'apache2',
-            'httpd-tools': 'apache2-utils',
-            'httpd-devel': 'apache2-dev',
-            # Databases
-            'mariadb': 'mariadb-client',
-            'mariadb-common': 'mariadb-common',
-            'mysql': 'mariadb-client',
-            'mysql-libs': 'mariadb-connector-c',
-            'mysql-common': 'mariadb-common',
-            'postgresql': 'postgresql-client',
-            'postgresql-private-libs': 'libpq',
-            # Utilities
-            'net-tools': 'net-tools-deprecated',
-            'coreutils-common': 'coreutils',
-            'util-linux-user': 'util-linux',
-            'procps-ng': 'procps',
-            # APR
-            'apr': 'apr-util',
-            'apr-devel': 'apr-util-dev',
-            # Augeas
-            'augeas-libs': 'augeas',
-            # Bind
-            'bind-libs': 'bind',
-            'bind-utils': 'bind-tools',
-            'bind-license': 'bind',
-            # Crypto
-            'compat-openssl11': 'openssl',
-            'openssl-libs': 'openssl',
-            'openssl-devel': 'openssl-dev',
-            # System
-            'shadow-utils-subid': 'shadow',
-            'audit-libs': 'audit',
-            'pam': 'linux-pam',
-            'libselinux': 'libselinux',
-            'libselinux-devel': 'libselinux-dev',
-            # Compression
-            'bzip2-libs': 'bzip2',
-            'xz-libs': 'xz',
-            'lz4-libs': 'lz4',
-            'libzstd': 'zstd',
-            # Build tools
-            'gcc-c++': 'g++',
-            'binutils-gold': 'binutils',
-            'make': 'make',
-            # Container tools
-            'podman-docker': 'podman',
-            'podman-remote': 'podman',
-            'containers-common-extra': 'containers-common',
-            'containernetworking-plugins': 'cni-plugins',
-            'aardvark-dns': 'aardvark-dns',  # Direct match attempt
-            # LLVM/Clang
-            'clang-libs': 'clang',
-            'llvm-libs': 'llvm',
-            'compiler-rt': 'compiler-rt',
-            # Rust
-            'cargo-doc': 'cargo',
-            'rust-analysis': 'rust',
-            'rust-doc': 'rust',
-            'rust-src': 'rust',
-            'clippy': 'rust',
-            'rustfmt': 'rust',
-            # Go
-            'golang-bin': 'go',
-            'golang': 'go',
-            'golang-docs': 'go',
-            'golang-misc': 'go',
-            'golang-src': 'go',
-            'golang-tests': 'go',
-            # Node.js
-            'nodejs-libs': 'nodejs',
-            'nodejs-docs': 'nodejs',
-            'nodejs-full-i18n': 'nodejs',
-            # Perl
-            'perl-interpreter': 'perl',
-            'perl-libs': 'perl',
-            'perl-macros': 'perl',
-            # Various libs
-            'dbus-libs': 'dbus',
-            'dbus-tools': 'dbus',
-            'dbus-daemon': 'dbus',
-            'elfutils-libs': 'elfutils',
-            'elfutils-libelf': 'elfutils',
-            'file-libs': 'file',
-            'gdbm-libs': 'gdbm',
-            'keyutils-libs': 'keyutils',
-            'kmod-libs': 'kmod',
-            'libacl': 'acl',
-            'libattr': 'attr',
-            'libblkid': 'util-linux',
-            'libcap': 'libcap',
-            'libcom_err': 'e2fsprogs',
-            'libfdisk': 'util-linux',
-            'libmount': 'util-linux',
-            'libsmartcols': 'util-linux',
-            'libuuid': 'util-linux',
-            'ncurses-libs': 'ncurses',
-            'ncurses-c++-libs': 'ncurses',
-            'pcre-cpp': 'pcre',
-            'pcre-utf16': 'pcre',
-            'pcre-utf32': 'pcre',
-            'pcre2-utf16': 'pcre2',
-            'pcre2-utf32': 'pcre2',
-            'readline': 'readline',
-            'sqlite-libs': 'sqlite',
-            # Debugger
-            'gdb-headless': 'gdb',
-            # Archive tools
-            'bsdtar': 'libarchive-tools',
-            # C preprocessor
-            'cpp': 'gcc',
-            # Cyrus SASL
-            'cyrus-sasl-lib': 'cyrus-sasl',
-            'cyrus-sasl-gssapi': 'cyrus-sasl',
-            'cyrus-sasl-plain': 'cyrus-sasl',
-            # elfutils
-            'elfutils-debuginfod-client': 'elfutils',
-            # hunspell dictionaries
-            'hunspell-en-US': 'hunspell-dictionary-en',
-            'hunspell-en': 'hunspell-dictionary-en',
-            # Git
-            'git-core': 'git',
-            # Vim
-            'vim-common': 'vim',
-            # Nginx
-            'nginx-core': 'nginx-mainline',
-            # Lua
-            'lua-libs': 'lua5.4-libs',
-            # GCC compilers
-            'gcc-c++': 'gcc',
-            'gcc-gfortran': 'gfortran',
-            # PHP
-            'php': 'php-8.5',
-            # Python
-            'python3-debug': 'py3-debugpy',
-            # Ruby base packages
-            'rubygems': 'ruby-3.4',
-            'rubygems-devel': 'ruby-3.4-dev',
-            # GCC toolset base
-            'gcc-toolset-15': 'gcc',
-            # OpenSSH
-            'openssh-clients': 'openssh-client',
-            # Keyboard
-            'kbd-misc': 'kbd',
-            # Libtool
-            'libtool-ltdl': 'libtool',
+        for apk_lower, apk_name in changed.items():
+            # Exact and case-insensitive names
+            affected.update(by_lower.get(apk_lower, ()))
+
+            # Versioned variants of the RPM name
+            for stem, _, _ in self._versioned_stems(apk_name):
+                if stem in names:
+                    affected.add(stem)
+
+        # Provides of the changed APKs that are still available
+        changed_provides = {
+            provide for name in apk_names if name in self.apk_cache
+            for provide in self.apk_cache[name].provides
         }
+        if changed_provides and rpm_provides:
+            affected.update(name for name, provides in rpm_provides.items()
+                            if not changed_provides.isdisjoint(provides))
 
-        if rpm_name in tool_mappings:
-            alternatives.append(tool_mappings[rpm_name])
-
-        # Strategy 2: .NET/ASP.NET packages (aspnetcore-runtime-10.0 -> aspnet-10-runtime)
-        aspnet_match = re.match(r'^aspnetcore-(.+?)-(\d+)\.(\d+)$', rpm_name)
-        if aspnet_match:
-            component = aspnet_match.group(1)
-            major = aspnet_match.group(2)
-            # Try: aspnet-{major}-{component}
-            alternatives.append(f'aspnet-{major}-{component}')
-            alternatives.append(f'aspnet{major}-{component}')
-            alternatives.append(f'dotnet-{major}-{component}')
-            alternatives.append(f'dotnet{major}-{component}')
-
-        # Strategy 3: .NET SDK/runtime packages
-        dotnet_match = re.match(r'^dotnet-(.+?)-(\d+)\.(\d+)$', rpm_name)
-        if dotnet_match:
-            component = dotnet_match.group(1)
-            major = dotnet_match.group(2)
-            alternatives.append(f'dotnet-{major}-{component}')
-            alternatives.append(f'dotnet{major}-{component}')
-            alternatives.append(f'dotnet-{component}-{major}')
-            # Special case for dotnet-sdk-aot-10.0 -> dotnet-10-aot
-            if component == 'sdk-aot':
-                alternatives.append(f'dotnet-{major}-aot')
-
-        # Strategy 4: GCC toolsets (gcc-toolset-12-gcc -> gcc-12, gcc-12-default, etc.)
-        # First check for base toolset package (gcc-toolset-12 without component)
-        gcc_base_match = re.match(r'^gcc-toolset-(\d+)$', rpm_name)
-        if gcc_base_match:
-            version = gcc_base_match.group(1)
-            alternatives.append(f'gcc-{version}')
-            alternatives.append(f'gcc-{version}-default')
-
-        gcc_match = re.match(r'^gcc-toolset-(\d+)-(.+)$', rpm_name)
-        if gcc_match:
-            version = gcc_match.group(1)
-            component = gcc_match.group(2)
-
-            # Map to gcc-{version} and gcc-{version}-default
-            if component == 'gcc':
-                alternatives.append(f'gcc-{version}')
-                alternatives.append(f'gcc-{version}-default')
-                alternatives.append('gcc')  # Fallback to default
-            elif component == 'gcc-c++':
-                alternatives.append(f'g++-{version}')
-                alternatives.append(f'gcc-{version}')  # C++ is part of gcc package
-            elif component == 'gcc-gfortran':
-                alternatives.append(f'gfortran-{version}')
-                alternatives.append(f'gcc-{version}')  # Fortran might be part of gcc
-            elif component == 'binutils':
-                alternatives.append(f'binutils')  # Usually no versioned binutils
-            elif component == 'gdb':
-                alternatives.append('gdb')
-            elif component.startswith('lib'):
-                # Library packages (libstdc++, libasan, etc.) - try gcc package
-                alternatives.append(f'gcc-{version}')
-                alternatives.append(f'{component}')
-            elif component in ['runtime', 'build']:
-                # Meta packages - map to main gcc
-                alternatives.append(f'gcc-{version}')
-            else:
-                # Other components
-                alternatives.append(f'{component}-{version}')
-                alternatives.append(f'gcc-{version}')
-
-        # Strategy 4b: LLVM toolset (llvm-toolset -> llvm-18, llvm15-tools)
-        if rpm_name == 'llvm-toolset':
-            # Try various LLVM versions
-            for ver in ['21', '20', '19', '18', '17', '16', '15']:
-                alternatives.append(f'llvm{ver}')
-                alternatives.append(f'llvm-{ver}')
-                alternatives.append(f'llvm{ver}-tools')
-                alternatives.append(f'llvm-{ver}-tools')
-
-        # Strategy 4c: Rust toolset (rust-toolset -> rust-1.91, rust)
-        if rpm_name == 'rust-toolset':
-            alternatives.append('rust')
-            # Try recent versions
-            for minor in range(91, 80, -1):
-                alternatives.append(f'rust-1.{minor}')
-
-        # Strategy 4d: Go toolset (go-toolset -> go-1.23, go)
-        if rpm_name == 'go-toolset':
-            alternatives.append('go')
-            # Try recent versions
-            for minor in range(25, 19, -1):
-                alternatives.append(f'go-1.{minor}')
-
-        # Strategy 5: Versioned -devel packages (clang-devel -> clang-18-dev, clang-17-dev, etc.)
-        if rpm_name.endswith('-devel'):
-            base = rpm_name[:-6]  # Remove '-devel'
-
-            # Try base-dev first
-            alternatives.append(f'{base}-dev')
-
-            # For compilers/tools, try with common version numbers
-            if base in ['clang', 'llvm', 'gcc', 'python', 'perl', 'ruby', 'php', 'node', 'nodejs']:
-                for ver in ['18', '17', '16', '15', '14', '13', '12', '11', '10', '9', '8', '7', '3']:
-                    alternatives.append(f'{base}-{ver}-dev')
-                    alternatives.append(f'{base}{ver}-dev')
-
-        # Strategy 6: -libs suffix variations
-        if rpm_name.endswith('-libs'):
-            base = rpm_name[:-5]
-            alternatives.append(base)  # Remove -libs
-            alternatives.append(f'lib{base}')  # Add lib prefix
-            alternatives.append(f'{base}-libs')  # Keep as-is
-
-        # Strategy 7: -tools suffix
-        if rpm_name.endswith('-tools'):
-            base = rpm_name[:-6]
-            alternatives.append(base)
-            alternatives.append(f'{base}-utils')
-            alternatives.append(f'{base}-tools')
-
-        # Strategy 8: lib prefix handling
-        if rpm_name.startswith('lib') and len(rpm_name) > 3:
-            without_lib = rpm_name[3:]
-            alternatives.append(without_lib)
-
-            # If it ends in -devel, try without lib and with -dev
-            if rpm_name.endswith('-devel'):
-                base = rpm_name[3:-6]  # Remove 'lib' and '-devel'
-                alternatives.append(f'{base}-dev')
-
-        # Strategy 9: Python version variations (python3.11-requests -> py3.11-requests)
-        python_match = re.match(r'^python(\d+)\.(\d+)(.*)$', rpm_name)
-        if python_match:
-            major = python_match.group(1)
-            minor = python_match.group(2)
-            suffix = python_match.group(3)
-
-            # Primary pattern: py3.11-package (most common in Chainguard)
-            alternatives.append(f'py{major}.{minor}{suffix}')
-
-            # Alternative patterns
-            alternatives.append(f'python-{major}.{minor}{suffix}')
-            alternatives.append(f'python{major}.{minor}{suffix}')
-            alternatives.append(f'py{major}{suffix}')
-            alternatives.append(f'python{major}{suffix}')
-
-            if not suffix:
-                alternatives.append('python3')
-                alternatives.append('python')
-
-        # Strategy 10: Java OpenJDK versions (java-17-openjdk -> openjdk-17, java-1.8.0-openjdk -> openjdk-8)
-        java_match = re.match(r'^java-(\d+)-openjdk(.*)$', rpm_name)
-        if java_match:
-            version = java_match.group(1)
-            suffix = java_match.group(2)
-            alternatives.append(f'openjdk-{version}{suffix}')
-            alternatives.append(f'openjdk{version}{suffix}')
-            alternatives.append(f'java-{version}{suffix}')
-            # -headless suffix usually maps to base package
-            if suffix == '-headless':
-                alternatives.append(f'openjdk-{version}')
-                alternatives.append(f'openjdk-{version}-jre')
-            elif suffix == '-devel':
-                alternatives.append(f'openjdk-{version}-default-jdk')
-                alternatives.append(f'openjdk-{version}-jdk')
-
-        # Special handling for Java 8 (version 1.8.0)
-        java8_match = re.match(r'^java-1\.8\.0-openjdk(.*)$', rpm_name)
-        if java8_match:
-            suffix = java8_match.group(1)
-            alternatives.append(f'openjdk-8{suffix}')
-            alternatives.append('openjdk-8')
-            alternatives.append('openjdk-8-jre')
-            alternatives.append('openjdk-8-default-jvm')
-            alternatives.append('openjdk-8-default-jdk')
-            if suffix == '-headless':
-                alternatives.append('openjdk-8')
-            elif suffix == '-devel':
-                alternatives.append('openjdk-8-default-jdk')
-                alternatives.append('openjdk-8-dev')
-
-        # Strategy 11: Perl modules (perl-Something -> perl-something)
-        if rpm_name.startswith('perl-'):
-            alternatives.append(rpm_name.lower())
-            # Try without perl- prefix
-            alternatives.append(rpm_name[5:].lower())
-
-        # Strategy 11b: Ruby gems (rubygem-bundler -> ruby3.4-bundler)
-        if rpm_name.startswith('rubygem-'):
-            gem_name = rpm_name[8:]  # Remove 'rubygem-'
-            # Primary: Try ruby3.4-* (Chainguard uses versioned ruby packages)
-            alternatives.append(f'ruby3.4-{gem_name}')
-            alternatives.append(f'ruby3.3-{gem_name}')
-            alternatives.append(f'ruby3.2-{gem_name}')
-            # Fallback: Try older patterns
-            alternatives.append(f'ruby-{gem_name}')
-            alternatives.append(gem_name)
-            # Common Ruby gems
-            if gem_name in ['bundler', 'rake', 'rdoc', 'irb']:
-                alternatives.append('ruby')  # Part of ruby package
-
-        # Strategy 11c: Python modules (python3-setuptools -> py3-setuptools)
-        if rpm_name.startswith('python3-'):
-            module_name = rpm_name[8:]
-            alternatives.append(f'py3-{module_name}')
-            alternatives.append(f'python-{module_name}')
-            alternatives.append(module_name)
-
-        # Strategy 11d: PHP modules (php-xml -> php-8.3-xml, etc.)
-        if rpm_name.startswith('php-'):
-            module_name = rpm_name[4:]
-            # Try with common PHP versions
-            for ver in ['8.3', '8.2', '8.1', '8.0', '7.4']:
-                alternatives.append(f'php-{ver}-{module_name}')
-                alternatives.append(f'php{ver}-{module_name}')
-            alternatives.append(f'php-{module_name}')
-
-        # Strategy 11e: PHP PECL extensions
-        if rpm_name.startswith('php-pecl-'):
-            ext_name = rpm_name[9:]
-            alternatives.append(f'php-{ext_name}')
-            alternatives.append(f'php-pecl-{ext_name}')
-            for ver in ['8.3', '8.2', '8.1']:
-                alternatives.append(f'php-{ver}-{ext_name}')
-
-        # Strategy 12: Container tools
-        container_mappings = {
-            'podman-docker': 'podman',
-            'podman-remote': 'podman',
-            'skopeo': 'skopeo',
-            'buildah': 'buildah',
-            'containers-common': 'containers-common',
+        # Fuzzy matches: similarity is symmetric, so search the RPM fuzzy
+        # queries with each changed APK name
+        query_index = TrigramIndex(by_query, self.fuzzy_threshold)
+        for apk_lower in changed:
+            matches, _ = query_index.search(apk_lower, len(by_query))
+            for _, query in matches:
+                affected.update(by_query[query])
+
+        return affected
+
+    @staticmethod
+    def _generate_alternatives(rpm_name: str) -> tuple:
+        """Generate all possible APK name alternatives for an RPM (see ALTERNATIVE_RULES)
+
+        Fuzzy matching (APK names containing the RPM base name) is done as a
+        last resort in find_match.
+        """
+        return generate_alternatives(rpm_name)
+
+
+@lru_cache(maxsize=None)
+def _script_digest() -> str:
+    with open(os.path.abspath(__file__), 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def matching_fingerprint(fuzzy_threshold: float) -> str:
+    """Digest of what a match depends on besides the inventories
+
+    That is this script, with its mapping and alternative rule tables,
+    exclusion patterns and matching code, and the fuzzy threshold. Any
+    edit to the script counts as a rule change.
+    """
+    return hashlib.sha256(f"{_script_digest()} {fuzzy_threshold!r}".encode()).hexdigest()[:16]
+
+
+class MappingState:
+    """Inventories and matches from a previous run, used by --incremental"""
+
+    FORMAT_VERSION = 4
+
+    def __init__(self, rpms: List[RPM], apks: List[str], matches: Dict[str, str],
+                 fuzzy_threshold: float = DEFAULT_FUZZY_THRESHOLD,
+                 apk_provides: Optional[Dict[str, str]] = None,
+                 fingerprint: Optional[str] = None):
+        self.rpms = rpms
+        self.apks = apks
+        self.matches = matches  # RPM name -> APK name ('' if unmatched)
+        self.fuzzy_threshold = fuzzy_threshold
+        self.apk_provides = apk_provides or {}  # APK name -> digest of its provides (APKMatcher.provides_digests)
+        # matching_fingerprint of the run that produced the matches
+        self.fingerprint = fingerprint or matching_fingerprint(fuzzy_threshold)
+
+    @staticmethod
+    def default_path(output_file: str) -> str:
+        return f"{output_file}.state.json"
+
+    @classmethod
+    def load(cls, path: str) -> Optional['MappingState']:
+        """Load a previous state, or return None if there is no usable one"""
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get('format') != cls.FORMAT_VERSION:
+            return None
+        rpms = [RPM.from_row(row) for row in data['rpms']]
+        return cls(rpms, data['apks'], data['matches'], data['fuzzy_threshold'], data['apk_provides'],
+                   data['fingerprint'])
+
+    def save(self, path: str):
+        write_json_atomic(path, {
+            'format': self.FORMAT_VERSION,
+            'rpms': [list(rpm) for rpm in self.rpms],
+            'apks': self.apks,
+            'matches': self.matches,
+            'fuzzy_threshold': self.fuzzy_threshold,
+            'apk_provides': self.apk_provides,
+            'fingerprint': self.fingerprint,
+        })
+
+    def rpms_to_rematch(self, rpms: List[RPM], apk_matcher: APKMatcher) -> set:
+        """Return the names of RPMs whose match has to be recomputed
+
+        An RPM is re-matched if it is new, its name/version/release/arch or
+        provides changed, or an APK that was added or removed, or whose
+        provides changed, could be a candidate for it. Everything is
+        re-matched if the fuzzy threshold or the matching rules changed.
+        """
+        if self.fuzzy_threshold != apk_matcher.fuzzy_threshold:
+            print(f"Incremental: fuzzy threshold changed from {self.fuzzy_threshold}, "
+                  f"re-matching all {len(rpms)} RPMs")
+            return {rpm.name for rpm in rpms}
+        if self.fingerprint != matching_fingerprint(apk_matcher.fuzzy_threshold):
+            print(f"Incremental: matching rules changed since the previous run, "
+                  f"re-matching all {len(rpms)} RPMs")
+            return {rpm.name for rpm in rpms}
+
+        previous = {rpm.name: rpm for rpm in self.rpms}
+        rematch = {
+            rpm.name for rpm in rpms
+            if rpm.name not in self.matches or previous.get(rpm.name) != rpm
         }
-        if rpm_name in container_mappings:
-            alternatives.append(container_mappings[rpm_name])
-
-        # Strategy 13: Remove version numbers from name and try plain name
-        # (e.g., compat-openssl11 -> openssl)
-        no_ver = re.sub(r'\d+', '', rpm_name)
-        if no_ver != rpm_name:
-            alternatives.append(no_ver)
-            # Also try with -dev if original had -devel
-            if rpm_name.endswith('-devel'):
-                alternatives.append(no_ver.replace('-devel', '-dev'))
-
-        # Strategy 14: Compiler runtime libraries
-        if rpm_name in ['libgcc', 'libstdc++', 'libgomp', 'libgfortran']:
-            alternatives.append(rpm_name)
-            alternatives.append(f'{rpm_name}-libs')
-
-        # Strategy 15: Common package name differences
-        name_mappings = {
-            'procps-ng': 'procps',
-            'util-linux-user': 'util-linux',
-            'shadow-utils-subid': 'shadow',
-            'kernel-headers': 'linux-headers',
-            'glibc-headers': 'glibc-dev',
-            'glibc-devel': 'glibc-dev',
-            'glibc-static': 'glibc-static',
-            'man-db': 'man-db',
-            'cronie': 'cronie',
-            'cronie-anacron': 'cronie',
+
+        old_apks = set(self.apks)
+        new_apks = set(apk_matcher.apk_cache)
+        added = new_apks - old_apks
+        removed = old_apks - new_apks
+        apk_provides = apk_matcher.provides_digests()
+        reprovided = {
+            name for name in (old_apks & new_apks)
+            if self.apk_provides.get(name) != apk_provides.get(name)
         }
-        if rpm_name in name_mappings:
-            alternatives.append(name_mappings[rpm_name])
 
-        # Strategy 16: FFTW libs (fftw-libs-double -> fftw-double-libs)
-        fftw_match = re.match(r'^fftw-libs-(.+)$', rpm_name)
-        if fftw_match:
-            precision = fftw_match.group(1)
-            alternatives.append(f'fftw-{precision}-libs')
+        if added or removed or reprovided:
+            unchanged = [rpm for rpm in rpms if rpm.name not in rematch]
+            rematch |= apk_matcher.rpms_affected_by(
+                added | removed | reprovided,
+                [rpm.name for rpm in unchanged],
+                {rpm.name: rpm.provides for rpm in unchanged if rpm.provides}
+            )
+            rematch |= {name for name, apk in self.matches.items() if apk in removed or apk in reprovided}
+
+        changes = f"{len(added)} APKs added, {len(removed)} removed"
+        if reprovided:
+            changes += f", {len(reprovided)} with changed provides"
+        print(f"Incremental: {changes}; re-matching {len(rematch)} of {len(rpms)} RPMs")
+
+        return rematch
+
+
+class ReverseIndex:
+    """APK name -> the mapping rows of the RPMs it replaces
 
-        # Strategy 17: Nginx modules (nginx-mod-http-perl -> nginx-mainline-mod-http_perl)
-        nginx_mod_match = re.match(r'^nginx-mod-(.+)$', rpm_name)
-        if nginx_mod_match:
-            module = nginx_mod_match.group(1)
-            # Convert dashes to underscores in module name (Chainguard naming)
-            module_underscore = module.replace('-', '_')
-            alternatives.append(f'nginx-mainline-mod-{module_underscore}')
-            alternatives.append(f'nginx-mainline-mod-{module}')
+    Filled while main() assembles the mapping rows, so a reverse lookup is a
+    single dict access instead of a scan over the CSV.
+    """
 
-        # Strategy 18: Fuzzy matching - check if APK name contains RPM base name
-        # This is done as a last resort in the match function
+    def __init__(self):
+        self._rows = defaultdict(list)  # APK name -> Mappings, in RPM order
 
-        return alternatives
+    @classmethod
+    def from_mappings(cls, rows: Iterable[Mapping]) -> 'ReverseIndex':
+        index = cls()
+        for row in rows:
+            index.add(row)
+        return index
+
+    def add(self, row: Mapping):
+        """Record a mapping row; unmatched rows are ignored"""
+        if row.apk_name:
+            self._rows[row.apk_name].append(row)
+
+    def rpms_for(self, apk_name: str, release: Optional[str] = None,
+                 arch: Optional[str] = None, image: Optional[str] = None) -> List[Mapping]:
+        """Mapping rows of the RPMs that map to apk_name, optionally for one target"""
+        rows = self._rows.get(apk_name, [])
+        if release is not None or arch is not None or image is not None:
+            rows = [row for row in rows
+                    if release in (None, row.release) and arch in (None, row.arch)
+                    and image in (None, row.image)]
+        return rows
+
+    def rpm_names(self, apk_name: str) -> List[str]:
+        """Names of the RPMs that map to apk_name in any target, without duplicates"""
+        return list(dict.fromkeys(row.rpm_name for row in self._rows.get(apk_name, [])))
+
+    def apk_names(self) -> List[str]:
+        return sorted(self._rows)
+
+    def __contains__(self, apk_name: str) -> bool:
+        return apk_name in self._rows
+
+    def __len__(self) -> int:
+        return len(self._rows)
 
 
 class CSVGenerator:
     """Generate CSV output"""
 
     @staticmethod
-    def write_csv(data: List[Dict[str, str]], output_file: str, show_all: bool = False):
+    def write_csv(data: List[Mapping], output_file: str, show_all: bool = False, explain: bool = False,
+                  with_target: bool = False, with_image: bool = False):
         """Write mapping data to CSV
 
         Args:
             data: List of RPM to APK mappings
             output_file: Path to output CSV file
             show_all: If False, only include matched RPMs; if True, include all RPMs
+            explain: If True, add the strategy, candidates and score columns
+            with_target: If True, start each row with its release and arch
+            with_image: If True (with with_target), start each row with its image
         """
         print(f"Writing results to {output_file}...")
 
@@ -1202,8 +2663,8 @@ class CSVGenerator:
         unmatched_removed = 0
 
         for row in data:
-            rpm_name = row.get('rpm_name', '')
-            apk_name = row.get('apk_name', '')
+            rpm_name = row.rpm_name
+            apk_name = row.apk_name
 
             # Skip Perl packages with no match
             if rpm_name.startswith('perl-') and not apk_name:
@@ -1234,19 +2695,454 @@ class CSVGenerator:
         if not show_all and unmatched_removed > 0:
             print(f"Excluded {unmatched_removed} other unmatched packages from CSV (use --show-all to include)")
 
-        fieldnames = ['rpm_name', 'apk_name']
+        columns = ['rpm_name', 'apk_name']
+        if explain:
+            columns += ['strategy', 'candidates', 'score']
+        if with_target:
+            columns = CSVGenerator._target_columns(with_image) + columns
+        indexes = [Mapping._fields.index(column) for column in columns]
 
         with open(output_file, 'w', newline='') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(filtered_data)
+            writer = csv.writer(csvfile)
+            writer.writerow(columns)
+            writer.writerows([row[i] for i in indexes] for row in filtered_data)
 
         print(f"CSV written successfully")
 
+    @staticmethod
+    def _target_columns(with_image: bool) -> List[str]:
+        return ['image', 'release', 'arch'] if with_image else ['release', 'arch']
+
+    @staticmethod
+    def write_reverse(index: ReverseIndex, output_file: str, with_target: bool = False,
+                      with_image: bool = False):
+        """Write one row per APK with the RPMs that map to it (space separated)
+
+        With with_target, there is one row per APK and target, starting with
+        the release and arch (and image, with with_image).
+        """
+        target_columns = CSVGenerator._target_columns(with_image)
+        with open(output_file, 'w', newline='') as csvfile:
+            writer = csv.writer(csvfile)
+            header = ['apk_name', 'rpm_count', 'rpm_names']
+            writer.writerow(target_columns + header if with_target else header)
+            rows = 0
+            for apk_name in index.apk_names():
+                if with_target:
+                    by_target = defaultdict(list)
+                    for row in index.rpms_for(apk_name):
+                        by_target[tuple(getattr(row, column) for column in target_columns)].append(row.rpm_name)
+                    for target, rpm_names in by_target.items():
+                        writer.writerow([*target, apk_name, len(rpm_names), ' '.join(rpm_names)])
+                        rows += 1
+                else:
+                    rpm_names = index.rpm_names(apk_name)
+                    writer.writerow([apk_name, len(rpm_names), ' '.join(rpm_names)])
+                    rows += 1
+
+        print(f"Wrote {rows} reverse mappings to {output_file}")
+
+    @staticmethod
+    def write_exclusions(excluded: List[Tuple[str, ...]], output_file: str, with_target: bool = False,
+                         with_image: bool = False):
+        """Write the RPMs removed by the exclusion filters, and the rule that removed each
+
+        With with_target, each row starts with the release and arch (and
+        image, with with_image) it was excluded from.
+        """
+        with open(output_file, 'w', newline='') as csvfile:
+            writer = csv.writer(csvfile)
+            header = ['rpm_name', 'filter', 'rule']
+            writer.writerow(CSVGenerator._target_columns(with_image) + header if with_target else header)
+            writer.writerows(excluded)
+
+        print(f"Wrote {len(excluded)} excluded RPMs to {output_file}")
+
+
+class MappingService:
+    """A loaded APKMatcher answering lookups, with hot reload and request metrics
+
+    Reloading builds a complete new matcher while the current one keeps
+    serving, then swaps it in; a failed reload keeps the previous inventory.
+    """
+
+    LATENCY_WINDOW = 1024  # Recent lookup requests the latency percentiles are taken over
+    QPS_WINDOW = 60  # Seconds the recent request rate is measured over
+
+    def __init__(self, load_matcher: Callable[[bool], APKMatcher]):
+        self.load_matcher = load_matcher  # refresh -> APKMatcher with its inventory loaded
+        self.matcher = None
+        self.loaded_at = None
+        self.load_seconds = None
+        self.reloads = 0
+        self.started = time.time()
+        self._reload_lock = threading.Lock()
+        self._metrics_lock = threading.Lock()
+        self._requests = defaultdict(int)  # Endpoint -> count
+        self._errors = 0
+        self._lookups = 0
+        self._latencies = deque(maxlen=self.LATENCY_WINDOW)  # Seconds
+        self._request_times = deque()  # Timestamps within the QPS window
+
+    def load(self, refresh: bool = False):
+        """Build a matcher and swap it in once its indexes are ready"""
+        start = time.perf_counter()
+        matcher = self.load_matcher(refresh)
+        if self.matcher is not None and not matcher.apk_cache:
+            raise RuntimeError("the new APK inventory is empty, still serving the previous one")
+        self.load_seconds = time.perf_counter() - start
+        self.matcher = matcher
+        self.loaded_at = time.time()
+
+    def reload(self) -> bool:
+        """Re-fetch the APK inventory; return False if a reload is already running
+
+        Raises RuntimeError if fetching fails, leaving the current matcher in place.
+        """
+        if not self._reload_lock.acquire(blocking=False):
+            return False
+        try:
+            print("Reloading APK inventory...")
+            try:
+                self.load(refresh=True)
+            except SystemExit:
+                raise RuntimeError("fetching the APK inventory failed, still serving the previous one")
+            self.reloads += 1
+            print(f"Reloaded {len(self.matcher.apk_cache)} APKs in {self.load_seconds:.1f}s")
+            return True
+        finally:
+            self._reload_lock.release()
+
+    def lookup(self, rpm_name: str) -> dict:
+        result = self.matcher.explain_match(RPM(rpm_name, '', '', ''))
+        return {
+            'rpm': rpm_name,
+            'apk': result.apk.name if result.apk else None,
+            'strategy': result.strategy,
+            'candidates': result.candidates,
+            'score': result.score,
+        }
+
+    def candidates(self, rpm_name: str, k: int, threshold: Optional[float] = None) -> dict:
+        return {
+            'rpm': rpm_name,
+            'candidates': [
+                {'apk': apk.name, 'score': score}
+                for apk, score in self.matcher.fuzzy_candidates(rpm_name, k, threshold)
+            ],
+        }
+
+    def record(self, endpoint: str, seconds: float, lookups: int, error: bool):
+        now = time.time()
+        with self._metrics_lock:
+            self._requests[endpoint] += 1
+            self._lookups += lookups
+            self._errors += error
+            if lookups:
+                self._latencies.append(seconds)
+            self._request_times.append(now)
+            while self._request_times[0] < now - self.QPS_WINDOW:
+                self._request_times.popleft()
+
+    def metrics(self) -> dict:
+        now = time.time()
+        with self._metrics_lock:
+            latencies = sorted(self._latencies)
+            recent = sum(1 for t in self._request_times if t >= now - self.QPS_WINDOW)
+            total = sum(self._requests.values())
+            requests = dict(self._requests)
+            lookups = self._lookups
+            errors = self._errors
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 3)
+
+        uptime = now - self.started
+        return {
+            'uptime_seconds': round(uptime, 1),
+            'requests': requests,
+            'requests_total': total,
+            'errors_total': errors,
+            'lookups_total': lookups,
+            'qps_1m': round(recent / min(self.QPS_WINDOW, max(uptime, 1e-9)), 3),
+            'qps_overall': round(total / max(uptime, 1e-9), 3),
+            'lookup_latency_ms': {
+                'p50': percentile(0.5),
+                'p90': percentile(0.9),
+                'p99': percentile(0.99),
+                'max': round(latencies[-1] * 1000, 3) if latencies else None,
+            },
+            'inventory': {
+                'apks': len(self.matcher.apk_cache),
+                'loaded_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(self.loaded_at)),
+                'load_seconds': round(self.load_seconds, 3),
+                'reloads': self.reloads,
+            },
+        }
+
+
+class MappingRequestHandler(BaseHTTPRequestHandler):
+    """JSON API of a MappingService
+
+    GET  /match?rpm=NAME           one lookup
+    POST /match {"rpms": [...]}    batch lookup, results in request order
+    GET  /candidates?rpm=NAME&k=N&threshold=T
+                                   top fuzzy candidates scoring at least T (default:
+                                   the fuzzy threshold), with scores
+    POST /reload                   re-fetch the APK inventory and swap it in
+    GET  /metrics                  request counts, QPS, latency and inventory
+    GET  /healthz                  liveness
+    """
+
+    MAX_BODY = 16 * 1024 * 1024
+    server_version = "rpm-to-apk-mapper"
+    # Paths counted in the metrics; any other path is counted as 'other'
+    ENDPOINTS = frozenset(('/match', '/candidates', '/reload', '/healthz'))
+
+    def address_string(self) -> str:
+        # Unix socket peers have no address
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def _send(self, status: int, body: dict):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _handle(self, method: str):
+        start = time.perf_counter()
+        url = urlsplit(self.path)
+        service = self.server.service
+        try:
+            status, body, lookups = self._route(service, method, url.path, parse_qs(url.query))
+        except KeyError as e:
+            status, body, lookups = 400, {'error': f"missing parameter {e}"}, 0
+        except (ValueError, TypeError) as e:
+            status, body, lookups = 400, {'error': f"bad request: {e}"}, 0
+        except RuntimeError as e:
+            status, body, lookups = 500, {'error': str(e)}, 0
+        except Exception as e:
+            # A bug in one request must not drop the connection without a response
+            self.log_error("error handling %s %s: %r", method, self.path, e)
+            traceback.print_exc()
+            status, body, lookups = 500, {'error': f"internal error: {type(e).__name__}"}, 0
+        self._send(status, body)
+        if url.path != '/metrics':
+            endpoint = url.path if url.path in self.ENDPOINTS else 'other'
+            service.record(endpoint, time.perf_counter() - start, lookups, status >= 400)
+
+    def _route(self, service: MappingService, method: str, path: str, query: dict):
+        if method == 'GET' and path == '/match':
+            return 200, service.lookup(query['rpm'][0]), 1
+        if method == 'POST' and path == '/match':
+            request = self._read_json()
+            rpm_names = request.get('rpms') if isinstance(request, dict) else None
+            if not isinstance(rpm_names, list) or not all(isinstance(n, str) for n in rpm_names):
+                raise ValueError('expected {"rpms": [RPM names]}')
+            return 200, {'results': [service.lookup(name) for name in rpm_names]}, len(rpm_names)
+        if method == 'GET' and path == '/candidates':
+            k = int(query.get('k', [FUZZY_TOP_K])[0])
+            if k < 1:
+                raise ValueError('k must be at least 1')
+            threshold = float(query['threshold'][0]) if 'threshold' in query else None
+            if threshold is not None and not 0 < threshold <= 1:
+                raise ValueError('threshold must be greater than 0 and at most 1')
+            return 200, service.candidates(query['rpm'][0], k, threshold), 1
+        if method == 'POST' and path == '/reload':
+            if not service.reload():
+                return 409, {'error': 'a reload is already in progress'}, 0
+            return 200, {'apks': len(service.matcher.apk_cache), 'seconds': round(service.load_seconds, 3)}, 0
+        if method == 'GET' and path == '/metrics':
+            return 200, service.metrics(), 0
+        if method == 'GET' and path == '/healthz':
+            return 200, {'status': 'ok'}, 0
+        return 404, {'error': f"no such endpoint: {method} {path}"}, 0
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > self.MAX_BODY:
+            raise ValueError(f"request body over {self.MAX_BODY} bytes")
+        return json.loads(self.rfile.read(length) or b'null')
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(service: MappingService, address: str):
+    """Serve the mapping API on [HOST:]PORT or unix:PATH until interrupted
+
+    SIGHUP reloads the APK inventory like POST /reload.
+    """
+    if address.startswith('unix:'):
+        path = address[len('unix:'):]
+        if os.path.lexists(path):
+            if not stat.S_ISSOCK(os.lstat(path).st_mode):
+                print(f"Error: {path} exists and is not a socket", file=sys.stderr)
+                sys.exit(1)
+            os.unlink(path)  # Left behind by a previous server
+        server = ThreadingUnixHTTPServer(path, MappingRequestHandler)
+        where = path
+    else:
+        host, _, port = address.rpartition(':')
+        server = ThreadingHTTPServer((host or '127.0.0.1', int(port)), MappingRequestHandler)
+        where = f"http://{server.server_address[0]}:{server.server_address[1]}"
+    server.service = service
+
+    def reload_on_hangup(signum, frame):
+        def reload():
+            try:
+                service.reload()
+            except RuntimeError as e:
+                print(f"Error: {e}", file=sys.stderr)
+        threading.Thread(target=reload, daemon=True).start()
+
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, reload_on_hangup)
+
+    print(f"Serving {len(service.matcher.apk_cache)} APKs on {where}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if address.startswith('unix:'):
+            os.unlink(where)
+
+
+def _timed(func):
+    """Call func and return (result, elapsed seconds)"""
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+# Matcher inherited by forked match workers, so each one shares the parent's
+# built APK indexes copy-on-write instead of unpickling its own copy
+_worker_matcher: Optional[APKMatcher] = None
+
+
+def _explain_match(rpm: RPM) -> MatchResult:
+    return _worker_matcher.explain_match(rpm)
+
+
+def match_rpms(apk_matcher: APKMatcher, rpms: List[RPM], jobs: int = 1) -> List[MatchResult]:
+    """Match each RPM to an APK, in input order
+
+    With jobs > 1 the RPMs are matched in chunks by forked worker processes.
+    Matching is deterministic per RPM and pool.map keeps input order, so the
+    result is identical to a serial run. Platforms without fork match serially.
+    """
+    global _worker_matcher
+
+    # Build the indexes before forking so workers inherit them
+    apk_matcher.load_inventory()
+    _worker_matcher = apk_matcher
+    try:
+        if jobs <= 1 or len(rpms) < 2 or 'fork' not in multiprocessing.get_all_start_methods():
+            return [_explain_match(rpm) for rpm in rpms]
+
+        chunksize = max(1, len(rpms) // (jobs * 4))
+        with multiprocessing.get_context('fork').Pool(jobs) as pool:
+            return pool.map(_explain_match, rpms, chunksize=chunksize)
+    finally:
+        _worker_matcher = None
+
+
+def _read_installed_rpms(rpm_source: RpmdbSource) -> Optional[List[RPM]]:
+    """Decode an image's rpmdb in a worker process; None if it failed, after printing why
+
+    The error exits the worker, which would leave the pool waiting for a result.
+    """
+    try:
+        return list(rpm_source.iter_rpms())
+    except SystemExit:
+        return None
+
+
+def discover_inventories(rpm_extractors: List[RPMExtractor], apk_matcher: APKMatcher,
+                         jobs: int = 1) -> List[List[RPM]]:
+    """Fetch the RPM inventory of every target and the APK inventory concurrently
+
+    Fetches from containers and subprocesses spend their time waiting, so
+    running them side by side takes about as long as the slowest one. At
+    most INVENTORY_WORKERS RPM inventories are read at once. Decoding an
+    image's rpmdb is CPU-bound Python, which threads cannot run in parallel,
+    so with jobs > 1 images are decoded by up to jobs forked worker
+    processes. Returns the RPMs of each extractor, in the order given.
+    """
+    start = time.perf_counter()
+    images = [extractor for extractor in rpm_extractors if isinstance(extractor, InstalledRPMExtractor)]
+    pool = None
+    if jobs > 1 and len(images) > 1 and 'fork' in multiprocessing.get_all_start_methods():
+        # Forked before any thread starts, so no worker inherits a held lock
+        pool = multiprocessing.get_context('fork').Pool(min(jobs, len(images)))
+    try:
+        for extractor in images:
+            extractor.pool = pool
+        with ThreadPoolExecutor(max_workers=min(len(rpm_extractors), INVENTORY_WORKERS) + 1) as executor:
+            # Submitted first so the APK fetch never waits behind a long queue of images
+            apk_future = executor.submit(_timed, apk_matcher.load_inventory)
+            rpm_futures = [executor.submit(_timed, extractor.get_rpm_list) for extractor in rpm_extractors]
+            inventories = [future.result() for future in rpm_futures]
+            _, apk_elapsed = apk_future.result()
+    finally:
+        for extractor in images:
+            extractor.pool = None
+        if pool is not None:
+            pool.terminate()
+    wall = time.perf_counter() - start
+
+    print("Inventory discovery:")
+    for extractor, (_, rpm_elapsed) in zip(rpm_extractors, inventories):
+        target = f" ({extractor.label})" if extractor.label else ""
+        print(f"  RPM inventory{target}: {rpm_elapsed:.1f}s")
+    print(f"  APK inventory: {apk_elapsed:.1f}s")
+    print(f"  Wall clock:    {wall:.1f}s")
+
+    return [rpms for rpms, _ in inventories]
+
+
+def match_key(rpm: RPM) -> Tuple[str, frozenset]:
+    """What a match depends on: the RPM name, and its provides for the provides strategy"""
+    return rpm.name, frozenset(rpm.provides)
+
+
+def target_path(path: str, label: str) -> str:
+    """Insert a target label before the extension, e.g. out.csv -> out-ubi9-aarch64.csv"""
+    root, ext = os.path.splitext(path)
+    return f"{root}-{label}{ext}"
+
+
+def image_labels(paths: List[str]) -> List[str]:
+    """Short unique labels for images, from their file or directory names
+
+    e.g. /images/nginx.tar.gz -> nginx; repeated names get a -2, -3... suffix.
+    """
+    labels = []
+    seen = defaultdict(int)
+    for path in paths:
+        label = os.path.basename(os.path.normpath(path))
+        label = re.sub(r'(\.tar(\.\w+)?|\.tgz|\.sqlite)$', '', label) or 'image'
+        seen[label] += 1
+        labels.append(label if seen[label] == 1 else f"{label}-{seen[label]}")
+    return labels
+
 
 def main():
     parser = argparse.ArgumentParser(
-        description='Map Red Hat UBI 9 RPMs to Chainguard APKs'
+        description='Map Red Hat UBI RPMs to Chainguard APKs'
     )
     parser.add_argument(
         '--output', '-o',
@@ -1259,52 +3155,308 @@ def main():
         default='docker',
         help='Container runtime to use (default: docker)'
     )
+    parser.add_argument(
+        '--release',
+        nargs='+',
+        choices=UBI_RELEASES,
+        help=f'UBI releases to map (default: {DEFAULT_RELEASE})'
+    )
+    parser.add_argument(
+        '--arch',
+        nargs='+',
+        choices=list(ARCH_PLATFORMS),
+        help=f'Architectures to map; the UBI container runs on the matching platform '
+             f'(default: {DEFAULT_ARCH}, on the host platform)'
+    )
+    parser.add_argument(
+        '--split-output',
+        action='store_true',
+        default=False,
+        help='With several targets, write one CSV per target (<output>-ubi<release>-<arch>.csv) '
+             'instead of one CSV with release and arch columns'
+    )
+    parser.add_argument(
+        '--rpm-repo',
+        action='append',
+        metavar='PATH',
+        help='Read RPMs from local repository metadata (a repo directory, repomd.xml, '
+             'or primary.xml/.sqlite file) instead of a UBI container; repeatable'
+    )
+    parser.add_argument(
+        '--image',
+        nargs='+',
+        metavar='PATH',
+        help='Map the RPMs installed in images instead of the UBI repositories, read from the rpmdb '
+             'of an unpacked root filesystem, a layer tarball or a `docker save` archive'
+    )
+    parser.add_argument(
+        '--apkindex',
+        action='append',
+        metavar='FILE',
+        help='Read APKs from a local APKINDEX.tar.gz instead of wolfi-package-status or a container; repeatable'
+    )
+    parser.add_argument(
+        '--serve',
+        metavar='ADDRESS',
+        help='Instead of writing a CSV, load the APK inventory once and serve lookups over HTTP '
+             'on [HOST:]PORT (host defaults to 127.0.0.1) or unix:PATH'
+    )
     parser.add_argument(
         '--show-all',
         action='store_true',
         default=False,
         help='Show all RPMs in CSV including unmatched (default: only show matched RPMs)'
     )
+    parser.add_argument(
+        '--jobs', '-j',
+        type=int,
+        default=1,
+        metavar='N',
+        help='Match RPMs, and read --image rpmdbs, in N worker processes; 0 uses every CPU (default: 1)'
+    )
+    parser.add_argument(
+        '--fuzzy-threshold',
+        type=float,
+        default=DEFAULT_FUZZY_THRESHOLD,
+        metavar='SCORE',
+        help='Minimum trigram similarity (0-1] of a fuzzy match (default: %(default)s)'
+    )
+    parser.add_argument(
+        '--explain',
+        action='store_true',
+        default=False,
+        help='Add the matching strategy, number of candidates considered and match score to each CSV row'
+    )
+    parser.add_argument(
+        '--reverse-output',
+        metavar='FILE',
+        help='Also write the reverse mapping: each matched APK with the RPMs that map to it'
+    )
+    parser.add_argument(
+        '--exclusions-output',
+        metavar='FILE',
+        help='Also write the RPMs removed by the exclusion filters, with the rule that removed each'
+    )
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        default=False,
+        help='Only re-match RPMs affected by inventory changes since the previous run'
+    )
+    parser.add_argument(
+        '--state',
+        metavar='FILE',
+        help='State file used by --incremental (default: <output>.state.json)'
+    )
+    parser.add_argument(
+        '--cache-dir',
+        default=InventoryCache.default_dir(),
+        help='Directory for cached RPM and APK inventories (default: %(default)s)'
+    )
+    parser.add_argument(
+        '--cache-ttl',
+        type=float,
+        default=24,
+        metavar='HOURS',
+        help='Reuse cached inventories younger than this many hours (default: 24)'
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        default=False,
+        help='Always fetch inventories and do not write the cache'
+    )
+    cache_mode = parser.add_mutually_exclusive_group()
+    cache_mode.add_argument(
+        '--refresh',
+        action='store_true',
+        default=False,
+        help='Ignore cached inventories, fetch them again and update the cache'
+    )
+    cache_mode.add_argument(
+        '--offline',
+        action='store_true',
+        default=False,
+        help='Only use cached inventories, regardless of age; never run containers'
+    )
 
     args = parser.parse_args()
 
+    if args.jobs < 0:
+        parser.error('--jobs must be 0 or more')
+    if not 0 < args.fuzzy_threshold <= 1:
+        parser.error('--fuzzy-threshold must be greater than 0 and at most 1')
+    if args.no_cache and args.offline:
+        parser.error('--offline requires the inventory cache (drop --no-cache)')
+
     # Initialize components
     container_runner = ContainerRunner(runtime=args.runtime)
-    rpm_extractor = RPMExtractor(container_runner)
-    apk_matcher = APKMatcher(container_runner)
-
-    # Get RPMs
-    rpms = rpm_extractor.get_rpm_list()
+    inventory_cache = None
+    if not args.no_cache:
+        inventory_cache = InventoryCache(
+            container_runner,
+            args.cache_dir,
+            ttl_hours=args.cache_ttl,
+            refresh=args.refresh,
+            offline=args.offline
+        )
+    rpm_source = RepoMetadataSource(args.rpm_repo) if args.rpm_repo else None
+    apk_source = APKIndexSource(args.apkindex) if args.apkindex else None
+
+    if args.serve:
+        def load_matcher(refresh):
+            # Reloads fetch a fresh inventory (and update the cache) unless offline
+            cache = inventory_cache
+            if cache and refresh and not cache.offline:
+                cache = InventoryCache(container_runner, cache.cache_dir, ttl_hours=args.cache_ttl, refresh=True)
+            matcher = APKMatcher(container_runner, cache, apk_source, args.fuzzy_threshold)
+            matcher.load_inventory()
+            return matcher
+
+        service = MappingService(load_matcher)
+        service.load()
+        serve(service, args.serve)
+        return
+
+    # One RPM extractor per (release, arch) target, or per image; the APK side is shared
+    if args.image:
+        if args.release or args.arch or rpm_source:
+            parser.error('--image reads the release and arch from each image; '
+                         'it cannot be combined with --release, --arch or --rpm-repo')
+        multi_target = len(args.image) > 1
+        labels = image_labels(args.image)
+        rpm_extractors = [
+            InstalledRPMExtractor(RpmdbSource(path), label=label if multi_target else '')
+            for path, label in zip(args.image, labels)
+        ]
+    else:
+        targets = [(release, arch) for release in (args.release or [DEFAULT_RELEASE])
+                   for arch in (args.arch or [DEFAULT_ARCH])]
+        multi_target = len(targets) > 1
+        if multi_target and rpm_source:
+            parser.error('--rpm-repo reads a single release and arch; use it with one --release and --arch')
+        rpm_extractors = [
+            RPMExtractor(
+                container_runner, inventory_cache, rpm_source,
+                release=release, arch=arch,
+                platform=ARCH_PLATFORMS[arch] if args.arch else None,
+                label=f"ubi{release}-{arch}" if multi_target else ''
+            )
+            for release, arch in targets
+        ]
+    apk_matcher = APKMatcher(container_runner, inventory_cache, apk_source, args.fuzzy_threshold)
+
+    # Get RPMs and APKs
+    inventories = discover_inventories(rpm_extractors, apk_matcher, jobs=args.jobs or os.cpu_count() or 1)
+
+    states = []
+    rematches = []
+    for extractor, rpms in zip(rpm_extractors, inventories):
+        if not multi_target:
+            path = args.state or MappingState.default_path(args.output)
+        elif args.state:
+            path = target_path(args.state, extractor.label)
+        else:
+            path = MappingState.default_path(target_path(args.output, extractor.label))
+        state = None
+        rematch = None
+        if args.incremental:
+            state = MappingState.load(path)
+            if state:
+                rematch = state.rpms_to_rematch(rpms, apk_matcher)
+            else:
+                print(f"Incremental: no previous state at {path}, matching all RPMs")
+        states.append((path, state))
+        rematches.append(rematch)
 
-    # Match to APKs
+    # Match to APKs. A match depends only on the RPM name and provides, so
+    # RPMs shared by several targets are matched once.
     print("Matching RPMs to APKs...")
-    results = []
-    matched = 0
+    pending = {}
+    for rpms, rematch in zip(inventories, rematches):
+        for rpm in rpms:
+            if rematch is None or rpm.name in rematch:
+                pending.setdefault(match_key(rpm), rpm)
+    found = dict(zip(pending, match_rpms(apk_matcher, list(pending.values()),
+                                         jobs=args.jobs or os.cpu_count() or 1)))
 
-    for rpm in rpms:
-        apk = apk_matcher.find_match(rpm)
+    stats = MatchStats()
+    for result in found.values():
+        stats.add(result)
 
-        if apk:
-            matched += 1
-            apk_name = apk['name']
-        else:
-            apk_name = ''
+    results = []
+    reverse_index = ReverseIndex()
+    summaries = []
+    for extractor, rpms, (path, state), rematch in zip(rpm_extractors, inventories, states, rematches):
+        target_results = []
+        matched = 0
 
-        results.append({
-            'rpm_name': rpm['name'],
-            'apk_name': apk_name
-        })
+        for rpm in rpms:
+            if rematch is not None and rpm.name not in rematch:
+                apk_name = state.matches[rpm.name]
+                row = Mapping(rpm.name, apk_name, STRATEGY_REUSED)
+                stats.hits[STRATEGY_REUSED] += 1
+            else:
+                result = found[match_key(rpm)]
+                apk_name = result.apk.name if result.apk else ''
+                row = Mapping(rpm.name, apk_name, result.strategy, result.candidates, result.score)
+            row = row._replace(release=extractor.release, arch=extractor.arch)
+            if args.image:
+                row = row._replace(image=extractor.image)
+            target_results.append(row)
+            reverse_index.add(row)
+
+            if apk_name:
+                matched += 1
+
+        if args.incremental:
+            MappingState(
+                rpms,
+                list(apk_matcher.apk_cache),
+                {row.rpm_name: row.apk_name for row in target_results},
+                apk_matcher.fuzzy_threshold,
+                apk_matcher.provides_digests()
+            ).save(path)
+
+        if multi_target and args.split_output:
+            CSVGenerator.write_csv(target_results, target_path(args.output, extractor.label),
+                                   args.show_all, args.explain)
+        results.extend(target_results)
+        summaries.append((extractor.label, len(rpms), matched))
 
     # Generate CSV
-    CSVGenerator.write_csv(results, args.output, args.show_all)
+    with_image = bool(args.image)
+    if not (multi_target and args.split_output):
+        CSVGenerator.write_csv(results, args.output, args.show_all, args.explain,
+                               with_target=multi_target, with_image=with_image)
+    if args.reverse_output:
+        CSVGenerator.write_reverse(reverse_index, args.reverse_output,
+                                   with_target=multi_target, with_image=with_image)
+    if args.exclusions_output:
+        if multi_target:
+            excluded = [((extractor.image,) if with_image else ()) + (extractor.release, extractor.arch) + row
+                        for extractor in rpm_extractors for row in extractor.excluded]
+        else:
+            excluded = rpm_extractors[0].excluded
+        CSVGenerator.write_exclusions(excluded, args.exclusions_output,
+                                      with_target=multi_target, with_image=with_image)
 
     # Print summary
     print("\n" + "="*50)
     print("Summary:")
-    print(f"  Total RPMs: {len(rpms)}")
-    print(f"  Matched APKs: {matched}")
-    print(f"  Unmatched: {len(rpms) - matched}")
-    print(f"  Match rate: {matched/len(rpms)*100:.1f}%")
+    for label, total, matched in summaries:
+        indent = "  "
+        if label:
+            print(f"  {label}:")
+            indent = "    "
+        print(f"{indent}Total RPMs: {total}")
+        print(f"{indent}Matched APKs: {matched}")
+        print(f"{indent}Unmatched: {total - matched}")
+        # A target can have no RPMs left, e.g. an image holding only filtered packages
+        print(f"{indent}Match rate: {matched/total*100:.1f}%" if total else f"{indent}Match rate: n/a")
+    if multi_target:
+        print(f"  Unique RPMs matched: {len(found)}")
+    stats.print_summary()
     print("="*50)
 
 
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""Tests for reading APKs from APKINDEX files
+
+    python3 -m unittest discover tests
+"""
+
+import contextlib
+import gzip
+import io
+import os
+import sys
+import tarfile
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from rpm_to_apk_mapper import APKIndexSource, APKMatcher, apk_version_key  # noqa: E402
+
+
+def write_apkindex(directory: str, records: str) -> str:
+    """Write records as the APKINDEX member of an APKINDEX.tar.gz and return its path"""
+    data = records.encode()
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w') as archive:
+        member = tarfile.TarInfo('APKINDEX')
+        member.size = len(data)
+        archive.addfile(member, io.BytesIO(data))
+    path = os.path.join(directory, 'APKINDEX.tar.gz')
+    with open(path, 'wb') as f:
+        f.write(gzip.compress(buffer.getvalue()))
+    return path
+
+
+class APKIndexSourceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def test_keeps_newest_version_listed_first(self):
+        path = write_apkindex(self.directory.name, (
+            "P:openssl\nV:3.5.1-r0\np:so:libssl.so.3=3 cmd:openssl=3.5.1-r0\n\n"
+            "P:openssl\nV:3.4.0-r2\np:so:libssl.so.1.1=1.1\n\n"
+            "P:zlib\nV:1.3.1-r0\n\n"
+        ))
+
+        apks = {apk.name: apk for apk in APKIndexSource([path]).iter_apks()}
+
+        self.assertEqual(apks['openssl'].version, '3.5.1-r0')
+        self.assertEqual(apks['openssl'].provides, ('cmd:openssl', 'so:libssl.so.3'))
+        self.assertEqual(sorted(apks), ['openssl', 'zlib'])
+
+    def test_matcher_uses_newest_version(self):
+        path = write_apkindex(self.directory.name, (
+            "P:curl\nV:8.10.0-r1\n\n"
+            "P:curl\nV:8.9.1-r3\n\n"
+        ))
+
+        matcher = APKMatcher(None, apk_source=APKIndexSource([path]))
+        with contextlib.redirect_stdout(io.StringIO()):
+            matcher.load_inventory()
+
+        self.assertEqual(matcher.apk_cache['curl'].version, '8.10.0-r1')
+
+
+class APKVersionKeyTest(unittest.TestCase):
+
+    def test_order(self):
+        ordered = [
+            '1.0_alpha-r0', '1.0_beta2-r0', '1.0_beta10-r0', '1.0_rc1-r0', '1.0-r0',
+            '1.0-r2', '1.0_p1-r0', '1.0a-r0', '1.0.1-r0', '1.9-r9', '1.10-r0',
+        ]
+        self.assertEqual(sorted(reversed(ordered), key=apk_version_key), ordered)
+
+    def test_invalid_versions_sort_first(self):
+        self.assertLess(apk_version_key('unknown'), apk_version_key('0.1-r0'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""Tests for ContainerRunner session mode and run_batch, against a stub runtime
+
+The stub stands in for docker: it logs every invocation, runs the commands
+of `run --rm` and `exec` on the host, and hands out (and logs) container IDs
+for `run -d`.
+
+    python3 -m unittest discover tests
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+import unittest.mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from rpm_to_apk_mapper import ContainerRunner  # noqa: E402
+
+STUB_RUNTIME = '''\
+#!{python}
+import json, os, subprocess, sys
+
+def log(entry):
+    with open(os.environ['STUB_RUNTIME_LOG'], 'a') as f:
+        f.write(json.dumps(entry) + '\\n')
+
+args = sys.argv[1:]
+log(args)
+
+if args == ['--version']:
+    print('stub 1.0')
+elif args[:2] == ['run', '-d']:
+    container = 'container-' + str(os.getpid())
+    log(['started', container])
+    print(container)
+elif args[0] == 'exec':
+    sys.exit(subprocess.call(args[2:]))
+elif args[:2] == ['run', '--rm']:
+    rest = args[2:]
+    if rest[0] == '--platform':
+        rest = rest[2:]
+    sys.exit(subprocess.call(rest[1:]))
+elif args[:2] == ['rm', '-f']:
+    pass
+else:
+    sys.exit('unexpected arguments: ' + ' '.join(args))
+'''
+
+
+class StubRuntimeTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.runtime = os.path.join(directory.name, 'docker')
+        with open(self.runtime, 'w') as f:
+            f.write(STUB_RUNTIME.format(python=sys.executable))
+        os.chmod(self.runtime, 0o755)
+
+        self.log = os.path.join(directory.name, 'calls.log')
+        open(self.log, 'w').close()
+        patcher = unittest.mock.patch.dict(os.environ, STUB_RUNTIME_LOG=self.log)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def calls(self, action: str):
+        """Stub invocations whose arguments start with action, e.g. 'exec' or 'run -d'"""
+        with open(self.log) as f:
+            calls = [json.loads(line) for line in f]
+        words = action.split()
+        return [call for call in calls if call[:len(words)] == words]
+
+    def started(self):
+        """IDs of the containers the stub started"""
+        return {container for _, container in self.calls('started')}
+
+    def removed(self):
+        """IDs of the containers removed with `rm -f`"""
+        return {container for call in self.calls('rm -f') for container in call[2:]}
+
+
+class RunBatchTest(StubRuntimeTest):
+
+    def test_outputs_and_exit_statuses_in_order(self):
+        runner = ContainerRunner(self.runtime)
+        results = runner.run_batch('ubi', [
+            ['echo', 'first'],
+            ['sh', '-c', 'printf "two\\nlines"; exit 3'],
+            ['true'],
+            ['echo', "it's quoted"],
+        ])
+
+        self.assertEqual(results, [
+            (0, 'first\n'),
+            (3, 'two\nlines'),
+            (0, ''),
+            (0, "it's quoted\n"),
+        ])
+        self.assertEqual(len(self.calls('run --rm')), 1)
+
+    def test_large_batches_are_split(self):
+        runner = ContainerRunner(self.runtime)
+        runner.BATCH_MAX_SCRIPT = 200
+        commands = [['echo', f'package-{i}'] for i in range(20)]
+
+        results = runner.run_batch('ubi', commands)
+
+        self.assertEqual(results, [(0, f'package-{i}\n') for i in range(20)])
+        self.assertGreater(len(self.calls('run --rm')), 1)
+
+    def test_truncated_output_exits(self):
+        runner = ContainerRunner(self.runtime)
+        # The batch shell exits cleanly before the second command reports its status
+        with self.assertRaises(SystemExit), unittest.mock.patch('sys.stderr'):
+            runner.run_batch('ubi', [['true'], ['exit', '0'], ['true']])
+
+    def test_failing_batch_exits(self):
+        runner = ContainerRunner(self.runtime)
+        with self.assertRaises(SystemExit), unittest.mock.patch('sys.stderr'):
+            runner.run_batch('ubi', [['true'], ['sh', '-c', 'kill -9 $PPID']])
+
+
+class SessionTest(StubRuntimeTest):
+
+    def test_commands_share_one_container_per_image_and_platform(self):
+        with ContainerRunner(self.runtime, session=True) as runner:
+            self.assertEqual(runner.run_command('ubi', ['echo', 'a']), 'a\n')
+            self.assertEqual(list(runner.run_command_iter('ubi', ['echo', 'b'])), ['b\n'])
+            self.assertEqual(runner.run_batch('ubi', [['echo', 'c']]), [(0, 'c\n')])
+            runner.run_command('ubi', ['true'], platform='linux/arm64')
+
+        started = self.calls('run -d')
+        self.assertEqual(len(started), 2)
+        self.assertIn(ContainerRunner.SESSION_LABEL, started[0])
+        self.assertEqual(len(self.calls('exec')), 4)
+        self.assertEqual(self.calls('run --rm'), [])
+        self.assertEqual(len(self.calls('rm -f')), 1)
+        self.assertEqual(self.removed(), self.started())
+
+    def test_failing_command_exits(self):
+        with ContainerRunner(self.runtime, session=True) as runner:
+            with self.assertRaises(SystemExit), unittest.mock.patch('sys.stderr'):
+                runner.run_command('ubi', ['false'])
+
+    def test_containers_are_removed_at_exit(self):
+        script = textwrap.dedent(f'''
+            import sys
+            sys.path.insert(0, {os.path.dirname(os.path.dirname(os.path.abspath(__file__)))!r})
+            from rpm_to_apk_mapper import ContainerRunner
+            runner = ContainerRunner({self.runtime!r}, session=True)
+            runner.run_command('ubi', ['true'])
+        ''')
+        subprocess.run([sys.executable, '-c', script], check=True)
+
+        self.assertEqual(len(self.started()), 1)
+        self.assertEqual(self.removed(), self.started())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,18 +1,59 @@
 #!/usr/bin/env python3
 
 import argparse
+import json
+import os
 import re
 import requests
-from collections import defaultdict
-from typing import Dict, List
+import tempfile
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urljoin
+from urllib3.util.retry import Retry
 
 token = ""
 
-def get_tags(repo: str) -> List[str]:
-    parts = repo.split('/')
-    registry_host = parts[0]
-    repository_path = '/'.join(parts[1:])
+# URL scheme used to reach the registry; 'http' for local test registries
+scheme = "https"
+
+# Directory holding manifest annotations keyed by digest; empty disables it
+cache_dir = ""
+
+# Annotations fetched during this run, keyed by digest. Many tags are aliases
+# of the same digest, so each unique manifest is only fetched once.
+digest_annotations: Dict[str, Future] = {}
+digest_annotations_lock = threading.Lock()
+
+# Shared across threads so connections to the registry are reused
+session = requests.Session()
+
+def new_session(concurrency: int) -> requests.Session:
+    """
+    Create a session with a connection pool sized for the given concurrency.
+
+    Rate limited (429) and transient server errors are retried with
+    exponential backoff, honouring the registry's Retry-After header.
+    """
+    retry = Retry(
+        total=6,
+        backoff_factor=0.5,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        respect_retry_after_header=True,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency,
+                          max_retries=retry)
 
+    s = requests.Session()
+    s.mount('https://', adapter)
+    s.mount('http://', adapter)
+
+    return s
+
+def get_headers() -> Dict[str, str]:
     headers = {
         'User-Agent': 'latest-tags-by-package/0.0.0',
         'Accept': '*/*',
@@ -20,67 +61,252 @@ def get_tags(repo: str) -> List[str]:
     if token:
         headers['Authorization'] = f'Bearer {token}'
 
-    r = requests.get(
-            f'https://{registry_host}/v2/{repository_path}/tags/list',
-                     headers=headers)
-
-    return r.json()['tags']
+    return headers
 
-def get_manifest(repo: str, tag: str) -> Dict[str, str]:
+def registry_url(repo: str, path: str) -> str:
     parts = repo.split('/')
     registry_host = parts[0]
     repository_path = '/'.join(parts[1:])
 
-    headers = {
-        'User-Agent': 'latest-tags-by-package/0.0.0',
-        'Accept': '*/*',
-    }
-    if token:
-        headers['Authorization'] = f'Bearer {token}'
+    return f'{scheme}://{registry_host}/v2/{repository_path}/{path}'
+
+def iter_tags(repo: str, page_size: int = 1000) -> Iterator[str]:
+    """
+    Yield the tags in a repository, one page of `page_size` tags at a time.
+
+    Pages are followed through the Link header. Registries that truncate the
+    list without a Link header are paged with the `last` parameter instead,
+    until a page no longer starts after `last` (the registry ignored it and
+    sent the list from the start again).
+    """
+    url = registry_url(repo, 'tags/list')
+    params = {'n': page_size}
+
+    while url:
+        r = session.get(url, headers=get_headers(), params=params)
+        tags = r.json()['tags'] or []
+
+        last = params.get('last') if params else None
+        if last is not None and tags and tags[0] <= last:
+            break
 
-    r = requests.get(
-            f'https://{registry_host}/v2/{repository_path}/manifests/{tag}',
-                     headers=headers)
+        yield from tags
+
+        next_link = r.links.get('next')
+        if next_link:
+            # The Link URL already carries n and last
+            url = urljoin(r.url, next_link['url'])
+            params = None
+        elif params and len(tags) >= page_size and tags[-1] != params.get('last'):
+            params = {'n': page_size, 'last': tags[-1]}
+        else:
+            url = None
+
+def get_tags(repo: str, page_size: int = 1000) -> List[str]:
+    return list(iter_tags(repo, page_size))
+
+def get_manifest(repo: str, tag: str) -> Optional[Dict[str, str]]:
+    """
+    Fetch a manifest by tag or digest, or None if the registry doesn't have
+    it (e.g. a tag deleted since it was listed). Raises for any other error
+    response, so an error body is never mistaken for a manifest without
+    annotations.
+    """
+    r = session.get(registry_url(repo, f'manifests/{tag}'),
+                    headers=get_headers())
+    if r.status_code == 404:
+        return None
+    r.raise_for_status()
 
     return r.json()
 
-def get_latest_tags_by_package(n: int, repo: str) -> Dict[str, List[dict]]:
+def get_digest(repo: str, tag: str) -> Optional[str]:
     """
-    Get the latest tags in a repository for each version of the main package.
+    Resolve a tag to its manifest digest with a HEAD request, without
+    transferring the manifest body.
+    """
+    r = session.head(registry_url(repo, f'manifests/{tag}'),
+                     headers=get_headers())
+    if not r.ok:
+        return None
 
-    The value of n defines how many tags to include for each package.
+    return r.headers.get('Docker-Content-Digest')
+
+def cache_path(digest: str) -> Optional[str]:
+    # Only accept well formed digests, since they become file names
+    m = re.match(r'^([a-z0-9]+):([a-f0-9]+)$', digest)
+    if not m:
+        return None
+
+    return os.path.join(cache_dir, m.group(1), f'{m.group(2)}.json')
+
+def read_cached_annotations(digest: str) -> Optional[dict]:
     """
-    tags = get_tags(repo)
+    Return the cached entry for a digest, or None if it isn't cached.
 
-    results: Dict[str, List[dict]] = defaultdict(list)
+    The entry is a dict with a single 'annotations' key, which is None for
+    manifests without annotations.
+    """
+    path = cache_path(digest)
+    if not path:
+        return None
 
-    for tag in tags:
-        # Exclude -dev tags
-        if re.match(r'^.+-dev$', tag):
-            continue
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
 
-        # Exclude the latest tag
-        if tag == 'latest':
-            continue
+def write_cached_annotations(digest: str, annotations: Optional[dict]):
+    path = cache_path(digest)
+    if not path:
+        return
 
-        # Exclude revision tags (i.e {tag}-r0)
-        if re.match(r'^.+-r[0-9]+$', tag):
-            continue
+    # Write to a temporary file and rename it, so concurrent runs never read
+    # a partially written entry
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump({'annotations': annotations}, f)
+    os.replace(tmp_path, path)
 
-        # Exclude signatures and attestations
-        if re.match(r'^sha256-.+$', tag):
-            continue
+def fetch_annotations(repo: str, digest: str) -> Optional[dict]:
+    """
+    Get the cache entry of the manifest with the given digest, from the
+    cache if it is enabled and has seen the digest before, or None if the
+    registry doesn't have the manifest.
+    """
+    if cache_dir:
+        cached = read_cached_annotations(digest)
+        if cached is not None:
+            return cached
+
+    # Fetch by digest, so the body matches the digest it is cached under.
+    # get_manifest raises on errors, so only real manifests are cached.
+    manifest = get_manifest(repo, digest)
+    if manifest is None:
+        return None
+    entry = {'annotations': manifest.get('annotations')}
+
+    if cache_dir:
+        write_cached_annotations(digest, entry['annotations'])
+
+    return entry
+
+def get_annotations(repo: str, tag: str) -> Optional[dict]:
+    """
+    Get the annotations of the manifest a tag points to.
 
-        # Get the manifest for the tag
+    The tag is resolved to a digest with a HEAD request. The manifest is only
+    fetched for the first tag seen with each digest, and only if the digest
+    isn't already cached. Manifests are immutable, so cached entries never go
+    stale. Tags without a manifest are skipped like manifests without
+    annotations.
+    """
+    digest = get_digest(repo, tag)
+    if not digest:
         manifest = get_manifest(repo, tag)
+        return manifest.get('annotations') if manifest else None
+
+    with digest_annotations_lock:
+        future = digest_annotations.get(digest)
+        owner = future is None
+        if owner:
+            future = Future()
+            digest_annotations[digest] = future
+
+    # Another tag with the same digest is already fetching it
+    if not owner:
+        return future.result()
+
+    try:
+        entry = fetch_annotations(repo, digest)
+    except BaseException as e:
+        forget_digest(digest, future)
+        future.set_exception(e)
+        raise
+
+    # A missing manifest isn't remembered, so a later tag fetches it again
+    if entry is None:
+        forget_digest(digest, future)
+        future.set_result(None)
+        return None
+
+    future.set_result(entry['annotations'])
+
+    return entry['annotations']
+
+def forget_digest(digest: str, future: Future):
+    with digest_annotations_lock:
+        if digest_annotations.get(digest) is future:
+            del digest_annotations[digest]
+
+def default_cache_dir() -> str:
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(
+        os.path.expanduser('~'), '.cache')
 
+    return os.path.join(base, 'latest-tags-by-package')
+
+def include_tag(tag: str) -> bool:
+    # Exclude -dev tags
+    if re.match(r'^.+-dev$', tag):
+        return False
+
+    # Exclude the latest tag
+    if tag == 'latest':
+        return False
+
+    # Exclude revision tags (i.e {tag}-r0)
+    if re.match(r'^.+-r[0-9]+$', tag):
+        return False
+
+    # Exclude signatures and attestations
+    if re.match(r'^sha256-.+$', tag):
+        return False
+
+    return True
+
+def iter_annotations(repo: str, tags: Iterable[str],
+                     concurrency: int) -> Iterator[Tuple[str, Optional[dict]]]:
+    """
+    Yield (tag, annotations) for each tag, in tag order.
+
+    Tags are consumed as they arrive, with at most 2 * concurrency fetches
+    queued at once, so fetching starts before the tag list is complete and
+    memory doesn't grow with the size of the repository.
+    """
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        pending = deque()
+        for tag in tags:
+            pending.append((tag, executor.submit(get_annotations, repo, tag)))
+            if len(pending) >= 2 * concurrency:
+                tag, future = pending.popleft()
+                yield tag, future.result()
+
+        while pending:
+            tag, future = pending.popleft()
+            yield tag, future.result()
+
+def get_latest_tags_by_package(n: int, repo: str, concurrency: int = 8,
+                               page_size: int = 1000) -> Dict[str, List[dict]]:
+    """
+    Get the latest tags in a repository for each version of the main package.
+
+    The value of n defines how many tags to include for each package.
+    Manifests are fetched with up to `concurrency` requests in flight, while
+    the tag list is still being paged through.
+    """
+    tags = (tag for tag in iter_tags(repo, page_size) if include_tag(tag))
+
+    results: Dict[str, List[dict]] = defaultdict(list)
+
+    for tag, annotations in iter_annotations(repo, tags, concurrency):
         # Skip if manifest has no annotations
-        if 'annotations' not in manifest:
+        if annotations is None:
             continue
 
         # Get the created timestamp and the name of the main package from the
         # annotations
-        annotations = manifest['annotations']
         package_main = annotations.get('dev.chainguard.package.main')
         created = annotations.get('org.opencontainers.image.created')
 
@@ -102,15 +328,34 @@ if __name__ == "__main__":
     parser.add_argument("--token", "-t", help="Authorization token for registry access")
     parser.add_argument("--number", "-n", type=int, default=5,
         help="The number of tags to return for each package.")
+    parser.add_argument("--concurrency", "-c", type=int, default=8,
+        help="The maximum number of manifest requests in flight.")
+    parser.add_argument("--page-size", type=int, default=1000,
+        help="The number of tags to request per page of the tag list.")
+    parser.add_argument("--cache-dir", default=default_cache_dir(),
+        help="Directory for cached manifest annotations, keyed by digest.")
+    parser.add_argument("--no-cache", action="store_true",
+        help="Fetch every manifest instead of using the cache.")
+    parser.add_argument("--plain-http", action="store_true",
+        help="Talk to the registry over plain HTTP (for local registries).")
     parser.add_argument("repo")
 
     args = parser.parse_args()
 
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    if args.page_size < 1:
+        parser.error("--page-size must be at least 1")
+
     token = args.token
+    scheme = "http" if args.plain_http else "https"
+    cache_dir = "" if args.no_cache else args.cache_dir
+    session = new_session(args.concurrency)
 
     try:
         # Get the latest tags for each main package
-        results = get_latest_tags_by_package(args.number, args.repo)
+        results = get_latest_tags_by_package(args.number, args.repo,
+                                             args.concurrency, args.page_size)
 
         # Print a section for each package, with the latest tags nested below
         for package_main, tags in results.items():